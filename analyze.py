@@ -0,0 +1,190 @@
+import os
+import csv
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from rules import RuleMatcher
+from scan_filter import ScanFilter
+from organize_engine import scan_files
+from throttle import format_size
+
+# 报告中列出的最大目录数
+TOP_DIRECTORIES = 20
+# 没有扩展名的文件在统计中的名称
+NO_EXTENSION = "(无扩展名)"
+
+
+class AnalysisReport:
+    """只扫描不整理的分析结果：各目标文件夹、未匹配文件的各扩展名和最大目录的文件数与字节数
+
+    只读取目录项和文件元数据，不计算 type: 规则（条数记在 content_rules 中）。
+    """
+
+    def __init__(self, source_dir, group_name=None):
+        self.source_dir = os.path.abspath(source_dir)
+        self.group_name = group_name
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.total_files = 0
+        self.total_bytes = 0
+        self.folders = {}
+        self.unmatched = {}
+        self.unmatched_files = 0
+        self.unmatched_bytes = 0
+        self.directories = []
+        self.content_rules = 0
+        self.elapsed = 0.0
+
+    @property
+    def matched_files(self):
+        return self.total_files - self.unmatched_files
+
+    @property
+    def matched_bytes(self):
+        return self.total_bytes - self.unmatched_bytes
+
+    @staticmethod
+    def _sorted(counts):
+        """按字节数从大到小排列的 [(名称, 文件数, 字节数)]"""
+        return sorted(((name, files, size) for name, (files, size) in counts.items()),
+                      key=lambda item: (-item[2], -item[1], item[0]))
+
+    def folder_rows(self):
+        """各目标文件夹 [(文件夹, 文件数, 字节数)]，按字节数从大到小"""
+        return self._sorted(self.folders)
+
+    def extension_rows(self):
+        """未匹配文件的各扩展名 [(扩展名, 文件数, 字节数)]，按字节数从大到小"""
+        return self._sorted(self.unmatched)
+
+    def to_dict(self):
+        return {
+            "source": self.source_dir,
+            "group": self.group_name,
+            "created_at": self.created_at,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "total": {"files": self.total_files, "bytes": self.total_bytes},
+            "matched": {"files": self.matched_files, "bytes": self.matched_bytes},
+            "unmatched": {"files": self.unmatched_files, "bytes": self.unmatched_bytes},
+            "content_rules_skipped": self.content_rules,
+            "folders": [{"folder": name, "files": files, "bytes": size}
+                        for name, files, size in self.folder_rows()],
+            "unmatched_extensions": [{"extension": name, "files": files, "bytes": size}
+                                     for name, files, size in self.extension_rows()],
+            "largest_directories": [{"directory": name, "files": files, "bytes": size}
+                                    for name, files, size in self.directories]
+        }
+
+    def headline(self):
+        """总体统计（一到两行）"""
+        lines = [f"共 {self.total_files} 个文件（{format_size(self.total_bytes)}），"
+                 f"已匹配 {self.matched_files} 个（{format_size(self.matched_bytes)}），"
+                 f"未匹配 {self.unmatched_files} 个（{format_size(self.unmatched_bytes)}），"
+                 f"用时 {self.elapsed:.1f} 秒"]
+        if self.content_rules:
+            lines.append(f"注意: {self.content_rules} 条 type: 规则需要读取文件内容，分析时未计算")
+        return lines
+
+    def summary(self, limit=10):
+        """报告摘要（命令行输出和日志使用），每类最多列出 limit 项"""
+        lines = self.headline()
+        sections = (("目标文件夹:", self.folder_rows()),
+                    ("未匹配的扩展名:", self.extension_rows()),
+                    ("最大的目录:", self.directories))
+        for title, rows in sections:
+            lines.append(title)
+            lines += [f"  {name}: {files} 个文件, {format_size(size)}" for name, files, size in rows[:limit]]
+        return lines
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=4)
+
+    def write_csv(self, path):
+        """写入 CSV（可用 Excel 打开），section 列区分目标文件夹、未匹配扩展名和最大目录"""
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(("section", "name", "files", "bytes"))
+            writer.writerow(("total", "", self.total_files, self.total_bytes))
+            writer.writerow(("unmatched", "", self.unmatched_files, self.unmatched_bytes))
+            for name, files, size in self.folder_rows():
+                writer.writerow(("folder", name, files, size))
+            for name, files, size in self.extension_rows():
+                writer.writerow(("extension", name, files, size))
+            for name, files, size in self.directories:
+                writer.writerow(("directory", name, files, size))
+
+    def save(self, report_dir):
+        """在 report_dir 中写入 JSON 和 CSV 报告，返回 (JSON 路径, CSV 路径)"""
+        report_dir = Path(report_dir)
+        report_dir.mkdir(parents=True, exist_ok=True)
+        name = datetime.now().strftime("analysis_%Y%m%d_%H%M%S_%f")
+        json_path = report_dir / f"{name}.json"
+        csv_path = report_dir / f"{name}.csv"
+        self.write_json(json_path)
+        self.write_csv(csv_path)
+        return json_path, csv_path
+
+
+def analyze(source_dir, rules, group_name=None, exclude=(), max_depth=0, skip_hidden=True,
+            scan_cache=None, top_directories=TOP_DIRECTORIES):
+    """按规则分析源目录会如何整理，不复制、不移动、不读取文件内容，返回 AnalysisReport
+
+    目录统计包含子目录中的文件；扫描设置与整理时相同。
+    """
+    started = time.perf_counter()
+    report = AnalysisReport(source_dir, group_name)
+    source_dir = report.source_dir
+    matcher = RuleMatcher(rules, source_dir)
+    report.content_rules = len(matcher.type_rules)
+    files = scan_files(source_dir, ScanFilter(exclude, max_depth, skip_hidden), scan_cache,
+                       with_sizes=True, with_mtimes=matcher.needs_metadata)
+
+    folders = report.folders
+    unmatched = report.unmatched
+    directory_bytes = [0] * len(files.directories)
+    directory_files = [0] * len(files.directories)
+    directories = files.directories
+    sizes = files.sizes
+    mtimes = files.mtimes
+    for index, (name, dir_id) in enumerate(zip(files.iter_names(), files.dir_ids)):
+        size = max(sizes[index], 0)
+        metadata = None
+        if mtimes is not None and sizes[index] >= 0:
+            metadata = lambda: (size, mtimes[index])
+        folder_name = matcher.match(name, directories[dir_id], metadata)
+        if folder_name is not None:
+            counts = folders.get(folder_name)
+            if counts is None:
+                counts = folders[folder_name] = [0, 0]
+        else:
+            extension = os.path.splitext(name)[1].lower() or NO_EXTENSION
+            counts = unmatched.get(extension)
+            if counts is None:
+                counts = unmatched[extension] = [0, 0]
+            report.unmatched_files += 1
+            report.unmatched_bytes += size
+        counts[0] += 1
+        counts[1] += size
+        directory_bytes[dir_id] += size
+        directory_files[dir_id] += 1
+    report.total_files = len(files)
+    report.total_bytes = sum(directory_bytes)
+
+    # 目录的大小包含子目录：把每个目录的文件计入它到源目录之间的每一级
+    totals = {}
+    for dir_id, directory in enumerate(directories):
+        relative = os.path.relpath(directory, source_dir).replace("\\", "/")
+        parts = [] if relative == "." else relative.split("/")
+        for depth in range(len(parts) + 1):
+            key = "/".join(parts[:depth]) or "."
+            counts = totals.get(key)
+            if counts is None:
+                counts = totals[key] = [0, 0]
+            counts[0] += directory_files[dir_id]
+            counts[1] += directory_bytes[dir_id]
+    totals.pop(".", None)
+    report.directories = AnalysisReport._sorted(totals)[:top_directories]
+    report.elapsed = time.perf_counter() - started
+    return report
+
@@ -0,0 +1,92 @@
+import os
+from organize_engine import (OrganizeEvent, EVENT_START, EVENT_ERROR, EVENT_PROGRESS,
+                             EVENT_FINISHED)
+
+# 批量删除与目录合并的事件类型
+EVENT_DELETED = "deleted"
+EVENT_MERGED = "merged"
+
+
+def delete_empty_items(source_dir, recursive=True, delete_dirs=True, delete_files=True):
+    """删除空目录和空文件，逐个产出事件
+
+    删除事件的 folder 字段为 "dir" 或 "file"。
+    """
+    # 获取所有目录和文件（自底向上，子目录先于父目录处理）
+    all_items = []
+    for root, dirs, files in os.walk(source_dir, topdown=False):
+        if not recursive and root != source_dir:
+            continue
+        if delete_dirs:
+            all_items.extend(os.path.join(root, d) for d in dirs)
+        if delete_files:
+            all_items.extend(os.path.join(root, f) for f in files)
+
+    total = len(all_items)
+    yield OrganizeEvent(EVENT_START, source=source_dir, total=total)
+
+    # 处理每个项目
+    for i, item in enumerate(all_items, 1):
+        try:
+            if os.path.isdir(item):
+                # 检查是否为空目录
+                if not os.listdir(item):
+                    os.rmdir(item)
+                    yield OrganizeEvent(EVENT_DELETED, source=item, folder="dir", done=i, total=total)
+            else:
+                # 检查是否为空文件
+                if os.path.getsize(item) == 0:
+                    os.remove(item)
+                    yield OrganizeEvent(EVENT_DELETED, source=item, folder="file", done=i, total=total)
+        except Exception as e:
+            yield OrganizeEvent(EVENT_ERROR, source=item, message=str(e), done=i, total=total)
+
+        yield OrganizeEvent(EVENT_PROGRESS, done=i, total=total)
+
+    yield OrganizeEvent(EVENT_FINISHED, done=total, total=total)
+
+
+def _unique_path(folder, name):
+    """生成不冲突的路径，已存在时添加数字后缀"""
+    path = os.path.join(folder, name)
+    if not os.path.lexists(path):
+        return path
+    base_name, extension = os.path.splitext(name)
+    counter = 1
+    while os.path.lexists(os.path.join(folder, f"{base_name}_{counter}{extension}")):
+        counter += 1
+    return os.path.join(folder, f"{base_name}_{counter}{extension}")
+
+
+def merge_same_name_dirs(source_dir, recursive=True):
+    """合并与父目录同名的子目录，逐个产出事件
+
+    例如 照片/照片/a.jpg 合并为 照片/a.jpg，合并后删除变空的子目录；
+    同名冲突时添加数字后缀。自底向上处理，多层同名目录会逐层合并。
+    recursive 为 False 时只检查源目录本身和它的直接子目录。
+    """
+    source_dir = os.path.abspath(source_dir)
+    candidates = []
+    for root, dirs, files in os.walk(source_dir, topdown=False):
+        if not recursive and root != source_dir and os.path.dirname(root) != source_dir:
+            continue
+        name = os.path.basename(root)
+        if name in dirs:
+            candidates.append(root)
+
+    total = len(candidates)
+    yield OrganizeEvent(EVENT_START, source=source_dir, total=total)
+
+    for i, parent in enumerate(candidates, 1):
+        child = os.path.join(parent, os.path.basename(parent))
+        try:
+            for entry in os.listdir(child):
+                os.rename(os.path.join(child, entry), _unique_path(parent, entry))
+            os.rmdir(child)
+            yield OrganizeEvent(EVENT_MERGED, source=child, target=parent, done=i, total=total)
+        except Exception as e:
+            yield OrganizeEvent(EVENT_ERROR, source=child, message=str(e), done=i, total=total)
+
+        yield OrganizeEvent(EVENT_PROGRESS, done=i, total=total)
+
+    yield OrganizeEvent(EVENT_FINISHED, done=total, total=total)
@@ -0,0 +1,66 @@
+"""扫描缓存基准测试：无缓存 / 首次建立缓存 / 缓存命中 / 少量目录变化后的重新扫描
+
+    python -m benchmarks.bench_scan_cache --files 200000 --dirs 20000 --workdir /mnt/share/bench
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from benchmarks.common import timed
+from benchmarks.treegen import TreeSpec, generate_tree, fanout_for
+from organize_engine import scan_files
+from scan_cache import ScanCache
+
+
+def make_tree(root, files, dirs):
+    """生成空文件组成的测试目录，并把目录修改时间调到过去，使其可以被缓存"""
+    spec = TreeSpec(files, depth=2, fanout=fanout_for(dirs, 2), size_mean=0, extensions=(".txt",))
+    generate_tree(root, spec)
+    directories = [os.path.join(root, directory) for directory in spec.directories()]
+    past = time.time() - 3600
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (past, past))
+    return directories
+
+
+def scan(source, cache_dir=None):
+    cache = ScanCache.for_source(cache_dir, source) if cache_dir else None
+    files = scan_files(source, scan_cache=cache)
+    if cache is not None:
+        cache.save()
+        return len(files), cache.hits, cache.misses
+    return len(files), 0, 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200000)
+    parser.add_argument("--dirs", type=int, default=20000)
+    parser.add_argument("--changed", type=int, default=10, help="两次扫描之间修改的目录数")
+    parser.add_argument("--workdir", default=None, help="测试目录（应位于被测文件系统上）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_scan_", dir=args.workdir)
+    try:
+        source = os.path.join(workdir, "source")
+        cache_dir = os.path.join(workdir, "cache")
+        directories = make_tree(source, args.files, args.dirs)
+        print(f"测试数据: {args.files} 个文件, {len(directories)} 个目录, 目录 {workdir}")
+
+        for label, cache in (("无缓存", None), ("建立缓存", cache_dir), ("缓存命中", cache_dir)):
+            (count, hits, misses), seconds = timed(scan, source, cache)
+            print(f"{label:8} {seconds:8.2f}s {count} 个文件 命中 {hits} 未命中 {misses}")
+
+        past = time.time() - 60
+        for directory in directories[:args.changed]:
+            open(os.path.join(directory, "new.txt"), "wb").close()
+            os.utime(directory, (past, past))
+        (count, hits, misses), seconds = timed(scan, source, cache_dir)
+        print(f"{'部分变化':8} {seconds:8.2f}s {count} 个文件 命中 {hits} 未命中 {misses}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""小文件复制基准测试：逐个 shutil.copy2 与小文件批量复制对比
+
+    python -m benchmarks.bench_small_files --files 1000000 --size 4096
+"""
+import os
+import shutil
+import argparse
+import tempfile
+from benchmarks.common import drop_caches, timed, format_rate
+from benchmarks.treegen import TreeSpec, generate_tree
+from organize_engine import OrganizeEngine, EXECUTOR_SEQUENTIAL, EXECUTOR_THREAD
+from fast_copy import SMALL_FILE_THRESHOLD
+
+
+def run_once(source, target, executor, threshold):
+    engine = OrganizeEngine({".dat": "Data"}, "copy", executor=executor,
+                            small_file_threshold=threshold)
+    for _ in engine.run(source, target):
+        pass
+    return engine.processed_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=1000000)
+    parser.add_argument("--size", type=int, default=4096, help="单个文件字节数")
+    parser.add_argument("--workdir", default=None, help="测试目录（应位于被测磁盘上）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_small_", dir=args.workdir)
+    try:
+        source = os.path.join(workdir, "source")
+        # 大量同样大小的小文件，每个目录约 1000 个
+        generate_tree(source, TreeSpec(args.files, depth=1, fanout=max(1, args.files // 1000),
+                                       size_mean=args.size, extensions=(".dat",)))
+        total_size = args.files * args.size
+        print(f"测试数据: {args.files} 个文件 x {args.size} 字节, 目录 {workdir}")
+
+        for executor in (EXECUTOR_SEQUENTIAL, EXECUTOR_THREAD):
+            for threshold in (0, SMALL_FILE_THRESHOLD):
+                target = os.path.join(workdir, "target")
+                shutil.rmtree(target, ignore_errors=True)
+                method = drop_caches(source) or "warm"
+                processed, seconds = timed(run_once, source, target, executor, threshold)
+                label = "batched" if threshold else "copy2"
+                print(f"{executor:10} {label:7} ({method:11}) {seconds:8.2f}s "
+                      f"{format_rate(processed, total_size, seconds)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
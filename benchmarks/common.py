@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+
+# 让基准测试可以直接导入仓库根目录下的模块
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def iter_files(root):
+    """列出目录下的所有文件"""
+    for directory, _, files in os.walk(root):
+        for name in files:
+            yield os.path.join(directory, name)
+
+
+def drop_caches(root):
+    """清空页缓存，返回使用的方式
+
+    优先写 /proc/sys/vm/drop_caches（需要 root），否则对每个文件调用
+    posix_fadvise(DONTNEED)，都不可用时返回 None（只能测热缓存）。
+    """
+    if hasattr(os, "sync"):
+        os.sync()
+    try:
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return "drop_caches"
+    except OSError:
+        pass
+    if not hasattr(os, "posix_fadvise"):
+        return None
+    for path in iter_files(root):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return "fadvise"
+
+
+def tree_size(root):
+    """统计目录下的文件数和总字节数"""
+    count = 0
+    size = 0
+    for path in iter_files(root):
+        count += 1
+        size += os.path.getsize(path)
+    return count, size
+
+
+def timed(fn, *args, **kwargs):
+    """执行函数，返回 (结果, 耗时秒数)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peak_rss():
+    """当前进程的峰值常驻内存（字节），无法获取时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 上单位是字节，其他系统是 KB
+        return peak if sys.platform == "darwin" else peak * 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+def format_rate(count, size, seconds):
+    """格式化文件/秒和 MB/秒"""
+    seconds = max(seconds, 1e-9)
+    return f"{count / seconds:10.1f} files/s {size / seconds / 1024 / 1024:8.1f} MB/s"
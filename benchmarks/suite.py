@@ -0,0 +1,246 @@
+"""基准测试套件：在合成目录树上测试整理（复制/移动）、规则匹配、批量删除和规则读写
+
+    python -m benchmarks.suite --files 20000 --save-baseline baseline.json
+    python -m benchmarks.suite --files 20000 --compare baseline.json --tolerance 10
+
+每个场景在单独的子进程中运行，报告 files/s、MB/s 和峰值内存；--compare 与保存的基准结果比较，
+有场景变慢（或内存增加）超过 tolerance 百分比时以状态码 1 退出。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from benchmarks.common import peak_rss
+from benchmarks.treegen import TreeSpec, NAME_WORDS, generate_tree, add_spec_arguments, spec_from_args
+from organize_engine import OrganizeEngine
+from batch_ops import delete_empty_items, EVENT_DELETED
+from rule_store import RuleStore, JsonRuleStore, SqliteRuleStore, RULES_FILE, RULES_DB
+from rules import RuleMatcher
+
+BASELINE_VERSION = 1
+
+
+def make_rules(count, spec, seed=7):
+    """生成 count 条确定性的规则：大部分是只匹配个别文件的关键词，夹杂 glob/re/dir/带条件的规则，
+    最后是按扩展名归类的规则，使多数文件要比较完大部分规则才找到匹配
+    """
+    rng = random.Random(seed)
+    rules = {}
+    extension_rules = {extension: extension.lstrip(".").upper() for extension in spec.extensions}
+    budget = max(0, count - len(extension_rules))
+    for index in range(budget):
+        number = rng.randrange(max(1, spec.files))
+        if index % 50 == 49:
+            keyword = f"dir:d{rng.randrange(max(1, spec.fanout)):03d}/d{rng.randrange(max(1, spec.fanout)):03d}"
+        elif index % 25 == 24:
+            keyword = f"re:^{rng.choice(NAME_WORDS)}_0*{number}\\."
+        elif index % 10 == 9:
+            keyword = f"glob:*_{number:08d}{rng.choice(spec.extensions)}"
+        elif index % 100 == 98:
+            keyword = f"{rng.choice(NAME_WORDS).lower()} & size:>{rng.randrange(1, 64)}MB"
+        else:
+            keyword = f"{rng.choice(NAME_WORDS).lower()}_{number:08d}"
+        rules.setdefault(keyword, f"Rule{index:05d}")
+    for extension, folder in list(extension_rules.items())[:count]:
+        rules.setdefault(extension, folder)
+    return rules
+
+
+def _organize(workdir, spec, mode):
+    source = os.path.join(workdir, "source")
+    target = os.path.join(workdir, "target")
+    _, total = generate_tree(source, spec)
+    engine = OrganizeEngine(make_rules(len(spec.extensions), spec), mode)
+    start = time.perf_counter()
+    for _ in engine.run(source, target):
+        pass
+    return engine.processed_files, total, time.perf_counter() - start
+
+
+def scenario_organize_copy(workdir, spec, options):
+    return _organize(workdir, spec, "copy")
+
+
+def scenario_organize_move(workdir, spec, options):
+    return _organize(workdir, spec, "move")
+
+
+def _match(rule_count):
+    def scenario(workdir, spec, options):
+        matcher = RuleMatcher(make_rules(rule_count, spec), "/bench")
+        directories = {}
+        entries = [(directories.setdefault(directory, os.path.join("/bench", directory)), name, size)
+                   for directory, name, size in spec.entries()]
+        now = time.time_ns()
+        start = time.perf_counter()
+        for directory, name, size in entries:
+            matcher.match(name, directory, lambda: (size, now))
+        return len(entries), 0, time.perf_counter() - start
+    return scenario
+
+
+def scenario_delete(workdir, spec, options):
+    source = os.path.join(workdir, "source")
+    generate_tree(source, TreeSpec(**dict(spec.to_dict(), empty=0.5)))
+    deleted = 0
+    start = time.perf_counter()
+    for event in delete_empty_items(source):
+        if event.kind == EVENT_DELETED:
+            deleted += 1
+    return deleted, 0, time.perf_counter() - start
+
+
+def _store(store_class, file_name):
+    def scenario(workdir, spec, options):
+        per_group = max(1, options.rule_count // options.rule_groups)
+        rule_groups = {f"规则组{group:03d}": make_rules(per_group, spec, seed=group)
+                       for group in range(options.rule_groups)}
+        count = sum(len(rules) for rules in rule_groups.values())
+        path = os.path.join(workdir, file_name)
+        start = time.perf_counter()
+        store_class(path).save(rule_groups, next(iter(rule_groups)), {})
+        RuleStore(workdir).load()
+        return count, os.path.getsize(path), time.perf_counter() - start
+    return scenario
+
+
+# 名称 -> (函数, 说明)
+SCENARIOS = {
+    "organize-copy": (scenario_organize_copy, "整理（复制）"),
+    "organize-move": (scenario_organize_move, "整理（移动）"),
+    "match-10": (_match(10), "规则匹配 10 条规则（不读写磁盘）"),
+    "match-1k": (_match(1000), "规则匹配 1000 条规则"),
+    "match-10k": (_match(10000), "规则匹配 10000 条规则"),
+    "delete": (scenario_delete, "批量删除空文件和空目录"),
+    "rules-json": (_store(JsonRuleStore, RULES_FILE), "规则保存并读取（JSON）"),
+    "rules-sqlite": (_store(SqliteRuleStore, RULES_DB), "规则保存并读取（SQLite）"),
+}
+
+
+def _child(name, spec_options, options, workdir, results):
+    """在子进程中运行一个场景，峰值内存只包含这个场景"""
+    try:
+        directory = tempfile.mkdtemp(prefix=f"{name}_", dir=workdir)
+        try:
+            count, size, seconds = SCENARIOS[name][0](directory, TreeSpec(**spec_options), options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        results.put({"count": count, "bytes": size, "seconds": seconds, "peak_rss": peak_rss()})
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_scenario(name, spec, options, workdir, repeat=1):
+    """运行 repeat 次，取最快的一次，峰值内存取最大值"""
+    context = multiprocessing.get_context("spawn")
+    best = None
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=_child, args=(name, spec.to_dict(), options, workdir, results))
+        process.start()
+        result = results.get()
+        process.join()
+        if "error" in result:
+            return result
+        if best is None or result["seconds"] < best["seconds"]:
+            best = dict(result, peak_rss=max(result["peak_rss"] or 0, (best or {}).get("peak_rss") or 0) or None)
+        elif result["peak_rss"]:
+            best["peak_rss"] = max(best["peak_rss"] or 0, result["peak_rss"])
+    seconds = max(best["seconds"], 1e-9)
+    best["files_per_sec"] = best["count"] / seconds
+    best["mb_per_sec"] = best["bytes"] / seconds / 1024 / 1024
+    return best
+
+
+def format_result(name, result):
+    if "error" in result:
+        return f"{name:14} 出错: {result['error']}"
+    rss = f"{result['peak_rss'] / 1024 / 1024:8.1f} MB" if result.get("peak_rss") else "       -"
+    rate = f"{result['mb_per_sec']:8.1f} MB/s" if result["bytes"] else "         -"
+    return (f"{name:14} {result['count']:9d} {result['seconds']:8.3f}s {result['files_per_sec']:12.1f} files/s "
+            f"{rate}  峰值内存 {rss}")
+
+
+def compare(results, baseline, tolerance):
+    """与基准结果比较，返回回退的场景列表 [(名称, 说明)]"""
+    regressions = []
+    print(f"\n与基准比较（容差 {tolerance:.0f}%）:")
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if base is None or "error" in result or "error" in base:
+            continue
+        speed = (result["files_per_sec"] / base["files_per_sec"] - 1) * 100 if base["files_per_sec"] else 0
+        line = f"{name:14} 速度 {speed:+7.1f}%"
+        if speed < -tolerance:
+            regressions.append((name, f"速度下降 {-speed:.1f}%"))
+        if result.get("peak_rss") and base.get("peak_rss"):
+            memory = (result["peak_rss"] / base["peak_rss"] - 1) * 100
+            line += f"  峰值内存 {memory:+7.1f}%"
+            if memory > tolerance:
+                regressions.append((name, f"峰值内存增加 {memory:.1f}%"))
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_spec_arguments(parser, files=20000, depth=2, fanout=8, size="lognormal", size_mean=16384,
+                       collisions=0.05, hidden=0.01)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="只运行指定的场景（可多次指定，默认全部）")
+    parser.add_argument("--repeat", type=int, default=1, help="每个场景运行次数，取最快的一次")
+    parser.add_argument("--rule-count", type=int, default=10000, help="规则读写场景的规则总数")
+    parser.add_argument("--rule-groups", type=int, default=10, help="规则读写场景的规则组数")
+    parser.add_argument("--workdir", default=None, help="测试目录（应位于被测磁盘上）")
+    parser.add_argument("--save-baseline", metavar="PATH", help="把结果保存为基准")
+    parser.add_argument("--compare", metavar="PATH", help="与保存的基准比较")
+    parser.add_argument("--tolerance", type=float, default=10, help="允许的变慢/内存增加百分比")
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    names = args.scenario or list(SCENARIOS)
+    workdir = tempfile.mkdtemp(prefix="bench_suite_", dir=args.workdir)
+    results = {}
+    try:
+        print(f"目录树: {spec.files} 个文件, 深度 {spec.depth}, 每层 {spec.fanout} 个子目录, "
+              f"大小 {spec.size} (均值 {spec.size_mean} 字节), 种子 {spec.seed}")
+        for name in names:
+            results[name] = run_scenario(name, spec, args, workdir, args.repeat)
+            print(format_result(name, results[name]), flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "version": BASELINE_VERSION,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": spec.to_dict(),
+        "results": results
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+        print(f"\n基准已保存到 {args.save_baseline}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("spec") != report["spec"]:
+            print("注意: 基准使用的目录树参数不同，结果不可直接比较")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n性能回退:")
+            for name, message in regressions:
+                print(f"  {name}: {message}")
+            sys.exit(1)
+        print("\n没有超过容差的性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""确定性的合成目录树生成器，参数（含随机种子）相同时总是生成相同的目录树
+
+    python -m benchmarks.treegen /tmp/tree --files 100000 --depth 3 --fanout 6 --size lognormal --size-mean 65536
+"""
+import os
+import math
+import random
+import argparse
+
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+EXTENSIONS = (".jpg", ".png", ".pdf", ".docx", ".xlsx", ".txt", ".mp4", ".mp3", ".zip", ".csv", ".log", ".dat")
+NAME_WORDS = ("report", "invoice", "photo", "scan", "backup", "draft", "final", "data", "notes", "holiday",
+              "meeting", "budget", "IMG", "DSC", "screenshot", "contract")
+# 对数正态分布的 sigma：约 1% 的文件超过均值的 20 倍
+LOGNORMAL_SIGMA = 1.5
+# 单个文件最大为均值的倍数，避免长尾生成过大的文件
+MAX_SIZE_FACTOR = 1000
+# 文件内容从这块确定性的随机数据中截取
+_PAYLOAD_SIZE = 1024 * 1024
+
+
+class TreeSpec:
+    """合成目录树的参数
+
+    depth/fanout: 目录层数和每个目录的子目录数，文件均匀分布在所有目录（含根目录）中，depth 为 0 时只有根目录；
+    size: 文件大小分布，fixed 都为 size_mean 字节，uniform 在 0 ~ 2*size_mean 之间均匀分布，
+    lognormal 均值约为 size_mean、少数文件很大（长尾）；
+    collisions: 与其他目录中的文件同名的比例（整理到同一文件夹时需要改名）；
+    hidden: 以 . 开头的隐藏文件比例；empty: 空文件比例（批量删除测试使用）；
+    shuffle: 按打乱的顺序创建文件，使扫描顺序与磁盘上的分配顺序不同。
+    """
+
+    def __init__(self, files=10000, depth=2, fanout=8, size="fixed", size_mean=4096, collisions=0.0,
+                 hidden=0.0, empty=0.0, extensions=EXTENSIONS, shuffle=False, seed=42):
+        if size not in SIZE_DISTRIBUTIONS:
+            raise ValueError(f"未知的大小分布: {size}")
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.size = size
+        self.size_mean = size_mean
+        self.collisions = collisions
+        self.hidden = hidden
+        self.empty = empty
+        self.extensions = tuple(extensions)
+        self.shuffle = shuffle
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self), extensions=list(self.extensions))
+
+    def directories(self):
+        """所有目录的相对路径（根目录为 ""），按层次顺序"""
+        result = [""]
+        level = [""]
+        for _ in range(self.depth):
+            level = [os.path.join(parent, f"d{index:03d}") for parent in level for index in range(self.fanout)]
+            result += level
+        return result
+
+    def _file_size(self, rng):
+        if self.empty and rng.random() < self.empty:
+            return 0
+        mean = self.size_mean
+        if self.size == "uniform":
+            return rng.randint(0, 2 * mean)
+        if self.size == "lognormal" and mean > 0:
+            mu = math.log(mean) - LOGNORMAL_SIGMA ** 2 / 2
+            return min(int(rng.lognormvariate(mu, LOGNORMAL_SIGMA)), mean * MAX_SIZE_FACTOR)
+        return mean
+
+    def entries(self):
+        """生成 (相对目录, 文件名, 大小) 列表，不写磁盘（规则匹配测试直接使用）"""
+        rng = random.Random(self.seed)
+        directories = self.directories()
+        per_dir, extra = divmod(self.files, len(directories))
+        entries = []
+        number = 0
+        for dir_index, directory in enumerate(directories):
+            for slot in range(per_dir + (1 if dir_index < extra else 0)):
+                extension = rng.choice(self.extensions)
+                word = rng.choice(NAME_WORDS)
+                if self.collisions and rng.random() < self.collisions:
+                    # 同一位置的文件在每个目录中同名，目录内不会重复
+                    name = f"common_{slot:06d}{extension}"
+                else:
+                    name = f"{word}_{number:08d}{extension}"
+                if self.hidden and rng.random() < self.hidden:
+                    name = "." + name
+                entries.append((directory, name, self._file_size(rng)))
+                number += 1
+        if self.shuffle:
+            rng.shuffle(entries)
+        return entries
+
+
+def fanout_for(directories, depth):
+    """使 depth 层目录树的目录总数接近 directories 的 fanout"""
+    if depth <= 0:
+        return 0
+    return max(1, round(directories ** (1 / depth)))
+
+
+def generate_tree(root, spec):
+    """在 root 下按 spec 生成目录树，返回 (文件数, 总字节数)"""
+    payload = random.Random(spec.seed).getrandbits(_PAYLOAD_SIZE * 8).to_bytes(_PAYLOAD_SIZE, "little")
+    for directory in spec.directories():
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    count = 0
+    total = 0
+    for index, (directory, name, size) in enumerate(spec.entries()):
+        with open(os.path.join(root, directory, name), "wb") as f:
+            offset = index % _PAYLOAD_SIZE
+            remaining = size
+            while remaining > 0:
+                chunk = payload[offset:offset + remaining]
+                f.write(chunk)
+                remaining -= len(chunk)
+                offset = 0
+        count += 1
+        total += size
+    return count, total
+
+
+def add_spec_arguments(parser, **defaults):
+    """向命令行参数中加入 TreeSpec 的各项参数，defaults 覆盖默认值"""
+    spec = TreeSpec(**defaults)
+    parser.add_argument("--files", type=int, default=spec.files, help="文件总数")
+    parser.add_argument("--depth", type=int, default=spec.depth, help="目录层数")
+    parser.add_argument("--fanout", type=int, default=spec.fanout, help="每个目录的子目录数")
+    parser.add_argument("--size", choices=SIZE_DISTRIBUTIONS, default=spec.size, help="文件大小分布")
+    parser.add_argument("--size-mean", type=int, default=spec.size_mean, help="平均文件大小（字节）")
+    parser.add_argument("--collisions", type=float, default=spec.collisions, help="重名文件比例")
+    parser.add_argument("--hidden", type=float, default=spec.hidden, help="隐藏文件比例")
+    parser.add_argument("--seed", type=int, default=spec.seed, help="随机种子")
+
+
+def spec_from_args(args, **overrides):
+    """由 add_spec_arguments 解析出的参数构造 TreeSpec"""
+    options = dict(files=args.files, depth=args.depth, fanout=args.fanout, size=args.size,
+                   size_mean=args.size_mean, collisions=args.collisions, hidden=args.hidden, seed=args.seed)
+    options.update(overrides)
+    return TreeSpec(**options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="生成到的目录")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+    count, total = generate_tree(args.root, spec_from_args(args))
+    print(f"已生成 {count} 个文件, {total / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
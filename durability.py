@@ -0,0 +1,69 @@
+import os
+import sys
+
+# 每批持久化的文件数
+DURABLE_BATCH = 256
+
+
+def fsync_file(path):
+    """将文件数据写入磁盘"""
+    # Windows 上 fsync 需要可写句柄
+    flags = os.O_RDWR | os.O_BINARY if sys.platform == 'win32' else os.O_RDONLY
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path):
+    """将目录项（新建、重命名、删除的文件名）写入磁盘，Windows 上无法打开目录，直接跳过"""
+    if sys.platform == 'win32':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def sync_batch(targets, sources):
+    """持久化一批目标文件，然后删除已复制的源文件（在同步线程中执行）
+
+    先逐个 fsync 文件数据，再对涉及的每个目标目录 fsync 一次；
+    sources 中与 targets 对应的项不为 None 时，该源文件在目标持久化之后才删除。
+    返回与 targets 对应的结果列表：成功为 None，失败为异常（此时源文件保留）。
+    """
+    results = [None] * len(targets)
+    directories = {}
+    for index, target in enumerate(targets):
+        try:
+            fsync_file(target)
+        except OSError as e:
+            results[index] = e
+            continue
+        directories.setdefault(os.path.dirname(target), []).append(index)
+
+    for directory, indexes in directories.items():
+        try:
+            fsync_directory(directory)
+        except OSError as e:
+            for index in indexes:
+                results[index] = e
+
+    # 目标已持久化，放行这批源文件的删除
+    source_dirs = set()
+    for index, source in enumerate(sources):
+        if source is None or results[index] is not None:
+            continue
+        try:
+            os.unlink(source)
+            source_dirs.add(os.path.dirname(source))
+        except OSError as e:
+            results[index] = e
+    for directory in source_dirs:
+        try:
+            fsync_directory(directory)
+        except OSError:
+            pass
+    return results
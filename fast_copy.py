@@ -0,0 +1,228 @@
+import os
+import stat
+import errno
+import shutil
+import hashlib
+from collections import deque
+
+# 小文件快速复制的默认阈值和批大小
+SMALL_FILE_THRESHOLD = 64 * 1024
+SMALL_FILE_BATCH = 64
+READAHEAD_FILES = 8
+COPY_CHUNK = 1024 * 1024
+# 不小于该大小的普通文件先预分配目标空间
+PREALLOCATE_THRESHOLD = 8 * 1024 * 1024
+
+_O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def _readahead(fd):
+    """提示内核预读整个文件"""
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+
+
+def _write_all(fd, view):
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+
+if hasattr(os, "readv"):
+    def _readinto(fd, buffer):
+        return os.readv(fd, [buffer])
+else:  # Windows
+    def _readinto(fd, buffer):
+        data = os.read(fd, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _copy_small(source_fd, target, buffer, view, hasher=None):
+    """用复用的缓冲区复制一个小文件，返回源文件的 stat"""
+    st = os.fstat(source_fd)
+    target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+    try:
+        while True:
+            length = _readinto(source_fd, buffer)
+            if length == 0:
+                break
+            if hasher is not None:
+                hasher.update(view[:length])
+            _write_all(target_fd, view[:length])
+    finally:
+        os.close(target_fd)
+    return st
+
+
+def copy_small_files(sources, targets, buffer_size=SMALL_FILE_THRESHOLD, readahead=READAHEAD_FILES,
+                     throttle=None, hash_name=None):
+    """批量复制小文件（可在线程或进程中执行）
+
+    预先打开后面 readahead 个文件并提示内核并行预读，数据经同一个缓冲区写出，
+    所有文件写完后再统一设置权限和时间戳。返回与 sources 对应的结果列表：成功为复制的字节数，失败为异常。
+    传入 throttle 时每个文件计一次操作和文件大小的流量；
+    传入 hash_name 时用同一缓冲区中的数据计算摘要，成功的结果为 (字节数, 摘要)。
+    """
+    results = [0] * len(sources)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    opened = deque()
+    metadata = []
+    next_index = 0
+
+    def open_ahead():
+        nonlocal next_index
+        while next_index < len(sources) and len(opened) < readahead:
+            index = next_index
+            next_index += 1
+            try:
+                fd = os.open(sources[index], os.O_RDONLY | _O_BINARY)
+            except OSError as e:
+                results[index] = e
+                continue
+            _readahead(fd)
+            opened.append((index, fd))
+
+    try:
+        open_ahead()
+        while opened:
+            index, fd = opened.popleft()
+            try:
+                if throttle is not None:
+                    throttle.op()
+                    throttle.data(os.fstat(fd).st_size)
+                hasher = hashlib.new(hash_name) if hash_name else None
+                st = _copy_small(fd, targets[index], buffer, view, hasher)
+                metadata.append((index, st))
+                results[index] = (st.st_size, hasher.hexdigest()) if hasher else st.st_size
+            except OSError as e:
+                results[index] = e
+                try:
+                    os.unlink(targets[index])
+                except OSError:
+                    pass
+            finally:
+                os.close(fd)
+            open_ahead()
+    finally:
+        for _, fd in opened:
+            os.close(fd)
+
+    # 统一设置元数据
+    for index, st in metadata:
+        try:
+            os.utime(targets[index], ns=(st.st_atime_ns, st.st_mtime_ns))
+            os.chmod(targets[index], stat.S_IMODE(st.st_mode))
+        except OSError as e:
+            results[index] = e
+    return results
+
+
+def _is_sparse(st):
+    """根据已分配的块数判断文件是否含有空洞（需要 SEEK_DATA 支持）"""
+    blocks = getattr(st, "st_blocks", None)
+    return hasattr(os, "SEEK_DATA") and blocks is not None and blocks * 512 < st.st_size
+
+
+def _data_regions(fd, size):
+    """用 SEEK_DATA/SEEK_HOLE 逐个产出文件中的数据区段 (偏移, 长度)"""
+    offset = 0
+    while offset < size:
+        try:
+            start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            # 之后只剩空洞
+            if e.errno == errno.ENXIO:
+                return
+            raise
+        end = os.lseek(fd, start, os.SEEK_HOLE)
+        yield start, end - start
+        offset = end
+
+
+def _preallocate(fd, size):
+    """预分配目标文件空间，文件系统不支持时忽略"""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError:
+        pass
+
+
+def _hash_zeros(hasher, length, view):
+    """把空洞按全零数据计入摘要"""
+    while length > 0:
+        chunk = min(length, len(view))
+        hasher.update(view[:chunk])
+        length -= chunk
+
+
+def _copy_range(source_fd, target_fd, offset, length, view, throttle, hasher=None):
+    """经缓冲区复制 [offset, offset + length) 范围的数据"""
+    os.lseek(source_fd, offset, os.SEEK_SET)
+    os.lseek(target_fd, offset, os.SEEK_SET)
+    while length > 0:
+        read = _readinto(source_fd, view[:min(length, len(view))])
+        if read == 0:
+            break
+        if throttle is not None:
+            throttle.data(read)
+        if hasher is not None:
+            hasher.update(view[:read])
+        _write_all(target_fd, view[:read])
+        length -= read
+
+
+def copy_file(source, target, throttle=None, buffer_size=COPY_CHUNK, preallocate_threshold=PREALLOCATE_THRESHOLD,
+              hasher=None):
+    """复制文件及其元数据（可作为 shutil.move 的 copy_function）
+
+    稀疏文件只复制 SEEK_DATA/SEEK_HOLE 找到的数据区段，目标保留空洞；
+    不小于 preallocate_threshold 的普通文件先用 posix_fallocate 预分配，减少目标碎片。
+    传入 hasher 时复制过程中同时更新源数据的摘要（空洞按全零计入）。
+    其余文件在不限带宽且不计算摘要时直接使用 shutil.copy2。
+    """
+    st = os.stat(source)
+    sparse = _is_sparse(st)
+    preallocate = (not sparse and preallocate_threshold > 0 and st.st_size >= preallocate_threshold
+                   and hasattr(os, "posix_fallocate"))
+    if (not sparse and not preallocate and hasher is None
+            and (throttle is None or not throttle.limits_bandwidth)):
+        return shutil.copy2(source, target)
+
+    view = memoryview(bytearray(buffer_size))
+    zeros = memoryview(bytes(buffer_size)) if sparse and hasher is not None else None
+    source_fd = os.open(source, os.O_RDONLY | _O_BINARY)
+    try:
+        target_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, 0o666)
+        try:
+            if sparse:
+                position = 0
+                for offset, length in _data_regions(source_fd, st.st_size):
+                    if hasher is not None:
+                        _hash_zeros(hasher, offset - position, zeros)
+                    _copy_range(source_fd, target_fd, offset, length, view, throttle, hasher)
+                    position = offset + length
+                if hasher is not None:
+                    _hash_zeros(hasher, st.st_size - position, zeros)
+                # 末尾的空洞只需设置文件长度
+                os.ftruncate(target_fd, st.st_size)
+            else:
+                if preallocate:
+                    _preallocate(target_fd, st.st_size)
+                _copy_range(source_fd, target_fd, 0, st.st_size, view, throttle, hasher)
+        except BaseException:
+            os.close(target_fd)
+            try:
+                os.unlink(target)
+            except OSError:
+                pass
+            raise
+        os.close(target_fd)
+    finally:
+        os.close(source_fd)
+    shutil.copystat(source, target)
+    return target
@@ -0,0 +1,94 @@
+import os
+import sys
+from array import array
+from itertools import accumulate
+
+# 文件名按 UTF-8 保存，无法编码的字符原样往返
+_ERRORS = 'surrogatepass' if sys.platform == 'win32' else 'surrogateescape'
+_SEPARATORS = (os.sep, os.altsep) if os.altsep else (os.sep,)
+
+
+class FileList:
+    """紧凑的列式文件列表
+
+    目录路径只保存一次，文件通过目录编号引用；所有文件名拼接在一个字节数组中，按偏移取出。
+    每个文件固定占用目录编号 4 字节 + 名称结束偏移 8 字节，加上名称本身的 UTF-8 字节；
+    可选的 inode、大小、修改时间（纳秒）各 8 字节，保存在 array 中。
+    典型文件名下每个文件不到 64 字节，而每个文件一个路径字符串（或 Path 对象）要数百字节。
+    迭代或下标访问时才临时拼出完整路径。
+    """
+
+    def __init__(self, with_inodes=False, with_sizes=False, with_mtimes=False):
+        self.directories = []
+        self._prefixes = []
+        self.dir_ids = array('I')
+        self._ends = array('Q')
+        self._names = bytearray()
+        self.inodes = array('Q') if with_inodes else None
+        self.sizes = array('q') if with_sizes else None
+        self.mtimes = array('q') if with_mtimes else None
+
+    def add_directory(self, path):
+        """登记目录，返回目录编号"""
+        self.directories.append(path)
+        self._prefixes.append(path if path.endswith(_SEPARATORS) else path + os.sep)
+        return len(self.directories) - 1
+
+    def extend(self, dir_id, names, inodes=None, sizes=None, mtimes=None):
+        """追加同一目录下的一批文件，inodes/sizes/mtimes 与 names 一一对应"""
+        encoded = [name.encode('utf-8', _ERRORS) for name in names]
+        base = len(self._names)
+        self._names += b"".join(encoded)
+        self._ends.extend(base + end for end in accumulate(len(name) for name in encoded))
+        self.dir_ids.extend([dir_id] * len(encoded))
+        for column, values in ((self.inodes, inodes), (self.sizes, sizes), (self.mtimes, mtimes)):
+            if column is not None:
+                column.extend(values)
+
+    def append(self, dir_id, name, inode=0, size=-1, mtime=0):
+        """追加一个文件"""
+        self.extend(dir_id, [name], [inode], [size], [mtime])
+
+    def __len__(self):
+        return len(self.dir_ids)
+
+    def _start(self, index):
+        return self._ends[index - 1] if index > 0 else 0
+
+    def name(self, index):
+        """文件名"""
+        return self._names[self._start(index):self._ends[index]].decode('utf-8', _ERRORS)
+
+    def directory(self, index):
+        """文件所在目录"""
+        return self.directories[self.dir_ids[index]]
+
+    def __getitem__(self, index):
+        """完整路径"""
+        if index < 0:
+            index += len(self)
+        return self._prefixes[self.dir_ids[index]] + self.name(index)
+
+    def __iter__(self):
+        names = self._names
+        prefixes = self._prefixes
+        start = 0
+        for dir_id, end in zip(self.dir_ids, self._ends):
+            yield prefixes[dir_id] + names[start:end].decode('utf-8', _ERRORS)
+            start = end
+
+    def iter_names(self):
+        """依次返回文件名（不含目录）"""
+        names = self._names
+        start = 0
+        for end in self._ends:
+            yield names[start:end].decode('utf-8', _ERRORS)
+            start = end
+
+    def nbytes(self):
+        """估算占用的内存字节数"""
+        total = sys.getsizeof(self._names) + sum(sys.getsizeof(path) * 2 for path in self.directories)
+        for column in (self.dir_ids, self._ends, self.inodes, self.sizes, self.mtimes):
+            if column is not None:
+                total += column.itemsize * len(column)
+        return total
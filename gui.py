@@ -1,5 +1,4 @@
 import os
-import shutil
 import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext, simpledialog
@@ -11,6 +10,30 @@ from datetime import datetime, timedelta
 import logging
 from logging.handlers import TimedRotatingFileHandler
 import time
+from undo_journal import undo_last_run
+from scan_filter import scan_options, ScanFilter
+from scan_cache import ScanCache
+from rules import validate_rule, default_folder
+from rule_store import RuleStore, RuleStoreError, RuleStoreUnavailable, default_state
+from rules_view import RulesView
+from match_preview import build_preview
+from analyze import analyze
+from rule_package import (read_rule_package, diff_rule_package, apply_rule_package, build_rule_package,
+                          IMPORT_MERGE, IMPORT_REPLACE_GROUPS, IMPORT_REPLACE_ALL)
+from organize_engine import OrganizeEngine, Route, EVENT_START, EVENT_COPIED, EVENT_ERROR, EVENT_PROGRESS
+from batch_ops import delete_empty_items, EVENT_DELETED
+from io_scheduler import ORDER_SCAN, ORDER_INODE, ORDER_EXTENT
+from fast_copy import SMALL_FILE_THRESHOLD
+from throttle import format_rate, format_size
+
+# 规则修改后延迟保存的时间（毫秒），期间的多次修改合并为一次写入
+RULES_SAVE_DELAY_MS = 500
+# 搜索框停止输入多久后开始筛选（毫秒）
+RULES_SEARCH_DELAY_MS = 150
+# 规则修改或输入后多久更新匹配预览（毫秒）
+PREVIEW_DELAY_MS = 100
+# 匹配预览中显示的规则数（按匹配文件数从多到少）
+PREVIEW_ROWS = 20
 
 class FileOrganizerGUI:
     def __init__(self, root):
@@ -39,9 +62,15 @@ class FileOrganizerGUI:
             "默认规则组": {}  # 默认规则组
         }
         self.current_group = "默认规则组"
+        self.group_options = {}  # 规则组的扫描设置
         self.resources_dir = Path("resources")
         self.resources_dir.mkdir(exist_ok=True)
-        self.config_file = self.resources_dir / "file_rules.json"
+        self.store = RuleStore(self.resources_dir)
+        self._save_job = None  # 延迟保存规则的定时任务
+        self.undo_dir = self.resources_dir / "undo"
+        self.verify_dir = self.resources_dir / "verify"
+        self.scan_cache_dir = self.resources_dir / "scan_cache"
+        self.analysis_dir = self.resources_dir / "analysis"
         self.processed_files = 0
         self.skipped_files = 0
         self.error_files = 0
@@ -197,29 +226,29 @@ class FileOrganizerGUI:
     
     def load_rules(self):
         """加载已保存的分类规则"""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.rule_groups = data.get("rule_groups", {"默认规则组": {}})
-                    self.current_group = data.get("current_group", "默认规则组")
-            except json.JSONDecodeError:
-                messagebox.showwarning("警告", "规则文件损坏，将创建新的规则文件")
-                self.rule_groups = {"默认规则组": {}}
-                self.current_group = "默认规则组"
-        else:
-            self.rule_groups = {"默认规则组": {}}
-            self.current_group = "默认规则组"
+        try:
+            self.rule_groups, self.current_group, self.group_options = self.store.load()
+        except RuleStoreUnavailable as e:
+            messagebox.showwarning("警告", f"{str(e)}\n\n暂时使用空的规则，修改不会保存。"
+                                           "请关闭其他正在使用规则文件的程序后重新启动。")
+            self.rule_groups, self.current_group, self.group_options = default_state()
+        except RuleStoreError as e:
+            messagebox.showwarning("警告", f"{str(e)}，将创建新的规则文件")
+            self.rule_groups, self.current_group, self.group_options = default_state()
     
-    def save_rules(self):
-        """保存分类规则"""
+    def save_rules(self, changed_groups=None):
+        """保存分类规则：记录有变化的规则组，短时间内的多次修改合并为一次写入"""
+        self.store.mark_dirty(changed_groups)
+        if self._save_job is None:
+            self._save_job = self.root.after(RULES_SAVE_DELAY_MS, self.flush_rules)
+    
+    def flush_rules(self):
+        """立即写入尚未保存的规则修改"""
+        if self._save_job is not None:
+            self.root.after_cancel(self._save_job)
+            self._save_job = None
         try:
-            data = {
-                "rule_groups": self.rule_groups,
-                "current_group": self.current_group
-            }
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            self.store.flush(self.rule_groups, self.current_group, self.group_options)
         except Exception as e:
             messagebox.showerror("错误", f"保存规则时出错: {str(e)}")
     
@@ -263,6 +292,7 @@ class FileOrganizerGUI:
         """窗口关闭时的处理"""
         # 记录关闭日志
         logging.info("程序关闭")
+        self.flush_rules()
         self.save_window_position()
         self.root.destroy()
     
@@ -313,10 +343,24 @@ class FileOrganizerGUI:
         # 规则组管理按钮
         ttk.Button(group_frame, text="管理规则组", command=self.show_group_management_dialog).pack(side=tk.RIGHT)
         
+        # 扫描设置按钮
+        ttk.Button(group_frame, text="扫描设置", command=self.show_scan_options_dialog).pack(side=tk.RIGHT, padx=(0, 5))
+        
         # 规则列表框架
         list_frame = ttk.LabelFrame(parent, text="当前规则", padding="10")
         list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # 搜索框
+        search_frame = ttk.Frame(list_frame)
+        search_frame.pack(fill=tk.X, side=tk.TOP, pady=(0, 5))
+        ttk.Label(search_frame, text="搜索:").pack(side=tk.LEFT)
+        self.rules_search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.rules_search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.rules_count_var = tk.StringVar()
+        ttk.Label(search_frame, textvariable=self.rules_count_var).pack(side=tk.RIGHT)
+        self._search_job = None
+        self.rules_search_var.trace_add("write", self.on_rules_search)
+        
         # 规则列表
         self.rules_tree = ttk.Treeview(list_frame, columns=("keyword", "folder"), show="headings")
         self.rules_tree.heading("keyword", text="关键词/扩展名")
@@ -328,7 +372,7 @@ class FileOrganizerGUI:
         # 滚动条
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.rules_tree.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.rules_tree.configure(yscrollcommand=scrollbar.set)
+        self.rules_view = RulesView(self.rules_tree, scrollbar)
         
         # 按钮框架
         btn_frame = ttk.Frame(parent)
@@ -349,6 +393,40 @@ class FileOrganizerGUI:
         # 导出规则包按钮
         ttk.Button(btn_frame, text="导出规则包", command=self.export_rule_package).pack(side=tk.LEFT, padx=5)
         
+        # 匹配预览框架
+        preview_frame = ttk.LabelFrame(parent, text="匹配预览", padding="10")
+        preview_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        # 预览源目录
+        preview_source_frame = ttk.Frame(preview_frame)
+        preview_source_frame.pack(fill=tk.X)
+        ttk.Label(preview_source_frame, text="源目录:").pack(side=tk.LEFT)
+        self.preview_source_var = tk.StringVar()
+        ttk.Entry(preview_source_frame, textvariable=self.preview_source_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        ttk.Button(preview_source_frame, text="浏览", command=self.browse_preview_source).pack(side=tk.LEFT)
+        self.preview_btn = ttk.Button(preview_source_frame, text="扫描", command=self.start_preview_scan)
+        self.preview_btn.pack(side=tk.LEFT, padx=(5, 0))
+        
+        # 每条规则的匹配数量
+        self.preview_tree = ttk.Treeview(preview_frame, columns=("keyword", "folder", "files", "size"),
+                                         show="headings", height=5)
+        self.preview_tree.heading("keyword", text="规则")
+        self.preview_tree.heading("folder", text="目标文件夹")
+        self.preview_tree.heading("files", text="文件数")
+        self.preview_tree.heading("size", text="大小")
+        self.preview_tree.column("keyword", width=200)
+        self.preview_tree.column("folder", width=150)
+        self.preview_tree.column("files", width=80, anchor=tk.E)
+        self.preview_tree.column("size", width=80, anchor=tk.E)
+        self.preview_tree.tag_configure("draft", background="#fff2cc")
+        self.preview_tree.pack(fill=tk.X, pady=5)
+        
+        self.preview_status_var = tk.StringVar(value="扫描源目录后，修改规则时会实时显示每条规则匹配的文件数和大小")
+        ttk.Label(preview_frame, textvariable=self.preview_status_var).pack(anchor=tk.W)
+        self.preview = None
+        self._preview_job = None
+        self._preview_draft = None
+        
         # 刷新规则列表
         self.refresh_rules_list()
     
@@ -357,10 +435,75 @@ class FileOrganizerGUI:
         selected_group = self.group_var.get()
         if selected_group != self.current_group:
             self.current_group = selected_group
-            self.save_rules()
+            self.save_rules([])
             self.refresh_rules_list()
             self.add_log(f"已切换到规则组: {selected_group}")
     
+    def show_scan_options_dialog(self):
+        """显示当前规则组的扫描设置对话框（排除目录、最大深度、隐藏文件）"""
+        group_name = self.current_group
+        options = scan_options(self.group_options, group_name)
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"扫描设置 - {group_name}")
+        dialog.geometry("420x380")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # 使对话框居中显示
+        self.center_window(dialog)
+        
+        # 主框架
+        main_frame = ttk.Frame(dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 排除目录
+        ttk.Label(main_frame, text="排除的目录（每行一个，支持通配符，如 node_modules、photos/*/thumbs，** 匹配多层目录）:").pack(anchor=tk.W)
+        exclude_text = tk.Text(main_frame, height=10, width=48)
+        exclude_text.pack(fill=tk.BOTH, expand=True, pady=5)
+        exclude_text.insert("1.0", "\n".join(options["exclude"]))
+        
+        # 最大深度
+        depth_frame = ttk.Frame(main_frame)
+        depth_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(depth_frame, text="最大目录深度（0 表示不限制）:").pack(side=tk.LEFT)
+        depth_var = tk.StringVar(value=str(options["max_depth"]))
+        ttk.Spinbox(depth_frame, from_=0, to=999, textvariable=depth_var, width=6).pack(side=tk.LEFT, padx=5)
+        
+        # 隐藏文件
+        hidden_var = tk.BooleanVar(value=options["skip_hidden"])
+        ttk.Checkbutton(main_frame, text="跳过隐藏文件和隐藏目录（以 . 开头）", variable=hidden_var).pack(anchor=tk.W, pady=5)
+        
+        def save_options():
+            try:
+                max_depth = int(depth_var.get() or 0)
+                if max_depth < 0:
+                    raise ValueError
+            except ValueError:
+                messagebox.showwarning("警告", "最大目录深度必须是大于等于0的整数！", parent=dialog)
+                return
+            
+            exclude = [line.strip() for line in exclude_text.get("1.0", tk.END).splitlines() if line.strip()]
+            self.group_options[group_name] = {
+                "exclude": exclude,
+                "max_depth": max_depth,
+                "skip_hidden": hidden_var.get()
+            }
+            self.save_rules([])
+            self.add_log(f"已保存规则组 '{group_name}' 的扫描设置")
+            dialog.destroy()
+        
+        # 按钮框架
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        # 保存按钮
+        ttk.Button(btn_frame, text="保存", command=save_options).pack(side=tk.RIGHT, padx=5)
+        
+        # 取消按钮
+        ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side=tk.RIGHT, padx=5)
+    
     def show_group_management_dialog(self):
         """显示规则组管理对话框"""
         dialog = tk.Toplevel(self.root)
@@ -414,7 +557,7 @@ class FileOrganizerGUI:
                     messagebox.showwarning("警告", f"规则组 '{name}' 已存在！", parent=dialog)
                     return
                 self.rule_groups[name] = {}
-                self.save_rules()
+                self.save_rules([name])
                 refresh_group_list()
                 self.add_log(f"已添加规则组: {name}")
         
@@ -431,10 +574,11 @@ class FileOrganizerGUI:
             
             if messagebox.askyesno("确认", f"确定要删除规则组 '{group_name}' 吗？", parent=dialog):
                 del self.rule_groups[group_name]
+                self.group_options.pop(group_name, None)
                 if self.current_group == group_name:
                     self.current_group = "默认规则组"
                     self.group_var.set(self.current_group)
-                self.save_rules()
+                self.save_rules([group_name])
                 refresh_group_list()
                 self.refresh_rules_list()
                 self.add_log(f"已删除规则组: {group_name}")
@@ -459,13 +603,15 @@ class FileOrganizerGUI:
                 
                 # 重命名规则组
                 self.rule_groups[new_name] = self.rule_groups.pop(old_name)
+                if old_name in self.group_options:
+                    self.group_options[new_name] = self.group_options.pop(old_name)
                 
                 # 更新当前规则组
                 if self.current_group == old_name:
                     self.current_group = new_name
                     self.group_var.set(self.current_group)
                 
-                self.save_rules()
+                self.save_rules([old_name, new_name])
                 refresh_group_list()
                 self.refresh_rules_list()
                 self.add_log(f"已将规则组 '{old_name}' 重命名为 '{new_name}'")
@@ -523,7 +669,7 @@ class FileOrganizerGUI:
         group_combo.pack(fill=tk.X, expand=True)
         
         # 关键词框架
-        keyword_frame = ttk.LabelFrame(main_frame, text="关键词或文件扩展名", padding="10")
+        keyword_frame = ttk.LabelFrame(main_frame, text="关键词或扩展名（也可用 dir: / glob: / re: / type:pdf 前缀，可加 & size:>1GB / & age:>365d）", padding="10")
         keyword_frame.pack(fill=tk.X, pady=(0, 10))
         
         # 关键词输入框
@@ -540,6 +686,9 @@ class FileOrganizerGUI:
         folder_entry = ttk.Entry(folder_frame, textvariable=folder_var, width=40)
         folder_entry.pack(fill=tk.X, expand=True)
         
+        # 输入时实时预览这条规则的匹配结果
+        self.watch_rule_draft(dialog, group_var, keyword_var, folder_var)
+        
         # 按钮框架 - 使用网格布局
         btn_frame = ttk.Frame(main_frame)
         btn_frame.pack(fill=tk.X, pady=(10, 5))
@@ -553,17 +702,25 @@ class FileOrganizerGUI:
                 messagebox.showwarning("警告", "关键词不能为空！", parent=dialog)
                 return
             
+            try:
+                validate_rule(keyword)
+            except ValueError as e:
+                messagebox.showwarning("警告", f"规则无效: {str(e)}", parent=dialog)
+                return
+            
             # 如果文件夹名称为空，则使用关键词作为文件夹名称
             if not folder:
-                folder = keyword
+                folder = default_folder(keyword)
             
             # 规范化文件夹名称
             folder = folder.replace('/', '_').replace('\\', '_')
             
             # 添加规则
             self.rule_groups[group_name][keyword] = folder
-            self.save_rules()
-            self.refresh_rules_list()
+            self.save_rules([group_name])
+            if group_name == self.current_group:
+                self.rules_view.set_rule(keyword, folder)
+                self.on_rules_changed()
             
             # 关闭对话框
             dialog.destroy()
@@ -584,110 +741,258 @@ class FileOrganizerGUI:
         btn_frame.grid_columnconfigure(1, weight=1)
     
     def refresh_rules_list(self):
-        """刷新规则列表"""
-        # 清空列表
-        for item in self.rules_tree.get_children():
-            self.rules_tree.delete(item)
-        
-        # 添加规则
-        current_rules = self.get_current_rules()
-        for keyword, folder in current_rules.items():
-            self.rules_tree.insert("", tk.END, values=(keyword, folder))
+        """重新显示当前规则组（切换规则组或批量修改后调用，单条修改只更新对应的行）"""
+        self.rules_view.load(self.get_current_rules())
+        self.on_rules_changed()
+    
+    def on_rules_changed(self):
+        """当前规则组的规则变化后更新数量显示和匹配预览"""
+        self.update_rules_count()
+        self.schedule_preview()
+    
+    def update_rules_count(self):
+        """更新规则数量显示"""
+        if self.rules_view.query:
+            self.rules_count_var.set(f"匹配 {self.rules_view.shown} / {self.rules_view.total} 条")
+        else:
+            self.rules_count_var.set(f"共 {self.rules_view.total} 条")
+    
+    def on_rules_search(self, *_):
+        """搜索框内容变化时延迟筛选，连续输入只筛选一次"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(RULES_SEARCH_DELAY_MS, self.apply_rules_search)
+    
+    def apply_rules_search(self):
+        self._search_job = None
+        self.rules_view.search(self.rules_search_var.get())
+        self.update_rules_count()
+    
+    def browse_preview_source(self):
+        """浏览选择预览的源目录"""
+        directory = filedialog.askdirectory(title="选择源目录")
+        if directory:
+            self.preview_source_var.set(directory)
+            self.start_preview_scan()
+    
+    def start_preview_scan(self):
+        """扫描源目录（只读取元数据）建立匹配预览，之后修改规则只做增量计算"""
+        source_dir = self.preview_source_var.get().strip() or self.source_var.get().strip()
+        if not source_dir or not os.path.isdir(source_dir):
+            messagebox.showwarning("警告", "请选择有效的源目录")
+            return
+        self.preview_source_var.set(source_dir)
+        self.preview_btn.config(state=tk.DISABLED)
+        self.preview_status_var.set("正在扫描...")
+        
+        thread = threading.Thread(target=self.preview_scan_thread, args=(
+            source_dir, scan_options(self.group_options, self.current_group),
+            self.scan_cache_dir if self.scan_cache_var.get() else None, dict(self.get_current_rules())))
+        thread.daemon = True
+        thread.start()
+    
+    def preview_scan_thread(self, source_dir, options, scan_cache_dir, rules):
+        """预览扫描线程：扫描源目录并按当时的规则完成第一次完整计算"""
+        try:
+            scan_cache = ScanCache.for_source(scan_cache_dir, source_dir) if scan_cache_dir else None
+            preview = build_preview(source_dir, ScanFilter(**options), scan_cache)
+            if scan_cache is not None:
+                try:
+                    scan_cache.save()
+                except OSError:
+                    # 缓存只用于加速，保存失败不影响预览
+                    pass
+            preview.evaluate(rules)
+            self.root.after(0, self.finish_preview_scan, preview, None)
+        except Exception as e:
+            self.root.after(0, self.finish_preview_scan, None, str(e))
+    
+    def finish_preview_scan(self, preview, error):
+        """预览扫描完成（在界面线程中执行）"""
+        self.preview_btn.config(state=tk.NORMAL)
+        if error is not None:
+            self.preview_status_var.set(f"扫描失败: {error}")
+            self.add_log(f"匹配预览扫描失败: {error}")
+            return
+        self.preview = preview
+        self.update_preview()
+    
+    def watch_rule_draft(self, dialog, group_var, keyword_var, folder_var, old_keyword=None):
+        """添加/修改规则对话框中每次输入都更新匹配预览，对话框关闭后恢复为已保存的规则"""
+        def update(*_):
+            self._preview_draft = (group_var.get(), old_keyword, keyword_var.get().strip(), folder_var.get().strip())
+            self.schedule_preview()
+        
+        def closed(event):
+            if event.widget is dialog:
+                self._preview_draft = None
+                self.schedule_preview()
+        
+        for var in (group_var, keyword_var, folder_var):
+            var.trace_add("write", update)
+        dialog.bind("<Destroy>", closed)
+    
+    def schedule_preview(self):
+        """稍后更新匹配预览，连续输入只计算一次"""
+        if self.preview is None:
+            return
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(PREVIEW_DELAY_MS, self.update_preview)
+    
+    def preview_rules(self):
+        """当前规则组的规则加上对话框中正在编辑的规则，返回 (规则, 正在编辑的关键词)"""
+        rules = self.get_current_rules()
+        draft = self._preview_draft
+        if draft is None or draft[0] != self.current_group or not draft[2]:
+            return rules, None
+        _, old_keyword, keyword, folder = draft
+        # 与保存时相同：关键词改变时旧规则删除，新规则排在最后
+        rules = dict(rules)
+        if old_keyword is not None and old_keyword != keyword:
+            rules.pop(old_keyword, None)
+        rules[keyword] = folder or default_folder(keyword)
+        return rules, keyword
+    
+    def update_preview(self):
+        """按当前规则更新匹配预览（只重新计算受变化影响的文件）"""
+        self._preview_job = None
+        preview = self.preview
+        if preview is None:
+            return
+        started = time.perf_counter()
+        try:
+            rules, draft = self.preview_rules()
+            preview.evaluate(rules)
+        except ValueError as e:
+            self.preview_status_var.set(f"规则无效: {str(e)}")
+            return
+        elapsed = time.perf_counter() - started
+        
+        self.preview_tree.delete(*self.preview_tree.get_children())
+        rows = preview.top_rules(PREVIEW_ROWS)
+        if draft is not None:
+            rows = [(draft, *preview.stats(draft))] + [row for row in rows if row[0] != draft]
+        for keyword, files, size in rows:
+            if keyword in preview.unsupported:
+                files_text, size_text = "需读取内容", ""
+            else:
+                files_text, size_text = str(files), format_size(size)
+            self.preview_tree.insert("", tk.END, values=(keyword, rules[keyword], files_text, size_text),
+                                     tags=("draft",) if keyword == draft else ())
+        
+        matched_files, matched_bytes = preview.matched()
+        unmatched_files, unmatched_bytes = preview.stats(None)
+        estimate = "（抽样估计）" if preview.sampled else ""
+        self.preview_status_var.set(
+            f"共 {preview.total_files} 个文件{estimate}：已匹配 {matched_files} 个（{format_size(matched_bytes)}），"
+            f"未匹配 {unmatched_files} 个（{format_size(unmatched_bytes)}），计算用时 {elapsed * 1000:.0f} 毫秒")
     
     def delete_rule(self):
         """删除选中的规则"""
-        selected = self.rules_tree.selection()
-        if not selected:
+        keywords = self.rules_view.selected_keywords()
+        if not keywords:
             messagebox.showinfo("提示", "请先选择要删除的规则")
             return
         
         if messagebox.askyesno("确认", "确定要删除选中的规则吗？"):
-            for item in selected:
-                values = self.rules_tree.item(item, "values")
-                keyword = values[0]
+            for keyword in keywords:
                 del self.rule_groups[self.current_group][keyword]
                 self.add_log(f"已从规则组 '{self.current_group}' 中删除规则: {keyword}")
             
-            self.save_rules()
-            self.refresh_rules_list()
+            self.save_rules([self.current_group])
+            self.rules_view.remove_rules(keywords)
+            self.on_rules_changed()
     
     def import_rule_package(self):
-        """导入规则包"""
+        """导入规则包：流式读取并校验，一次确认、一次保存、一次刷新"""
         file_path = filedialog.askopenfilename(
             title="选择规则包文件",
             filetypes=[("JSON文件", "*.json"), ("所有文件", "*.*")]
         )
         
-        if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                # 验证规则包格式
-                if not isinstance(data, dict):
-                    raise ValueError("规则包格式错误：不是有效的JSON对象")
-                
-                # 验证必需字段
-                required_fields = ["version", "type", "created_at", "rule_groups"]
-                missing_fields = [field for field in required_fields if field not in data]
-                if missing_fields:
-                    raise ValueError(f"规则包格式错误：缺少必需字段 {', '.join(missing_fields)}")
-                
-                # 验证规则包类型
-                if data["type"] != "file_organizer_rules":
-                    raise ValueError("规则包格式错误：不是有效的文件整理助手规则包")
-                
-                # 验证规则组数据
-                rule_groups = data["rule_groups"]
-                if not isinstance(rule_groups, dict):
-                    raise ValueError("规则包格式错误：rule_groups字段不是有效的规则组对象")
-                
-                # 验证规则组格式
-                for group_name, rules in rule_groups.items():
-                    if not isinstance(group_name, str) or not isinstance(rules, dict):
-                        raise ValueError("规则包格式错误：规则组数据格式不正确")
-                    for keyword, folder in rules.items():
-                        if not isinstance(keyword, str) or not isinstance(folder, str):
-                            raise ValueError("规则包格式错误：规则数据格式不正确")
-                        if not keyword or not folder:
-                            raise ValueError("规则包格式错误：规则数据不能为空")
-                
-                # 询问是否覆盖现有规则组
-                if self.rule_groups and messagebox.askyesno("确认", "是否覆盖现有规则组？"):
-                    self.rule_groups = rule_groups
-                else:
-                    # 合并规则组
-                    for group_name, rules in rule_groups.items():
-                        if group_name in self.rule_groups:
-                            # 如果规则组已存在，询问是否覆盖
-                            if messagebox.askyesno("确认", f"规则组 '{group_name}' 已存在，是否覆盖？"):
-                                self.rule_groups[group_name] = rules
-                            else:
-                                # 不覆盖，合并规则
-                                self.rule_groups[group_name].update(rules)
-                        else:
-                            # 如果规则组不存在，直接添加
-                            self.rule_groups[group_name] = rules
-                
-                # 保存规则
-                self.save_rules()
-                self.refresh_rules_list()
-                
-                # 添加日志
-                self.add_log(f"已导入规则包: {file_path}")
-                self.add_log(f"规则包版本: {data['version']}")
-                self.add_log(f"创建时间: {data['created_at']}")
-                self.add_log(f"导入规则组数量: {len(rule_groups)}")
-                
-            except json.JSONDecodeError:
-                messagebox.showerror("错误", "规则包格式错误：不是有效的JSON文件")
-                self.add_log("导入规则包失败：不是有效的JSON文件")
-            except ValueError as e:
-                messagebox.showerror("错误", str(e))
-                self.add_log(f"导入规则包失败: {str(e)}")
-            except Exception as e:
-                messagebox.showerror("错误", f"导入规则包时出错: {str(e)}")
-                self.add_log(f"导入规则包失败: {str(e)}")
+        if not file_path:
+            return
+        try:
+            package = read_rule_package(file_path)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            self.add_log(f"导入规则包失败: {str(e)}")
+            return
+        except Exception as e:
+            messagebox.showerror("错误", f"导入规则包时出错: {str(e)}")
+            self.add_log(f"导入规则包失败: {str(e)}")
+            return
+        
+        mode = self.ask_import_mode(package)
+        if mode is None:
+            return
+        
+        diff = apply_rule_package(package, self.rule_groups, self.group_options, mode)
+        if self.current_group not in self.rule_groups:
+            self.current_group = next(iter(self.rule_groups), "默认规则组")
+            self.rule_groups.setdefault(self.current_group, {})
+            self.group_var.set(self.current_group)
+        
+        # 一次写入所有变化的规则组
+        self.save_rules(diff.changed_groups)
+        self.flush_rules()
+        self.refresh_rules_list()
+        
+        # 添加日志
+        self.add_log(f"已导入规则包: {file_path}")
+        self.add_log(f"规则包版本: {package.version}")
+        self.add_log(f"创建时间: {package.created_at}")
+        self.add_log(f"导入规则组数量: {len(package.rule_groups)}，规则数量: {package.rule_count}")
+        for line in diff.summary().splitlines():
+            self.add_log(line)
+    
+    def ask_import_mode(self, package):
+        """显示导入预览并选择导入方式，取消时返回 None"""
+        mode_names = (
+            (IMPORT_MERGE, "合并到同名规则组（同名规则以规则包为准）"),
+            (IMPORT_REPLACE_GROUPS, "覆盖同名规则组"),
+            (IMPORT_REPLACE_ALL, "覆盖全部规则组（删除规则包中没有的规则组）")
+        )
+        result = []
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("导入规则包")
+        dialog.geometry("460x300")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # 使对话框居中显示
+        self.center_window(dialog)
+        
+        main_frame = ttk.Frame(dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text=f"规则包包含 {len(package.rule_groups)} 个规则组、{package.rule_count} 条规则").pack(anchor=tk.W)
+        mode_var = tk.StringVar(value=IMPORT_MERGE)
+        summary_var = tk.StringVar()
+        
+        def update_summary(*_):
+            summary_var.set(diff_rule_package(package, self.rule_groups, mode_var.get()).summary())
+        
+        for mode, text in mode_names:
+            ttk.Radiobutton(main_frame, text=text, variable=mode_var, value=mode,
+                            command=update_summary).pack(anchor=tk.W, pady=2)
+        ttk.Label(main_frame, textvariable=summary_var, justify=tk.LEFT).pack(anchor=tk.W, pady=10)
+        update_summary()
+        
+        def confirm():
+            result.append(mode_var.get())
+            dialog.destroy()
+        
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill=tk.X, side=tk.BOTTOM)
+        ttk.Button(btn_frame, text="导入", command=confirm).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        self.root.wait_window(dialog)
+        return result[0] if result else None
     
     def export_rule_package(self):
         """导出规则包"""
@@ -708,12 +1013,7 @@ class FileOrganizerGUI:
         if file_path:
             try:
                 # 创建规则包数据
-                data = {
-                    "version": "1.0",
-                    "type": "file_organizer_rules",
-                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "rule_groups": self.rule_groups
-                }
+                data = build_rule_package(self.rule_groups, self.group_options)
                 
                 with open(file_path, 'w', encoding='utf-8') as f:
                     json.dump(data, f, ensure_ascii=False, indent=4)
@@ -759,6 +1059,14 @@ class FileOrganizerGUI:
         group_combo['values'] = list(self.rule_groups.keys())
         group_combo.pack(fill=tk.X, expand=True)
         
+        # 附加规则组：同一次扫描中按其他规则组整理到各自的目标目录
+        self.extra_routes = []
+        routes_frame = ttk.Frame(group_frame)
+        routes_frame.pack(fill=tk.X, pady=(5, 0))
+        self.routes_var = tk.StringVar(value="附加规则组: 无")
+        ttk.Label(routes_frame, textvariable=self.routes_var).pack(side=tk.LEFT)
+        ttk.Button(routes_frame, text="附加规则组...", command=self.show_routes_dialog).pack(side=tk.RIGHT)
+        
         # 操作模式框架
         mode_frame = ttk.LabelFrame(parent, text="操作模式", padding="10")
         mode_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -770,6 +1078,64 @@ class FileOrganizerGUI:
         move_radio = ttk.Radiobutton(mode_frame, text="移动文件（删除源文件）", variable=self.mode_var, value="move")
         move_radio.pack(anchor=tk.W, pady=2)
         
+        # 高级选项框架
+        advanced_frame = ttk.LabelFrame(parent, text="高级选项", padding="10")
+        advanced_frame.pack(fill=tk.X, padx=5, pady=5)
+        self.advanced_frame = advanced_frame
+        
+        # 读取顺序：机械硬盘上按 inode 或物理位置排序可减少寻道
+        self.order_names = {
+            "扫描顺序": ORDER_SCAN,
+            "按 inode 排序": ORDER_INODE,
+            "按物理位置排序（机械硬盘）": ORDER_EXTENT
+        }
+        ttk.Label(advanced_frame, text="读取顺序:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5), pady=2)
+        self.order_var = tk.StringVar(value="扫描顺序")
+        order_combo = ttk.Combobox(advanced_frame, textvariable=self.order_var, state="readonly", width=28)
+        order_combo['values'] = list(self.order_names.keys())
+        order_combo.grid(row=0, column=1, sticky=tk.W, pady=2)
+        
+        # 小文件批量复制：预读并复用缓冲区，适合大量几 KB 的文件
+        self.small_files_var = tk.BooleanVar(value=False)
+        small_files_check = ttk.Checkbutton(advanced_frame, text=f"小文件批量复制（不超过 {SMALL_FILE_THRESHOLD // 1024} KB，仅复制模式）",
+                                            variable=self.small_files_var)
+        small_files_check.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 限速：避免整理时挤占文件服务器上的前台业务
+        limit_frame = ttk.Frame(advanced_frame)
+        limit_frame.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=2)
+        ttk.Label(limit_frame, text="带宽限制 (MB/s):").pack(side=tk.LEFT)
+        self.limit_mb_var = tk.StringVar(value="0")
+        ttk.Entry(limit_frame, textvariable=self.limit_mb_var, width=8).pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Label(limit_frame, text="每秒文件数:").pack(side=tk.LEFT)
+        self.limit_ops_var = tk.StringVar(value="0")
+        ttk.Entry(limit_frame, textvariable=self.limit_ops_var, width=8).pack(side=tk.LEFT, padx=5)
+        ttk.Label(limit_frame, text="（0 表示不限制）").pack(side=tk.LEFT)
+        
+        # 低优先级
+        self.low_priority_var = tk.BooleanVar(value=False)
+        low_priority_check = ttk.Checkbutton(advanced_frame, text="低优先级运行（空闲 I/O 优先级，较高 nice 值）",
+                                             variable=self.low_priority_var)
+        low_priority_check.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 校验：复制时计算摘要，复制后重新读取目标比对，移动模式校验通过才删除源文件
+        self.verify_var = tk.BooleanVar(value=False)
+        verify_check = ttk.Checkbutton(advanced_frame, text="复制后校验（SHA-256，移动模式写入磁盘并校验通过后才删除源文件）",
+                                       variable=self.verify_var)
+        verify_check.grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 持久化：适合网络存储，分批 fsync 后才删除源文件
+        self.durable_var = tk.BooleanVar(value=False)
+        durable_check = ttk.Checkbutton(advanced_frame, text="确保写入磁盘（分批 fsync，移动模式写入后才删除源文件）",
+                                        variable=self.durable_var)
+        durable_check.grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
+        # 扫描缓存：重复整理大量不变的目录时跳过未变化的目录
+        self.scan_cache_var = tk.BooleanVar(value=False)
+        scan_cache_check = ttk.Checkbutton(advanced_frame, text="使用扫描缓存（重复整理时跳过未变化的目录，不适用于 FAT/exFAT）",
+                                           variable=self.scan_cache_var)
+        scan_cache_check.grid(row=6, column=0, columnspan=2, sticky=tk.W, pady=2)
+        
         # 开始按钮
         start_frame = ttk.Frame(parent)
         start_frame.pack(fill=tk.X, padx=5, pady=10)
@@ -777,6 +1143,14 @@ class FileOrganizerGUI:
         self.start_btn = ttk.Button(start_frame, text="开始整理", command=self.start_organize)
         self.start_btn.pack(side=tk.RIGHT)
         
+        # 撤销按钮
+        self.undo_btn = ttk.Button(start_frame, text="撤销上次移动", command=self.start_undo)
+        self.undo_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # 分析按钮：只扫描不整理
+        self.analyze_btn = ttk.Button(start_frame, text="分析（只扫描）", command=self.start_analyze)
+        self.analyze_btn.pack(side=tk.RIGHT)
+        
         # 进度条
         self.progress_var = tk.DoubleVar()
         self.progress = ttk.Progressbar(parent, variable=self.progress_var, maximum=100, length=300, mode='determinate')
@@ -787,6 +1161,95 @@ class FileOrganizerGUI:
         status_label = ttk.Label(parent, textvariable=self.status_var)
         status_label.pack(anchor=tk.W, padx=5)
 
+    def show_routes_dialog(self):
+        """编辑附加规则组：每条为 (规则组, 目标目录, 操作模式)，与上面选择的规则组在同一次扫描中整理"""
+        mode_names = {"复制": "copy", "移动": "move"}
+        mode_labels = {value: name for name, value in mode_names.items()}
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("附加规则组")
+        dialog.geometry("560x400")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # 使对话框居中显示
+        self.center_window(dialog)
+        
+        main_frame = ttk.Frame(dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="按顺序（上面选择的规则组最先）：文件复制到每个匹配的复制规则组，\n"
+                                   "遇到第一个匹配的移动规则组时移动、不再交给后面的规则组；\n"
+                                   "排除目录、最大深度和隐藏文件设置使用上面选择的规则组的。",
+                  justify=tk.LEFT).pack(anchor=tk.W)
+        routes_tree = ttk.Treeview(main_frame, columns=("group", "target", "mode"), show="headings", height=8)
+        routes_tree.heading("group", text="规则组")
+        routes_tree.heading("target", text="目标目录")
+        routes_tree.heading("mode", text="操作模式")
+        routes_tree.column("group", width=120)
+        routes_tree.column("target", width=300)
+        routes_tree.column("mode", width=70)
+        routes_tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        routes = list(self.extra_routes)
+        
+        def refresh():
+            routes_tree.delete(*routes_tree.get_children())
+            for group_name, target_dir, operation_mode in routes:
+                routes_tree.insert("", tk.END, values=(group_name, target_dir, mode_labels[operation_mode]))
+        
+        # 新路由的输入
+        input_frame = ttk.Frame(main_frame)
+        input_frame.pack(fill=tk.X, pady=5)
+        group_var = tk.StringVar()
+        group_combo = ttk.Combobox(input_frame, textvariable=group_var, state="readonly", width=14)
+        group_combo['values'] = list(self.rule_groups.keys())
+        group_combo.pack(side=tk.LEFT)
+        target_var = tk.StringVar()
+        ttk.Entry(input_frame, textvariable=target_var, width=30).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        def browse():
+            directory = filedialog.askdirectory(title="选择目标目录", parent=dialog)
+            if directory:
+                target_var.set(directory)
+        
+        ttk.Button(input_frame, text="浏览...", command=browse).pack(side=tk.LEFT)
+        mode_var = tk.StringVar(value="复制")
+        mode_combo = ttk.Combobox(input_frame, textvariable=mode_var, state="readonly", width=6)
+        mode_combo['values'] = list(mode_names.keys())
+        mode_combo.pack(side=tk.LEFT, padx=5)
+        
+        def add_route():
+            group_name = group_var.get()
+            target_dir = target_var.get().strip()
+            if not group_name or not target_dir:
+                messagebox.showwarning("警告", "请选择规则组和目标目录", parent=dialog)
+                return
+            routes.append((group_name, target_dir, mode_names[mode_var.get()]))
+            refresh()
+        
+        def remove_route():
+            selected = set(routes_tree.index(item) for item in routes_tree.selection())
+            routes[:] = [route for index, route in enumerate(routes) if index not in selected]
+            refresh()
+        
+        def save_routes():
+            self.extra_routes = routes
+            if routes:
+                self.routes_var.set("附加规则组: " + ", ".join(route[0] for route in routes))
+            else:
+                self.routes_var.set("附加规则组: 无")
+            dialog.destroy()
+        
+        btn_frame = ttk.Frame(main_frame)
+        btn_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Button(btn_frame, text="添加", command=add_route).pack(side=tk.LEFT)
+        ttk.Button(btn_frame, text="删除所选", command=remove_route).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="确定", command=save_routes).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side=tk.RIGHT)
+        
+        refresh()
+
     def start_organize(self):
         """开始整理文件"""
         # 检查源目录和目标目录
@@ -815,6 +1278,26 @@ class FileOrganizerGUI:
             messagebox.showwarning("警告", f"规则组 '{group_name}' 中没有规则")
             return
         
+        # 附加规则组与主规则组在同一次扫描中整理
+        routes = [(group_name, target_dir, self.mode_var.get())] + list(self.extra_routes)
+        for route_group, route_target, _ in routes[1:]:
+            if not self.rule_groups.get(route_group):
+                messagebox.showwarning("警告", f"规则组 '{route_group}' 中没有规则")
+                return
+            if os.path.abspath(source_dir) == os.path.abspath(route_target):
+                messagebox.showwarning("警告", "源目录和目标目录不能相同")
+                return
+        
+        # 检查限速设置
+        try:
+            self.bandwidth_limit = float(self.limit_mb_var.get() or 0) * 1024 * 1024
+            self.ops_limit = float(self.limit_ops_var.get() or 0)
+            if self.bandwidth_limit < 0 or self.ops_limit < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("警告", "限速必须是大于等于0的数字！")
+            return
+        
         # 禁用开始按钮
         self.start_btn.config(state=tk.DISABLED)
         
@@ -828,101 +1311,76 @@ class FileOrganizerGUI:
         self.error_files = 0
         
         # 启动处理线程
-        thread = threading.Thread(target=self.organize_files_thread, args=(source_dir, target_dir, group_name))
+        thread = threading.Thread(target=self.organize_files_thread, args=(source_dir, routes))
         thread.daemon = True
         thread.start()
 
-    def organize_files_thread(self, source_dir, target_dir, group_name):
-        """文件整理线程"""
+    def organize_files_thread(self, source_dir, routes):
+        """文件整理线程，routes 为 [(规则组, 目标目录, 操作模式)]，第一个为主规则组"""
         try:
-            source_path = Path(source_dir)
-            target_path = Path(target_dir)
-            
-            # 确保目标目录存在
-            target_path.mkdir(parents=True, exist_ok=True)
+            group_name, target_dir, _ = routes[0]
+            modes = {route[2] for route in routes}
+            operation_text = {"move": "已移动", "copy": "已复制"}.get(modes.pop()) if len(modes) == 1 else "已整理"
             
-            # 获取所有文件（包括子目录）
-            files = list(source_path.glob('**/*'))
-            total_files = sum(1 for f in files if f.is_file())
-            
-            if total_files == 0:
-                self.add_log(f"在 {source_dir} 中没有找到任何文件")
-                self.status_var.set("完成")
-                self.start_btn.config(state=tk.NORMAL)
-                self.is_processing = False
-                return
-            
-            self.add_log(f"找到 {total_files} 个文件需要处理")
-            self.add_log(f"使用规则组: {group_name}")
-            self.status_var.set("正在处理...")
-            
-            # 获取规则组
-            rules = self.rule_groups.get(group_name, {})
+            # 移动模式记录撤销日志
+            engine = OrganizeEngine(
+                None,
+                routes=[Route(self.rule_groups.get(name, {}), target, mode, name) for name, target, mode in routes],
+                journal_dir=self.undo_dir,
+                order=self.order_names.get(self.order_var.get(), ORDER_SCAN),
+                small_file_threshold=SMALL_FILE_THRESHOLD if self.small_files_var.get() else 0,
+                bandwidth_limit=self.bandwidth_limit,
+                ops_limit=self.ops_limit,
+                low_priority=self.low_priority_var.get(),
+                verify=self.verify_var.get(),
+                report_dir=self.verify_dir,
+                durable=self.durable_var.get(),
+                scan_cache_dir=self.scan_cache_dir if self.scan_cache_var.get() else None,
+                **scan_options(self.group_options, group_name)
+            )
             
             # 处理文件
-            for i, file_path in enumerate(files):
+            for event in engine.run(source_dir, target_dir):
                 if not self.is_processing:
-                    break
+                    engine.cancel()
                 
-                if file_path.is_file():
-                    # 更新进度
-                    progress = (i + 1) / total_files * 100
-                    self.progress_var.set(progress)
-                    
-                    # 获取文件名和扩展名
-                    file_name = file_path.name.lower()
-                    file_ext = file_path.suffix.lower()
-                    
-                    # 跳过隐藏文件
-                    if file_name.startswith('.'):
-                        self.skipped_files += 1
-                        continue
-                    
-                    # 检查是否匹配任何规则
-                    matched = False
-                    for keyword, folder_name in rules.items():
-                        if keyword.lower() in file_name or keyword.lower() == file_ext:
-                            # 创建目标文件夹
-                            new_folder = target_path / folder_name
-                            new_folder.mkdir(exist_ok=True)
-                            
-                            # 处理文件（移动或复制）
-                            try:
-                                # 如果目标文件已存在，添加数字后缀
-                                target_file = new_folder / file_path.name
-                                if target_file.exists():
-                                    base_name = target_file.stem
-                                    extension = target_file.suffix
-                                    counter = 1
-                                    while (new_folder / f"{base_name}_{counter}{extension}").exists():
-                                        counter += 1
-                                    target_file = new_folder / f"{base_name}_{counter}{extension}"
-                                
-                                # 根据操作模式选择移动或复制
-                                operation_mode = self.mode_var.get()
-                                if operation_mode == "move":
-                                    shutil.move(str(file_path), str(target_file))
-                                    operation_text = "已移动"
-                                else:  # copy
-                                    shutil.copy2(str(file_path), str(target_file))
-                                    operation_text = "已复制"
-                                
-                                self.add_log(f"{operation_text}: {file_path.name} -> {folder_name}/")
-                                self.processed_files += 1
-                                matched = True
-                                break
-                            except Exception as e:
-                                self.add_log(f"处理文件失败 {file_path.name}: {str(e)}")
-                                self.error_files += 1
-                    
-                    if not matched:
-                        self.skipped_files += 1
+                if event.kind == EVENT_START:
+                    if event.total == 0:
+                        self.add_log(f"在 {source_dir} 中没有找到任何文件")
+                        self.status_var.set("完成")
+                        return
+                    self.add_log(f"找到 {event.total} 个文件需要处理")
+                    self.add_log(f"使用规则组: {', '.join(route[0] for route in routes)}")
+                    if engine.scan_cache_dir:
+                        self.add_log(f"扫描缓存: {engine.scan_cache_hits} 个目录未变化, "
+                                     f"{engine.scan_cache_misses} 个目录重新列出")
+                    self.status_var.set("正在处理...")
+                elif event.kind == EVENT_COPIED:
+                    destination = event.folder if len(routes) == 1 else os.path.dirname(event.target)
+                    self.add_log(f"{operation_text}: {os.path.basename(event.source)} -> {destination}/")
+                elif event.kind == EVENT_ERROR:
+                    self.add_log(f"处理文件失败 {os.path.basename(event.source)}: {event.message}")
+                elif event.kind == EVENT_PROGRESS:
+                    # 更新进度和实时速度
+                    self.progress_var.set(event.done / event.total * 100)
+                    self.status_var.set(f"正在处理... {event.done}/{event.total}  "
+                                        f"{format_rate(event.ops_rate, event.bytes_rate)}")
+            
+            self.processed_files = engine.processed_files
+            self.skipped_files = engine.skipped_files
+            self.error_files = engine.error_files
             
             # 打印统计信息
             self.add_log("\n整理完成！统计信息：")
             self.add_log(f"成功处理: {self.processed_files} 个文件")
             self.add_log(f"跳过: {self.skipped_files} 个文件")
             self.add_log(f"处理失败: {self.error_files} 个文件")
+            if engine.verify:
+                self.add_log(f"校验通过: {engine.verified_files} 个文件")
+                if engine.verify_cached:
+                    self.add_log("注意: 复制的文件未写入磁盘就进行了校验，读取的可能是缓存；需要校验磁盘上的数据时请同时勾选确保写入磁盘")
+                if engine.report_path:
+                    self.add_log(f"校验报告: {engine.report_path}")
             
             # 更新状态
             self.status_var.set("完成")
@@ -936,6 +1394,126 @@ class FileOrganizerGUI:
             self.start_btn.config(state=tk.NORMAL)
             self.is_processing = False
 
+    def start_undo(self):
+        """撤销上次移动"""
+        if self.is_processing:
+            messagebox.showwarning("警告", "请等待当前整理完成")
+            return
+        
+        if not messagebox.askyesno("确认", "确定要将上次移动的文件还原到原位置吗？"):
+            return
+        
+        self.start_btn.config(state=tk.DISABLED)
+        self.undo_btn.config(state=tk.DISABLED)
+        self.is_processing = True
+        self.status_var.set("正在撤销...")
+        
+        thread = threading.Thread(target=self.undo_thread)
+        thread.daemon = True
+        thread.start()
+
+    def undo_thread(self):
+        """撤销线程"""
+        try:
+            restored, failed = undo_last_run(self.undo_dir, log=self.add_log)
+            status = f"撤销完成 - 已还原: {restored}"
+            if failed > 0:
+                status += f", 失败: {failed}"
+            self.status_var.set(status)
+        except Exception as e:
+            self.add_log(f"撤销时出错: {str(e)}")
+            self.status_var.set("出错")
+        finally:
+            self.start_btn.config(state=tk.NORMAL)
+            self.undo_btn.config(state=tk.NORMAL)
+            self.is_processing = False
+
+    def start_analyze(self):
+        """只扫描源目录，按所选规则组统计会如何整理，不复制也不移动"""
+        source_dir = self.source_var.get().strip()
+        if not source_dir or not os.path.isdir(source_dir):
+            messagebox.showwarning("警告", "请选择有效的源目录")
+            return
+        group_name = self.organize_group_var.get()
+        
+        self.analyze_btn.config(state=tk.DISABLED)
+        self.status_var.set("正在分析...")
+        thread = threading.Thread(target=self.analyze_thread, args=(
+            source_dir, group_name, dict(self.rule_groups.get(group_name, {})),
+            scan_options(self.group_options, group_name),
+            self.scan_cache_dir if self.scan_cache_var.get() else None))
+        thread.daemon = True
+        thread.start()
+    
+    def analyze_thread(self, source_dir, group_name, rules, options, scan_cache_dir):
+        """分析线程：扫描、统计并写入 JSON 和 CSV 报告"""
+        try:
+            scan_cache = ScanCache.for_source(scan_cache_dir, source_dir) if scan_cache_dir else None
+            report = analyze(source_dir, rules, group_name, scan_cache=scan_cache, **options)
+            if scan_cache is not None:
+                try:
+                    scan_cache.save()
+                except OSError:
+                    pass
+            json_path, csv_path = report.save(self.analysis_dir)
+            
+            self.add_log(f"\n分析 {source_dir}（规则组: {group_name}）：")
+            for line in report.summary():
+                self.add_log(line)
+            self.add_log(f"分析报告: {json_path}")
+            self.add_log(f"分析报告: {csv_path}")
+            self.status_var.set("分析完成")
+            self.root.after(0, self.show_analysis_dialog, report, json_path)
+        except Exception as e:
+            self.add_log(f"分析时出错: {str(e)}")
+            self.status_var.set("出错")
+        finally:
+            self.analyze_btn.config(state=tk.NORMAL)
+    
+    def show_analysis_dialog(self, report, json_path):
+        """显示分析结果摘要"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("分析结果")
+        dialog.geometry("560x460")
+        dialog.transient(self.root)
+        
+        # 使对话框居中显示
+        self.center_window(dialog)
+        
+        main_frame = ttk.Frame(dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="\n".join(report.headline()),
+                  justify=tk.LEFT, wraplength=520).pack(anchor=tk.W, pady=(0, 5))
+        
+        # 三类统计各一页
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+        sections = (
+            ("目标文件夹", report.folder_rows()),
+            ("未匹配的扩展名", report.extension_rows()),
+            ("最大的目录", report.directories)
+        )
+        for title, rows in sections:
+            frame = ttk.Frame(notebook)
+            notebook.add(frame, text=title)
+            tree = ttk.Treeview(frame, columns=("name", "files", "size"), show="headings")
+            tree.heading("name", text=title)
+            tree.heading("files", text="文件数")
+            tree.heading("size", text="大小")
+            tree.column("name", width=280)
+            tree.column("files", width=90, anchor=tk.E)
+            tree.column("size", width=90, anchor=tk.E)
+            for name, files, size in rows:
+                tree.insert("", tk.END, values=(name, files, format_size(size)))
+            scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        ttk.Label(main_frame, text=f"完整报告（JSON/CSV）: {json_path.parent}", wraplength=520).pack(anchor=tk.W, pady=5)
+        ttk.Button(main_frame, text="关闭", command=dialog.destroy).pack(side=tk.RIGHT)
+    
     def browse_source(self):
         """浏览选择源目录"""
         directory = filedialog.askdirectory(title="选择源目录")
@@ -1122,6 +1700,9 @@ class FileOrganizerGUI:
         folder_entry = ttk.Entry(folder_frame, textvariable=folder_var, width=40)
         folder_entry.pack(fill=tk.X, expand=True)
         
+        # 输入时实时预览修改后的匹配结果
+        self.watch_rule_draft(dialog, group_var, keyword_var, folder_var, keyword)
+        
         # 按钮框架 - 使用网格布局
         btn_frame = ttk.Frame(main_frame)
         btn_frame.pack(fill=tk.X, pady=(10, 5))
@@ -1135,9 +1716,15 @@ class FileOrganizerGUI:
                 messagebox.showwarning("警告", "关键词不能为空！", parent=dialog)
                 return
             
+            try:
+                validate_rule(new_keyword)
+            except ValueError as e:
+                messagebox.showwarning("警告", f"规则无效: {str(e)}", parent=dialog)
+                return
+            
             # 如果文件夹名称为空，则使用关键词作为文件夹名称
             if not new_folder:
-                new_folder = new_keyword
+                new_folder = default_folder(new_keyword)
             
             # 规范化文件夹名称
             new_folder = new_folder.replace('/', '_').replace('\\', '_')
@@ -1148,8 +1735,12 @@ class FileOrganizerGUI:
             
             # 更新规则
             self.rule_groups[group_name][new_keyword] = new_folder
-            self.save_rules()
-            self.refresh_rules_list()
+            self.save_rules([group_name])
+            if group_name == self.current_group:
+                if new_keyword != keyword:
+                    self.rules_view.remove_rules([keyword])
+                self.rules_view.set_rule(new_keyword, new_folder)
+                self.on_rules_changed()
             
             # 关闭对话框
             dialog.destroy()
@@ -1171,15 +1762,13 @@ class FileOrganizerGUI:
 
     def edit_rule(self):
         """编辑选中的规则"""
-        selected = self.rules_tree.selection()
-        if not selected:
+        keywords = self.rules_view.selected_keywords()
+        if not keywords:
             messagebox.showinfo("提示", "请先选择要修改的规则")
             return
         
-        item = selected[0]
-        values = self.rules_tree.item(item, "values")
-        keyword = values[0]
-        folder = values[1]
+        keyword = keywords[0]
+        folder = self.get_current_rules()[keyword]
         
         self.show_edit_rule_dialog(keyword, folder)
 
@@ -1291,48 +1880,31 @@ class FileOrganizerGUI:
     def delete_items_thread(self, source_dir):
         """删除线程"""
         try:
-            # 获取所有目录和文件
-            all_items = []
-            for root, dirs, files in os.walk(source_dir, topdown=False):
-                if not self.recursive_var.get() and root != source_dir:
-                    continue
-                    
-                if self.delete_empty_dirs_var.get():
-                    all_items.extend([os.path.join(root, d) for d in dirs])
-                    
-                if self.delete_empty_files_var.get():
-                    all_items.extend([os.path.join(root, f) for f in files])
-                    
-            total_items = len(all_items)
-            if total_items == 0:
-                self.delete_status_var.set("没有找到需要删除的项目")
-                self.start_delete_button.configure(state=tk.NORMAL)
-                return
-                
-            # 处理每个项目
-            for i, item in enumerate(all_items, 1):
-                try:
-                    if os.path.isdir(item):
-                        # 检查是否为空目录
-                        if not os.listdir(item):
-                            os.rmdir(item)
-                            self.deleted_dirs += 1
-                            self.add_log(f"删除空目录: {item}")
+            events = delete_empty_items(
+                source_dir,
+                recursive=self.recursive_var.get(),
+                delete_dirs=self.delete_empty_dirs_var.get(),
+                delete_files=self.delete_empty_files_var.get()
+            )
+            for event in events:
+                if event.kind == EVENT_START and event.total == 0:
+                    self.delete_status_var.set("没有找到需要删除的项目")
+                    return
+                elif event.kind == EVENT_DELETED:
+                    if event.folder == "dir":
+                        self.deleted_dirs += 1
+                        self.add_log(f"删除空目录: {event.source}")
                     else:
-                        # 检查是否为空文件
-                        if os.path.getsize(item) == 0:
-                            os.remove(item)
-                            self.deleted_files += 1
-                            self.add_log(f"删除空文件: {item}")
-                            
-                except Exception as e:
+                        self.deleted_files += 1
+                        self.add_log(f"删除空文件: {event.source}")
+                elif event.kind == EVENT_ERROR:
                     self.delete_errors += 1
-                    self.add_log(f"删除失败: {item} - {str(e)}")
-                    
-                # 更新进度
-                progress = (i / total_items) * 100
-                self.delete_progress['value'] = progress
-                self.delete_status_var.set(f"正在处理: {i}/{total_items}")
+                    self.add_log(f"删除失败: {event.source} - {event.message}")
+                elif event.kind == EVENT_PROGRESS:
+                    # 更新进度
+                    progress = (event.done / event.total) * 100
+                    self.delete_progress['value'] = progress
+                    self.delete_status_var.set(f"正在处理: {event.done}/{event.total}")
                 
             # 完成
             status = f"删除完成 - 目录: {self.deleted_dirs}, 文件: {self.deleted_files}"
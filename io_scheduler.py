@@ -0,0 +1,188 @@
+import os
+import sys
+import struct
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def is_rotational(dev):
+    """判断设备是否为机械硬盘，无法判断时返回 None（目前仅支持 Linux）"""
+    if not sys.platform.startswith('linux'):
+        return None
+    base = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+    # 分区没有 queue 目录，需要查看所属磁盘
+    for path in (os.path.join(base, "queue", "rotational"),
+                 os.path.join(base, "..", "queue", "rotational")):
+        try:
+            with open(path, 'r') as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+class DeviceScheduler:
+    """按设备分组调度复制/移动操作的执行器
+
+    任务的前两个参数必须是源路径和目标路径，调度器据此取得两端的 st_dev；
+    每个设备有独立的并发上限：固态硬盘可以并行，机械硬盘按顺序执行，
+    一个任务只有在源设备和目标设备都有空闲名额时才会开始。
+    实现了 submit/shutdown，可以直接作为 OrganizeEngine 的执行器，也可以被多个任务共享。
+    """
+
+    def __init__(self, max_workers=None, ssd_limit=None, hdd_limit=1, default_limit=4, device_limits=None,
+                 initializer=None):
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.ssd_limit = ssd_limit or self.max_workers
+        self.hdd_limit = hdd_limit
+        self.default_limit = default_limit
+        self.device_limits = dict(device_limits or {})
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="device-io",
+                                            initializer=initializer)
+        self._condition = threading.Condition()
+        self._queues = {}
+        self._active = {}
+        self._pending = 0
+        self._dev_cache = {}
+
+    def limit_for(self, dev):
+        """获取设备的并发上限"""
+        limit = self.device_limits.get(dev)
+        if limit is None:
+            rotational = is_rotational(dev)
+            if rotational is None:
+                limit = self.default_limit
+            elif rotational:
+                limit = self.hdd_limit
+            else:
+                limit = self.ssd_limit
+            self.device_limits[dev] = limit
+        return limit
+
+    def _device_of(self, path):
+        """获取路径所在目录的设备号（按目录缓存）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        dev = self._dev_cache.get(directory)
+        if dev is None:
+            while True:
+                try:
+                    dev = os.stat(directory).st_dev
+                    break
+                except FileNotFoundError:
+                    parent = os.path.dirname(directory)
+                    if parent == directory:
+                        raise
+                    directory = parent
+            self._dev_cache[os.path.dirname(os.path.abspath(path))] = dev
+        return dev
+
+    def _devices(self, key):
+        return (key[0],) if key[0] == key[1] else key
+
+    def _can_start(self, key):
+        return all(self._active.get(dev, 0) < self.limit_for(dev) for dev in self._devices(key))
+
+    def _dispatch(self):
+        """在持有锁时启动所有可以开始的任务"""
+        for key, queue in self._queues.items():
+            while queue and self._can_start(key):
+                future, fn, args = queue.popleft()
+                for dev in self._devices(key):
+                    self._active[dev] = self._active.get(dev, 0) + 1
+                self._executor.submit(self._run, key, future, fn, args)
+
+    def _run(self, key, future, fn, args):
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._condition:
+                for dev in self._devices(key):
+                    self._active[dev] -= 1
+                self._pending -= 1
+                self._dispatch()
+                self._condition.notify_all()
+
+    def submit(self, fn, source, target, *args):
+        """提交任务，按源和目标所在设备排队
+
+        source/target 也可以是同一批文件的路径列表，此时按第一个文件分组。
+        """
+        if isinstance(source, (list, tuple)):
+            key = (self._device_of(source[0]), self._device_of(target[0]))
+        else:
+            key = (self._device_of(source), self._device_of(target))
+        future = Future()
+        with self._condition:
+            self._queues.setdefault(key, deque()).append((future, fn, (source, target) + args))
+            self._pending += 1
+            self._dispatch()
+        return future
+
+    def shutdown(self, wait=True):
+        """关闭调度器，wait 为 True 时等待所有排队的任务完成"""
+        if wait:
+            with self._condition:
+                while self._pending:
+                    self._condition.wait()
+        self._executor.shutdown(wait=wait)
+
+
+# 读取顺序
+ORDER_SCAN = "scan"
+ORDER_INODE = "inode"
+ORDER_EXTENT = "extent"
+ORDERS = (ORDER_SCAN, ORDER_INODE, ORDER_EXTENT)
+
+# Linux FS_IOC_FIEMAP，只请求第一个区段
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct("=QQIIII")
+_FIEMAP_EXTENT = struct.Struct("=QQQQQIIII")
+_FIEMAP_FLAG_SYNC = 0x1
+
+
+def physical_offset(path):
+    """通过 FIEMAP 获取文件第一个数据区段的物理偏移，不支持时返回 None"""
+    if fcntl is None:
+        return None
+    buf = bytearray(_FIEMAP_HEADER.pack(0, 0xFFFFFFFFFFFFFFFF, _FIEMAP_FLAG_SYNC, 0, 1, 0)
+                    + bytes(_FIEMAP_EXTENT.size))
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.ioctl(fd, _FS_IOC_FIEMAP, buf)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    mapped = _FIEMAP_HEADER.unpack_from(buf)[3]
+    if mapped == 0:
+        return None
+    return _FIEMAP_EXTENT.unpack_from(buf, _FIEMAP_HEADER.size)[1]
+
+
+def order_batch(batch, order):
+    """按读取顺序对一批 (inode, 任务, ...) 排序，任务的第一项为源文件路径
+
+    extent 模式按物理位置排序，取不到物理位置的文件（空文件、tmpfs、Windows 等）按 inode 排在后面。
+    """
+    if order == ORDER_INODE:
+        batch.sort(key=lambda item: item[0])
+    elif order == ORDER_EXTENT:
+        keys = {}
+        for item in batch:
+            offset = physical_offset(item[1][0])
+            keys[id(item)] = (0, offset) if offset is not None else (1, item[0])
+        batch.sort(key=lambda item: keys[id(item)])
+    return batch
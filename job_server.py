@@ -0,0 +1,438 @@
+import os
+import hmac
+import math
+import json
+import logging
+import secrets
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from organize_engine import (OrganizeEngine, Route, EVENT_START, EVENT_COPIED, EVENT_SKIPPED,
+                             EVENT_ERROR, EVENT_PROGRESS)
+from io_scheduler import DeviceScheduler, ORDER_SCAN, ORDERS
+from throttle import lower_thread_priority
+from scan_filter import scan_options, validate_scan_options
+from batch_ops import delete_empty_items, merge_same_name_dirs, EVENT_DELETED, EVENT_MERGED
+
+# 任务类型
+JOB_ORGANIZE = "organize"
+JOB_DELETE = "delete"
+JOB_MERGE = "merge"
+JOB_TYPES = (JOB_ORGANIZE, JOB_DELETE, JOB_MERGE)
+
+# 每次启动生成的访问令牌保存在资源目录中的文件名，请求需带 Authorization: Bearer <令牌>
+TOKEN_FILE = "job_server.token"
+# 允许的 Host 请求头（防止 DNS 重绑定），监听地址不是通配地址时也允许监听地址本身
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+# 任务状态
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+# 任务参数的类型和默认值，提交时校验
+ORGANIZE_NUMBERS = {"small_file_threshold": int, "bandwidth_limit_mb": float, "ops_limit": float}
+ORGANIZE_FLAGS = {"verify": False, "durable": False, "scan_cache": False}
+DELETE_FLAGS = {"recursive": True, "delete_dirs": True, "delete_files": True}
+MERGE_FLAGS = {"recursive": True}
+
+
+def _flag_params(params, flags):
+    """校验布尔参数（必须是 JSON 的 true/false），返回补全默认值的 {名称: 值}"""
+    values = {}
+    for name, default in flags.items():
+        value = params.get(name, default)
+        if not isinstance(value, bool):
+            raise ValueError(f"{name} 必须是 true 或 false")
+        values[name] = value
+    return values
+
+
+def _number_params(params, numbers):
+    """校验非负数值参数（int 类型的参数必须是整数），返回补全默认值 0 的 {名称: 值}"""
+    values = {}
+    for name, kind in numbers.items():
+        value = params.get(name, 0)
+        if (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)
+                or value < 0 or (kind is int and not isinstance(value, int))):
+            raise ValueError(f"{name} 必须是大于等于0的{'整数' if kind is int else '数'}")
+        values[name] = kind(value)
+    return values
+
+
+class Job:
+    """任务队列中的一个任务及其状态和计数"""
+
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = STATUS_QUEUED
+        self.counters = {"errors": 0}
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.started_at = None
+        self.finished_at = None
+
+    def count(self, name):
+        self.counters[name] = self.counters.get(name, 0) + 1
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "counters": dict(self.counters),
+            "done": self.done,
+            "total": self.total,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """并发执行整理、删除和合并任务，最多同时运行 max_jobs 个"""
+
+    def __init__(self, organizer, max_jobs=4, max_io_workers=8, max_history=1000, low_priority=False):
+        self.organizer = organizer
+        self.max_io_workers = max_io_workers
+        self.max_history = max_history
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._job_executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="job")
+        # 所有整理任务的复制/移动共享一个按设备调度器，限制整个进程的 I/O 并发，避免争用同一块机械硬盘
+        self._io_executor = DeviceScheduler(
+            max_workers=max_io_workers,
+            initializer=lower_thread_priority if low_priority else None
+        )
+
+    def submit(self, kind, params):
+        """校验参数并将任务加入队列"""
+        if kind not in JOB_TYPES:
+            raise ValueError(f"未知的任务类型: {kind}")
+        source_dir = params.get("source")
+        if not source_dir or not os.path.isdir(source_dir):
+            raise ValueError("源目录不存在")
+
+        if kind == JOB_ORGANIZE:
+            target_dir = params.get("target")
+            if not target_dir:
+                raise ValueError("请指定目标目录")
+            if os.path.abspath(source_dir) == os.path.abspath(target_dir):
+                raise ValueError("源目录和目标目录不能相同")
+            if params.get("mode", "copy") not in ("copy", "move"):
+                raise ValueError("操作模式必须是 copy 或 move")
+            if params.get("order", ORDER_SCAN) not in ORDERS:
+                raise ValueError(f"读取顺序必须是 {', '.join(ORDERS)} 之一")
+            extra_routes = params.get("routes") or []
+            if not isinstance(extra_routes, list) or not all(isinstance(route, dict) for route in extra_routes):
+                raise ValueError("routes 必须是 {group, target, mode} 对象的列表")
+            with self._lock:
+                # 提交时读取规则快照，之后修改规则不影响排队中的任务
+                self.organizer.load_rules()
+                group_name = params.get("group") or self.organizer.current_group
+                rules = self.organizer.rule_groups.get(group_name)
+                options = scan_options(self.organizer.group_options, group_name)
+                # 附加路由：同一次扫描中按其他规则组整理到各自的目标目录
+                routes = [(route.get("group"), self.organizer.rule_groups.get(route.get("group")),
+                           route.get("target"), route.get("mode", "copy")) for route in extra_routes]
+            if not rules:
+                raise ValueError(f"规则组 '{group_name}' 中没有规则")
+            for route_group, route_rules, route_target, route_mode in routes:
+                if not route_rules:
+                    raise ValueError(f"规则组 '{route_group}' 中没有规则")
+                if not route_target or os.path.abspath(source_dir) == os.path.abspath(route_target):
+                    raise ValueError("附加路由的目标目录无效")
+                if route_mode not in ("copy", "move"):
+                    raise ValueError("操作模式必须是 copy 或 move")
+            # 任务参数中的扫描设置覆盖规则组的设置
+            for name in options:
+                if name in params:
+                    options[name] = params[name]
+            validate_scan_options(options)
+            params = dict(params, group=group_name, **_number_params(params, ORGANIZE_NUMBERS),
+                          **_flag_params(params, ORGANIZE_FLAGS))
+            routes = [(group_name, dict(rules), target_dir, params.get("mode", "copy"))] + [
+                (route_group, dict(route_rules), route_target, route_mode)
+                for route_group, route_rules, route_target, route_mode in routes]
+        else:
+            params = dict(params, **_flag_params(params, DELETE_FLAGS if kind == JOB_DELETE else MERGE_FLAGS))
+            routes = None
+            options = None
+
+        with self._lock:
+            job = Job(self._next_id, kind, params)
+            self._next_id += 1
+            self.jobs[job.id] = job
+            self._trim_history()
+        self._job_executor.submit(self._run, job, routes, options)
+        logging.info(f"已加入任务 #{job.id}: {kind} {params}")
+        return job
+
+    def _trim_history(self):
+        """只保留最近的已结束任务"""
+        finished = [job_id for job_id, job in self.jobs.items()
+                    if job.status in (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """请求取消任务，排队中的任务不会再启动"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        job.cancel_requested = True
+        return job
+
+    def shutdown(self):
+        for job in self.jobs.values():
+            job.cancel_requested = True
+        self._job_executor.shutdown(wait=True)
+        self._io_executor.shutdown(wait=True)
+
+    def _run(self, job, routes, options):
+        if job.cancel_requested:
+            job.status = STATUS_CANCELLED
+            return
+        job.status = STATUS_RUNNING
+        job.started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            if job.kind == JOB_ORGANIZE:
+                self._run_organize(job, routes, options)
+            elif job.kind == JOB_DELETE:
+                self._run_events(job, delete_empty_items(
+                    job.params["source"],
+                    recursive=job.params["recursive"],
+                    delete_dirs=job.params["delete_dirs"],
+                    delete_files=job.params["delete_files"]
+                ))
+            else:
+                self._run_events(job, merge_same_name_dirs(
+                    job.params["source"],
+                    recursive=job.params["recursive"]
+                ))
+            job.status = STATUS_CANCELLED if job.cancel_requested else STATUS_DONE
+        except Exception as e:
+            job.status = STATUS_FAILED
+            job.error = str(e)
+            logging.error(f"任务 #{job.id} 出错: {str(e)}")
+        finally:
+            job.finished_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            logging.info(f"任务 #{job.id} 结束: {job.status} {job.counters}")
+
+    def _update(self, job, event):
+        """根据事件更新任务计数"""
+        if event.kind == EVENT_START:
+            job.total = event.total
+        elif event.kind == EVENT_COPIED:
+            job.count("processed")
+        elif event.kind == EVENT_SKIPPED:
+            job.count("skipped")
+        elif event.kind == EVENT_ERROR:
+            job.count("errors")
+        elif event.kind == EVENT_DELETED:
+            job.count("deleted_dirs" if event.folder == "dir" else "deleted_files")
+        elif event.kind == EVENT_MERGED:
+            job.count("merged")
+        elif event.kind == EVENT_PROGRESS:
+            job.done = event.done
+            job.counters["bytes"] = event.bytes
+            job.counters["bytes_per_sec"] = round(event.bytes_rate)
+            job.counters["files_per_sec"] = round(event.ops_rate, 1)
+
+    def _run_organize(self, job, routes, options):
+        engine = OrganizeEngine(
+            None,
+            routes=[Route(rules, target, mode, name) for name, rules, target, mode in routes],
+            executor=self._io_executor,
+            max_workers=self.max_io_workers,
+            journal_dir=self.organizer.undo_dir,
+            order=job.params.get("order", ORDER_SCAN),
+            small_file_threshold=job.params["small_file_threshold"],
+            bandwidth_limit=job.params["bandwidth_limit_mb"] * 1024 * 1024,
+            ops_limit=job.params["ops_limit"],
+            verify=job.params["verify"],
+            durable=job.params["durable"],
+            scan_cache_dir=self.organizer.scan_cache_dir if job.params["scan_cache"] else None,
+            exclude=options["exclude"],
+            max_depth=options["max_depth"],
+            skip_hidden=options["skip_hidden"],
+            report_dir=self.organizer.verify_dir
+        )
+        for event in engine.run(job.params["source"]):
+            # 整理任务需要等待已提交的操作完成，以便写入撤销日志
+            if job.cancel_requested:
+                engine.cancel()
+            self._update(job, event)
+        if engine.verify:
+            job.counters["verified"] = engine.verified_files
+            job.counters["report"] = engine.report_path
+
+    def _run_events(self, job, events):
+        for event in events:
+            if job.cancel_requested:
+                events.close()
+                break
+            self._update(job, event)
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """JSON 接口
+
+    GET  /jobs              列出任务
+    GET  /jobs/<id>         查询任务状态
+    POST /jobs              提交任务 {"type": "organize|delete|merge", "source": ..., ...}
+                            整理任务可附加 "routes": [{"group": ..., "target": ..., "mode": ...}]，
+                            文件复制到每个匹配的 copy 路由，到第一个匹配的 move 路由为止，
+                            扫描设置使用 "group" 指定的规则组的
+    POST /jobs/<id>/cancel  取消任务
+
+    所有请求都需要 Authorization: Bearer <令牌>（令牌在启动时写入资源目录的 job_server.token），
+    Host 必须是本机地址，POST 请求的 Content-Type 必须是 application/json，
+    使浏览器中的网页无法通过简单请求或 DNS 重绑定提交任务。
+    """
+
+    server_version = "FilesHelperJobServer/1.0"
+
+    def log_message(self, format, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _request_host(self):
+        """Host 请求头中的主机名（去掉端口和 IPv6 的方括号）"""
+        host = (self.headers.get("Host") or "").strip().lower()
+        if host.startswith("["):
+            return host[1:].split("]", 1)[0]
+        return host.rsplit(":", 1)[0] if host.count(":") == 1 else host
+
+    def _authorize(self, post=False):
+        """检查 Host、令牌和 Content-Type，不通过时发送错误响应并返回 False"""
+        if self._request_host() not in self.server.allowed_hosts:
+            self._send_json(403, {"error": "不允许的 Host"})
+            return False
+        scheme, _, token = (self.headers.get("Authorization") or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), self.server.token.encode()):
+            self._send_json(401, {"error": "缺少或错误的访问令牌"})
+            return False
+        content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+        if post and content_type != "application/json":
+            self._send_json(415, {"error": "Content-Type 必须是 application/json"})
+            return False
+        return True
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        data = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError("请求内容必须是 JSON 对象")
+        return data
+
+    def _path_parts(self):
+        return [part for part in self.path.split('?', 1)[0].split('/') if part]
+
+    def _job_or_404(self, job_id):
+        try:
+            job = self.server.manager.get(int(job_id))
+        except ValueError:
+            job = None
+        if job is None:
+            self._send_json(404, {"error": f"任务 {job_id} 不存在"})
+        return job
+
+    def do_GET(self):
+        if not self._authorize():
+            return
+        parts = self._path_parts()
+        if parts == ["jobs"]:
+            self._send_json(200, {"jobs": [job.to_dict() for job in self.server.manager.list()]})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._job_or_404(parts[1])
+            if job is not None:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {"error": "未知的接口"})
+
+    def do_POST(self):
+        if not self._authorize(post=True):
+            return
+        parts = self._path_parts()
+        try:
+            if parts == ["jobs"]:
+                data = self._read_json()
+                job = self.server.manager.submit(data.pop("type", None), data)
+                self._send_json(201, job.to_dict())
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                job = self._job_or_404(parts[1])
+                if job is not None:
+                    self.server.manager.cancel(job.id)
+                    self._send_json(200, job.to_dict())
+            else:
+                self._send_json(404, {"error": "未知的接口"})
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "请求内容不是有效的 JSON"})
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+
+
+def serve(organizer, host="127.0.0.1", port=8765, max_jobs=4, max_io_workers=8, low_priority=False):
+    """启动本地任务服务，直到 Ctrl+C"""
+    manager = JobManager(organizer, max_jobs=max_jobs, max_io_workers=max_io_workers,
+                         low_priority=low_priority)
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.daemon_threads = True
+    server.manager = manager
+    server.token = secrets.token_urlsafe(32)
+    server.allowed_hosts = set(LOCAL_HOSTS)
+    if host not in ("", "0.0.0.0", "::"):
+        server.allowed_hosts.add(host.lower())
+    token_path = write_token(organizer.resources_dir, server.token)
+    print(f"任务服务已启动: http://{host}:{port}/jobs")
+    print(f"访问令牌已写入 {token_path}，请求需带 Authorization: Bearer <令牌>")
+    print(f"最多同时运行 {max_jobs} 个任务，I/O 线程数 {max_io_workers}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止任务服务...")
+    finally:
+        server.server_close()
+        manager.shutdown()
+        try:
+            os.remove(token_path)
+        except OSError:
+            pass
+
+
+def write_token(resources_dir, token):
+    """把访问令牌写入资源目录（仅当前用户可读），返回文件路径"""
+    path = os.path.join(resources_dir, TOKEN_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return path
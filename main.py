@@ -1,9 +1,19 @@
 import os
-import shutil
 from pathlib import Path
 from tqdm import tqdm
-import json
 import sys
+import argparse
+from undo_journal import undo_last_run
+from organize_engine import OrganizeEngine, Route, EVENT_START, EVENT_COPIED, EVENT_ERROR, EVENT_PROGRESS, EXECUTORS
+from io_scheduler import ORDERS
+from fast_copy import SMALL_FILE_THRESHOLD
+from throttle import format_rate
+from scan_filter import scan_options
+from rules import validate_rule, default_folder
+from rule_store import RuleStore, RuleStoreError, RuleStoreUnavailable, STORES, default_state
+from rule_package import read_rule_package, diff_rule_package, apply_rule_package, IMPORT_MODES, IMPORT_MERGE
+from scan_cache import ScanCache
+from analyze import analyze
 
 class FileOrganizer:
     def __init__(self):
@@ -11,9 +21,14 @@ class FileOrganizer:
             "默认规则组": {}  # 默认规则组
         }
         self.current_group = "默认规则组"
+        self.group_options = {}  # 规则组的扫描设置
         self.resources_dir = Path("resources")
         self.resources_dir.mkdir(exist_ok=True)
-        self.config_file = self.resources_dir / "file_rules.json"
+        self.store = RuleStore(self.resources_dir)
+        self.undo_dir = self.resources_dir / "undo"
+        self.verify_dir = self.resources_dir / "verify"
+        self.scan_cache_dir = self.resources_dir / "scan_cache"
+        self.analysis_dir = self.resources_dir / "analysis"
         self.load_rules()
         self.processed_files = 0
         self.skipped_files = 0
@@ -21,30 +36,25 @@ class FileOrganizer:
 
     def load_rules(self):
         """加载已保存的分类规则"""
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.rule_groups = data.get("rule_groups", {"默认规则组": {}})
-                    self.current_group = data.get("current_group", "默认规则组")
-            except json.JSONDecodeError:
-                print("规则文件损坏，将创建新的规则文件")
-                self.rule_groups = {"默认规则组": {}}
-                self.current_group = "默认规则组"
-        else:
+        if not self.store.exists():
             print("未找到规则文件，将创建新的规则文件")
-            self.rule_groups = {"默认规则组": {}}
-            self.current_group = "默认规则组"
+        try:
+            self.rule_groups, self.current_group, self.group_options = self.store.load()
+        except RuleStoreUnavailable as e:
+            # 文件保持原样：已经读取过时继续使用内存中的规则，否则暂时使用空的规则（不会保存）
+            if self.store.loaded:
+                print(f"{str(e)}，继续使用已加载的规则")
+            else:
+                print(f"{str(e)}，暂时使用空的规则，修改不会保存")
+                self.rule_groups, self.current_group, self.group_options = default_state()
+        except RuleStoreError as e:
+            print(f"{str(e)}，将创建新的规则文件")
+            self.rule_groups, self.current_group, self.group_options = default_state()
 
-    def save_rules(self):
-        """保存分类规则"""
+    def save_rules(self, changed_groups=None):
+        """保存分类规则，changed_groups 为有变化的规则组（SQLite 存储只重写这些规则组）"""
         try:
-            data = {
-                "rule_groups": self.rule_groups,
-                "current_group": self.current_group
-            }
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            self.store.save(self.rule_groups, self.current_group, self.group_options, changed_groups)
         except Exception as e:
             print(f"保存规则时出错: {str(e)}")
 
@@ -54,9 +64,15 @@ class FileOrganizer:
             print("关键词不能为空！")
             return False
         
+        try:
+            validate_rule(keyword)
+        except ValueError as e:
+            print(f"规则无效: {str(e)}")
+            return False
+        
         # 如果文件夹名称为空，则使用关键词作为文件夹名称
         if not folder_name:
-            folder_name = keyword
+            folder_name = default_folder(keyword)
         
         # 规范化文件夹名称
         folder_name = folder_name.strip().replace('/', '_').replace('\\', '_')
@@ -70,7 +86,7 @@ class FileOrganizer:
             self.rule_groups[group_name] = {}
         
         self.rule_groups[group_name][keyword] = folder_name
-        self.save_rules()
+        self.save_rules([group_name])
         return True
 
     def add_rule_group(self, group_name):
@@ -84,7 +100,7 @@ class FileOrganizer:
             return False
         
         self.rule_groups[group_name] = {}
-        self.save_rules()
+        self.save_rules([group_name])
         return True
 
     def delete_rule_group(self, group_name):
@@ -98,9 +114,10 @@ class FileOrganizer:
             return False
         
         del self.rule_groups[group_name]
+        self.group_options.pop(group_name, None)
         if self.current_group == group_name:
             self.current_group = "默认规则组"
-        self.save_rules()
+        self.save_rules([group_name])
         return True
 
     def set_current_group(self, group_name):
@@ -110,101 +127,150 @@ class FileOrganizer:
             return False
         
         self.current_group = group_name
-        self.save_rules()
+        self.save_rules([])
         return True
 
     def get_current_rules(self):
         """获取当前规则组的规则"""
         return self.rule_groups.get(self.current_group, {})
 
-    def organize_files(self, source_dir, target_dir, operation_mode='copy'):
-        """根据规则整理文件"""
-        source_path = Path(source_dir)
-        target_path = Path(target_dir)
-        
+    def organize_files(self, source_dir, target_dir, operation_mode='copy', routes=None, **options):
+        """根据规则整理文件，options 传给 OrganizeEngine（执行器、读取顺序、限速等）
+
+        规则组的扫描设置（排除目录、最大深度、隐藏文件）作为默认值，可被 options 覆盖。
+        routes 为 [(规则组, 目标目录, 操作模式)] 时在一次扫描中按多个规则组整理（文件复制到每个匹配的
+        复制路由，到第一个匹配的移动路由为止），此时忽略 target_dir 和 operation_mode，扫描设置取第一个规则组的。
+        """
         # 重置计数器
         self.processed_files = 0
         self.skipped_files = 0
         self.error_files = 0
 
-        # 确保目标目录存在
-        target_path.mkdir(parents=True, exist_ok=True)
+        # 默认只按当前规则组整理
+        if not routes:
+            routes = [(self.current_group, target_dir, operation_mode)]
+
+        options = dict(scan_options(self.group_options, routes[0][0]), **options)
 
-        # 获取当前规则组的规则
-        rules = self.get_current_rules()
+        # 移动模式记录撤销日志，校验模式写入校验报告
+        engine = OrganizeEngine(
+            None,
+            routes=[Route(self.rule_groups.get(name, {}), target, mode, name) for name, target, mode in routes],
+            journal_dir=self.undo_dir,
+            report_dir=self.verify_dir,
+            **options
+        )
+        modes = {route[2] for route in routes}
+        operation_text = {"move": "已移动", "copy": "已复制"}.get(modes.pop()) if len(modes) == 1 else "已整理"
+        progress = None
 
-        # 获取所有文件（包括子目录）
         try:
-            files = list(source_path.glob('**/*'))
-            total_files = sum(1 for f in files if f.is_file())
-            
-            if total_files == 0:
-                print(f"在 {source_dir} 中没有找到任何文件")
-                return
-                
-            print(f"找到 {total_files} 个文件需要处理")
-            print(f"使用规则组: {self.current_group}")
-            
-            # 使用tqdm显示进度条
-            for file_path in tqdm(files, desc="正在整理文件"):
-                if file_path.is_file():
-                    # 获取文件名和扩展名
-                    file_name = file_path.name.lower()
-                    file_ext = file_path.suffix.lower()
-                    
-                    # 跳过隐藏文件
-                    if file_name.startswith('.'):
-                        self.skipped_files += 1
-                        continue
-                    
-                    # 检查是否匹配任何规则
-                    matched = False
-                    for keyword, folder_name in rules.items():
-                        if keyword.lower() in file_name or keyword.lower() == file_ext:
-                            # 创建目标文件夹
-                            new_folder = target_path / folder_name
-                            new_folder.mkdir(exist_ok=True)
-
-                            # 处理文件（移动或复制）
-                            try:
-                                # 如果目标文件已存在，添加数字后缀
-                                target_file = new_folder / file_path.name
-                                if target_file.exists():
-                                    base_name = target_file.stem
-                                    extension = target_file.suffix
-                                    counter = 1
-                                    while (new_folder / f"{base_name}_{counter}{extension}").exists():
-                                        counter += 1
-                                    target_file = new_folder / f"{base_name}_{counter}{extension}"
-                                
-                                # 根据操作模式选择移动或复制
-                                if operation_mode == 'move':
-                                    shutil.move(str(file_path), str(target_file))
-                                    operation_text = "已移动"
-                                else:  # copy
-                                    shutil.copy2(str(file_path), str(target_file))
-                                    operation_text = "已复制"
-                                
-                                print(f"{operation_text}: {file_path.name} -> {folder_name}/")
-                                self.processed_files += 1
-                                matched = True
-                                break
-                            except Exception as e:
-                                print(f"处理文件失败 {file_path.name}: {str(e)}")
-                                self.error_files += 1
-                    
-                    if not matched:
-                        self.skipped_files += 1
-            
+            for event in engine.run(source_dir, target_dir):
+                if event.kind == EVENT_START:
+                    if event.total == 0:
+                        print(f"在 {source_dir} 中没有找到任何文件")
+                        return
+                    print(f"找到 {event.total} 个文件需要处理")
+                    print(f"使用规则组: {', '.join(route[0] for route in routes)}")
+                    # 使用tqdm显示进度条
+                    progress = tqdm(total=event.total, desc="正在整理文件")
+                elif event.kind == EVENT_COPIED:
+                    destination = event.folder if len(routes) == 1 else os.path.dirname(event.target)
+                    print(f"{operation_text}: {os.path.basename(event.source)} -> {destination}/")
+                elif event.kind == EVENT_ERROR:
+                    print(f"处理文件失败 {os.path.basename(event.source)}: {event.message}")
+                elif event.kind == EVENT_PROGRESS:
+                    progress.set_postfix_str(format_rate(event.ops_rate, event.bytes_rate), refresh=False)
+                    progress.update(event.done - progress.n)
+
+            progress.close()
+            self.processed_files = engine.processed_files
+            self.skipped_files = engine.skipped_files
+            self.error_files = engine.error_files
+
             # 打印统计信息
             print("\n整理完成！统计信息：")
             print(f"成功处理: {self.processed_files} 个文件")
             print(f"跳过: {self.skipped_files} 个文件")
             print(f"处理失败: {self.error_files} 个文件")
+            if engine.scan_cache_dir:
+                print(f"扫描缓存: {engine.scan_cache_hits} 个目录未变化, {engine.scan_cache_misses} 个目录重新列出")
+            if engine.verify:
+                print(f"校验通过: {engine.verified_files} 个文件")
+                if engine.verify_cached:
+                    print("注意: 复制的文件未 fsync，校验读取的可能是页缓存；需要校验磁盘上的数据时请同时使用 --durable")
+                if engine.report_path:
+                    print(f"校验报告: {engine.report_path}")
             
         except Exception as e:
             print(f"处理文件时出错: {str(e)}")
 
+    def analyze_files(self, source_dir, group_name=None, json_path=None, csv_path=None, use_scan_cache=False,
+                      **options):
+        """只扫描不整理，按规则组统计各目标文件夹、未匹配的扩展名和最大的目录，写入 JSON 和 CSV 报告
+
+        未指定报告路径时写入 resources/analysis；options 传给 analyze（扫描设置、最大目录数），
+        缺少的扫描设置使用规则组的设置。
+        """
+        group_name = group_name or self.current_group
+        options = dict(scan_options(self.group_options, group_name), **options)
+        try:
+            scan_cache = ScanCache.for_source(self.scan_cache_dir, source_dir) if use_scan_cache else None
+            report = analyze(source_dir, self.rule_groups.get(group_name, {}), group_name,
+                             scan_cache=scan_cache, **options)
+            if scan_cache is not None:
+                try:
+                    scan_cache.save()
+                except OSError:
+                    pass
+            if json_path is None and csv_path is None:
+                json_path, csv_path = report.save(self.analysis_dir)
+            else:
+                if json_path:
+                    report.write_json(json_path)
+                if csv_path:
+                    report.write_csv(csv_path)
+        except Exception as e:
+            print(f"分析时出错: {str(e)}")
+            return None
+        print(f"规则组: {group_name}")
+        for line in report.summary():
+            print(line)
+        for path in (json_path, csv_path):
+            if path:
+                print(f"报告: {path}")
+        return report
+
+    def import_rule_package(self, file_path, mode=IMPORT_MERGE, dry_run=False):
+        """导入规则包，所有变化一次写入；dry_run 为 True 时只显示将发生的变化"""
+        try:
+            package = read_rule_package(file_path)
+        except ValueError as e:
+            print(str(e))
+            return False
+        except OSError as e:
+            print(f"读取规则包时出错: {str(e)}")
+            return False
+        print(f"规则包版本: {package.version}，创建时间: {package.created_at}")
+        print(f"包含 {len(package.rule_groups)} 个规则组、{package.rule_count} 条规则")
+        if dry_run:
+            print(diff_rule_package(package, self.rule_groups, mode).summary())
+            return True
+        diff = apply_rule_package(package, self.rule_groups, self.group_options, mode)
+        if self.current_group not in self.rule_groups:
+            self.current_group = next(iter(self.rule_groups), "默认规则组")
+            self.rule_groups.setdefault(self.current_group, {})
+        print(diff.summary())
+        self.save_rules(diff.changed_groups)
+        return True
+
+    def undo_last_run(self):
+        """撤销最近一次移动模式的整理"""
+        try:
+            undo_last_run(self.undo_dir)
+        except Exception as e:
+            print(f"撤销时出错: {str(e)}")
+
 def get_valid_path(prompt, must_exist=False):
     """获取有效的路径输入"""
     while True:
@@ -241,7 +307,158 @@ def get_operation_mode():
         else:
             print("无效的选择，请重试！")
 
+def run_command(argv):
+    """无界面的命令行入口"""
+    parser = argparse.ArgumentParser(prog="main.py", description="文件整理助手命令行")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="启动本地任务服务（JSON 接口）")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    serve_parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    serve_parser.add_argument("--max-jobs", type=int, default=4, help="同时运行的任务数")
+    serve_parser.add_argument("--io-workers", type=int, default=8, help="所有任务共享的 I/O 线程数")
+    serve_parser.add_argument("--low-priority", action="store_true", help="I/O 线程以空闲 I/O 优先级和较高 nice 值运行")
+
+    organize_parser = subparsers.add_parser("organize", help="按规则整理文件")
+    organize_parser.add_argument("source", help="要整理的文件夹")
+    organize_parser.add_argument("target", nargs="?", help="整理后的文件存放路径（只使用 --route 时可省略）")
+    organize_parser.add_argument("--mode", choices=("copy", "move"), default="copy", help="操作模式")
+    organize_parser.add_argument("--group", help="规则组（默认使用当前规则组）")
+    organize_parser.add_argument("--route", nargs=3, action="append", metavar=("GROUP", "TARGET", "MODE"),
+                                 help="同一次扫描中再按规则组 GROUP 整理到 TARGET（MODE 为 copy 或 move，可重复）；"
+                                      "文件复制到每个匹配的 copy 路由，到第一个匹配的 move 路由为止，"
+                                      "扫描设置使用第一个规则组的")
+    organize_parser.add_argument("--executor", choices=EXECUTORS, default=EXECUTORS[0], help="执行器")
+    organize_parser.add_argument("--workers", type=int, default=None, help="并行执行器的工作线程/进程数")
+    organize_parser.add_argument("--order", choices=ORDERS, default=ORDERS[0], help="读取顺序")
+    organize_parser.add_argument("--small-files", action="store_true",
+                                 help=f"小文件（不超过 {SMALL_FILE_THRESHOLD // 1024} KB）批量复制")
+    organize_parser.add_argument("--limit-mb", type=float, default=0, help="带宽限制（MB/s，0 不限）")
+    organize_parser.add_argument("--limit-ops", type=float, default=0, help="每秒文件操作数限制（0 不限）")
+    organize_parser.add_argument("--low-priority", action="store_true", help="以空闲 I/O 优先级和较高 nice 值运行")
+    organize_parser.add_argument("--verify", action="store_true",
+                                 help="复制后校验摘要，移动模式校验通过后才删除源文件；"
+                                      "移动或 --durable 时先 fsync 再校验，否则校验可能读取的是页缓存")
+    organize_parser.add_argument("--durable", action="store_true",
+                                 help="分批 fsync 确保目标写入磁盘，移动模式写入后才删除源文件")
+    organize_parser.add_argument("--exclude", action="append", metavar="PATTERN",
+                                 help="排除的目录（通配符，可重复，追加到规则组的排除设置）")
+    organize_parser.add_argument("--max-depth", type=int, default=None, help="最大目录深度（0 不限）")
+    organize_parser.add_argument("--include-hidden", action="store_true", help="不跳过隐藏文件和目录")
+    organize_parser.add_argument("--scan-cache", action="store_true",
+                                 help="缓存目录列表，重复整理时跳过未变化的目录（不适用于 FAT/exFAT）")
+
+    analyze_parser = subparsers.add_parser("analyze", help="只扫描不整理，统计规则的匹配情况")
+    analyze_parser.add_argument("source", help="要分析的文件夹")
+    analyze_parser.add_argument("--group", help="规则组（默认使用当前规则组）")
+    analyze_parser.add_argument("--json", metavar="PATH", help="JSON 报告路径")
+    analyze_parser.add_argument("--csv", metavar="PATH", help="CSV 报告路径（都不指定时两种报告写入 resources/analysis）")
+    analyze_parser.add_argument("--top", type=int, default=20, help="列出的最大目录数")
+    analyze_parser.add_argument("--exclude", action="append", metavar="PATTERN",
+                                help="附加排除的目录（可多次指定）")
+    analyze_parser.add_argument("--max-depth", type=int, default=None, help="最大目录深度（0 不限）")
+    analyze_parser.add_argument("--include-hidden", action="store_true", help="不跳过隐藏文件和目录")
+    analyze_parser.add_argument("--scan-cache", action="store_true", help="使用扫描缓存")
+
+    subparsers.add_parser("undo", help="撤销上次移动")
+
+    import_parser = subparsers.add_parser("import-rules", help="导入规则包")
+    import_parser.add_argument("package", help="规则包文件（.json）")
+    import_parser.add_argument("--mode", choices=IMPORT_MODES, default=IMPORT_MERGE,
+                               help="merge 合并到同名规则组，replace-groups 覆盖同名规则组，replace-all 覆盖全部规则组")
+    import_parser.add_argument("--dry-run", action="store_true", help="只显示将发生的变化，不保存")
+
+    store_parser = subparsers.add_parser("store", help="切换规则存储方式")
+    store_parser.add_argument("backend", choices=STORES, help="json（默认）或 sqlite（适合很大的规则集）")
+
+    args = parser.parse_args(argv)
+    organizer = FileOrganizer()
+
+    if args.command == "serve":
+        from job_server import serve
+        serve(organizer, args.host, args.port, args.max_jobs, args.io_workers, args.low_priority)
+    elif args.command == "organize":
+        if not os.path.isdir(args.source):
+            print(f"路径 '{args.source}' 不存在！")
+            return
+        if args.group:
+            if args.group not in organizer.rule_groups:
+                print(f"规则组 '{args.group}' 不存在！")
+                return
+            organizer.current_group = args.group
+        routes = [(organizer.current_group, args.target, args.mode)] if args.target else []
+        routes += [tuple(route) for route in args.route or []]
+        if not routes:
+            print("请指定目标目录或 --route！")
+            return
+        for group_name, target_dir, mode in routes:
+            if group_name not in organizer.rule_groups:
+                print(f"规则组 '{group_name}' 不存在！")
+                return
+            if mode not in ("copy", "move"):
+                print(f"操作模式必须是 copy 或 move: {mode}")
+                return
+            if os.path.abspath(args.source) == os.path.abspath(target_dir):
+                print("源目录和目标目录不能相同！")
+                return
+        scan = scan_options(organizer.group_options, routes[0][0])
+        scan["exclude"] += args.exclude or []
+        if args.max_depth is not None:
+            scan["max_depth"] = args.max_depth
+        if args.include_hidden:
+            scan["skip_hidden"] = False
+        organizer.organize_files(
+            args.source,
+            args.target,
+            args.mode,
+            routes=routes,
+            executor=args.executor,
+            max_workers=args.workers,
+            order=args.order,
+            small_file_threshold=SMALL_FILE_THRESHOLD if args.small_files else 0,
+            bandwidth_limit=args.limit_mb * 1024 * 1024,
+            ops_limit=args.limit_ops,
+            low_priority=args.low_priority,
+            verify=args.verify,
+            durable=args.durable,
+            scan_cache_dir=organizer.scan_cache_dir if args.scan_cache else None,
+            **scan
+        )
+    elif args.command == "analyze":
+        if not os.path.isdir(args.source):
+            print(f"路径 '{args.source}' 不存在！")
+            return
+        group_name = args.group or organizer.current_group
+        if group_name not in organizer.rule_groups:
+            print(f"规则组 '{group_name}' 不存在！")
+            return
+        scan = scan_options(organizer.group_options, group_name)
+        scan["exclude"] += args.exclude or []
+        if args.max_depth is not None:
+            scan["max_depth"] = args.max_depth
+        if args.include_hidden:
+            scan["skip_hidden"] = False
+        if organizer.analyze_files(args.source, group_name, args.json, args.csv, args.scan_cache,
+                                   top_directories=args.top, **scan) is None:
+            sys.exit(1)
+    elif args.command == "undo":
+        organizer.undo_last_run()
+    elif args.command == "import-rules":
+        if not organizer.import_rule_package(args.package, args.mode, args.dry_run):
+            sys.exit(1)
+    elif args.command == "store":
+        try:
+            organizer.store.convert(args.backend, organizer.rule_groups, organizer.current_group,
+                                    organizer.group_options)
+            print(f"规则已保存到 {organizer.store.path}")
+        except Exception as e:
+            print(f"切换规则存储时出错: {str(e)}")
+
 def main():
+    if len(sys.argv) > 1:
+        run_command(sys.argv[1:])
+        return
+    
     # 确保resources目录存在
     resources_dir = Path("resources")
     resources_dir.mkdir(exist_ok=True)
@@ -255,18 +472,19 @@ def main():
         print("3. 查看当前规则")
         print("4. 删除规则")
         print("5. 规则组管理")
-        print("6. 关于")
-        print("7. 退出")
+        print("6. 撤销上次移动")
+        print("7. 关于")
+        print("8. 退出")
         
         try:
-            choice = input("\n请选择操作 (1-7): ")
+            choice = input("\n请选择操作 (1-8): ")
             
             if choice == "1":
-                keyword = input("请输入关键词或文件扩展名（如 .pdf）: ")
+                keyword = input("请输入关键词或文件扩展名（如 .pdf，也可用 dir:目录 / glob:通配符 / re:正则 / type:按内容，可加 & size:>1GB / & age:>365d）: ")
                 folder_name = input("请输入对应的文件夹名称（留空则使用关键词）: ")
                 group_name = input("请输入规则组名称（留空则使用当前规则组）: ")
                 if organizer.add_rule(keyword, folder_name, group_name):
-                    print(f"已添加规则: {keyword} -> {folder_name or keyword}")
+                    print(f"已添加规则: {keyword} -> {folder_name or default_folder(keyword)}")
                 
             elif choice == "2":
                 source_dir = get_valid_path("请输入要整理的文件夹路径: ", must_exist=True)
@@ -397,6 +615,10 @@ def main():
                         print("无效的选择，请重试！")
                 
             elif choice == "6":
+                if input("确定要将上次移动的文件还原到原位置吗？(y/n): ").strip().lower() == "y":
+                    organizer.undo_last_run()
+                
+            elif choice == "7":
                 print("\n=== 关于 ===")
                 print("文件整理助手 v1.4.0")
                 print("一个固定规则的文件分类工具，可以根据文件名中的关键词或文件类型自动将文件分类到不同的文件夹中。")
@@ -407,7 +629,7 @@ def main():
                 print("\n© 2023 cxin. 保留所有权利。")
                 input("\n按回车键继续...")
                 
-            elif choice == "7":
+            elif choice == "8":
                 print("感谢使用！再见！")
                 break
                 
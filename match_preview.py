@@ -0,0 +1,208 @@
+import heapq
+from array import array
+from rules import RuleMatcher, split_conditions, split_rule, name_test, RULE_TYPE, RULE_DIR
+from organize_engine import scan_files
+
+# 预览最多使用的文件数，超过时等间隔抽样，统计结果按比例放大
+PREVIEW_SAMPLE_LIMIT = 1000000
+# 一次新增的规则超过该数量时（如切换规则组、导入规则包）直接全部重新计算
+INCREMENTAL_RULE_LIMIT = 16
+
+
+def _is_type_rule(keyword):
+    return split_rule(split_conditions(keyword)[0])[0] == RULE_TYPE
+
+
+class MatchPreview:
+    """规则匹配预览：对一次扫描的文件列表统计每条规则会匹配多少文件和字节
+
+    第一次 evaluate() 按规则顺序计算每个文件命中的第一条规则；之后每次只按规则的增删重新分配受影响的文件：
+    删除的规则原来命中的文件只需再和它后面的规则比较，新增的规则只需检查排在它后面的规则所命中的文件和未匹配的文件。
+    编辑中的规则通常排在最后，因此每次按键只检查未匹配的文件。
+    """
+
+    def __init__(self, files, root, sample_limit=PREVIEW_SAMPLE_LIMIT):
+        total = len(files)
+        stride = max(1, -(-total // sample_limit)) if sample_limit else 1
+        sizes = files.sizes if files.sizes is not None else array('q', bytes(8 * total))
+        if stride == 1:
+            names = list(files.iter_names())
+            self.dir_ids = files.dir_ids
+            self.sizes = sizes
+            self.mtimes = files.mtimes
+        else:
+            picked = range(0, total, stride)
+            names = [files.name(index) for index in picked]
+            self.dir_ids = array('I', (files.dir_ids[index] for index in picked))
+            self.sizes = array('q', (sizes[index] for index in picked))
+            self.mtimes = array('q', (files.mtimes[index] for index in picked)) if files.mtimes is not None else None
+        self.root = root
+        self.total_files = total
+        self.names = names
+        self.lower_names = [name.lower() for name in names]
+        self.directories = files.directories
+        # 无法获取大小的文件记为 -1，求和时需要修正
+        self._missing_sizes = -1 in self.sizes
+        self.total_bytes = self._sum_sizes(range(len(names)))
+        # 抽样时每个样本代表的文件数
+        self.scale = total / len(names) if names else 1
+        self.keywords = []
+        self.members = {}
+        self.unmatched = list(range(len(names)))
+        self.unsupported = set()
+        self._stats = {}
+
+    @property
+    def sampled(self):
+        return self.scale != 1
+
+    def _sum_sizes(self, indices):
+        sizes = self.sizes
+        total = sum(map(sizes.__getitem__, indices))
+        if self._missing_sizes:
+            total += sum(1 for index in indices if sizes[index] < 0)
+        return total
+
+    def _metadata(self, index):
+        size = self.sizes[index]
+        if size < 0 or self.mtimes is None:
+            return None
+        return size, self.mtimes[index]
+
+    def _matcher(self, keywords, rules):
+        """只含 keywords 中规则（不含 type: 规则）的匹配器，返回 (匹配器, 规则列表)"""
+        keywords = [keyword for keyword in keywords if not _is_type_rule(keyword)]
+        return RuleMatcher({keyword: rules[keyword] for keyword in keywords}, self.root), keywords
+
+    def _assign(self, indices, matcher, keywords):
+        """用 matcher 为文件找出第一条匹配的规则，加入对应的 members，都不匹配的加入未匹配"""
+        if not keywords:
+            self.unmatched.extend(indices)
+            return
+        names = self.names
+        directories = self.directories
+        dir_ids = self.dir_ids
+        members = [self.members[keyword] for keyword in keywords]
+        unmatched = self.unmatched
+        for index in indices:
+            found = matcher.match_rule(names[index], directories[dir_ids[index]],
+                                       lambda: self._metadata(index))
+            if found is None:
+                unmatched.append(index)
+            else:
+                members[found[0]].append(index)
+
+    def _rule_filter(self, keyword):
+        """返回检查单条规则的函数（输入文件编号列表，返回匹配的编号列表），type: 规则返回 None"""
+        name, conditions = split_conditions(keyword)
+        if _is_type_rule(keyword):
+            return None
+        if not conditions:
+            prefix, test = name_test(name)
+            if not prefix:
+                lower_names = self.lower_names
+                return lambda indices: [index for index in indices if test in lower_names[index]]
+            if prefix != RULE_DIR:
+                names = self.names
+                match = test.match
+                return lambda indices: [index for index in indices if match(names[index])]
+        # 目录规则和带条件的规则用只含这一条规则的匹配器，目录结果按目录缓存
+        matcher = RuleMatcher({keyword: ""}, self.root)
+        names = self.names
+        directories = self.directories
+        dir_ids = self.dir_ids
+        return lambda indices: [
+            index for index in indices
+            if matcher.match_rule(names[index], directories[dir_ids[index]],
+                                  lambda: self._metadata(index)) is not None]
+
+    def evaluate(self, rules):
+        """按 rules（关键词 -> 文件夹）重新统计，规则无效时抛出 ValueError（统计保持上一次的结果）"""
+        keywords = list(rules)
+        position = {keyword: pos for pos, keyword in enumerate(keywords)}
+        kept_old = [keyword for keyword in self.keywords if keyword in position]
+        kept_new = [keyword for keyword in keywords if keyword in self.members]
+        inserted = [keyword for keyword in keywords if keyword not in self.members]
+        if kept_old != kept_new or len(inserted) > INCREMENTAL_RULE_LIMIT:
+            # 保留的规则之间顺序变了或新增的规则很多，全部重新计算
+            matcher, matched_keywords = self._matcher(keywords, rules)
+            self.keywords = keywords
+            self.members = {keyword: [] for keyword in keywords}
+            self.unmatched = []
+            # type: 规则要读取文件内容，不参与预览
+            self.unsupported = {keyword for keyword in keywords if _is_type_rule(keyword)}
+            self._stats = {}
+            self._assign(range(len(self.names)), matcher, matched_keywords)
+            return
+        filters = {keyword: self._rule_filter(keyword) for keyword in inserted}
+
+        # 删除的规则命中的文件：之前的规则都不匹配，只需和原来排在它后面、仍然保留的规则比较
+        old_position = {keyword: pos for pos, keyword in enumerate(self.keywords)}
+        orphans = []
+        for keyword in self.keywords:
+            if keyword not in position:
+                orphans.append((old_position[keyword], self.members.pop(keyword)))
+                self._stats.pop(keyword, None)
+                self.unsupported.discard(keyword)
+        for keyword in inserted:
+            self.members[keyword] = []
+            if filters[keyword] is None:
+                self.unsupported.add(keyword)
+        for start, indices in orphans:
+            later = [keyword for keyword in kept_old if old_position[keyword] > start]
+            self._assign(indices, *self._matcher(later, rules))
+            for keyword in later:
+                self._stats.pop(keyword, None)
+        if orphans:
+            self._stats.pop(None, None)
+
+        # 新增的规则按顺序从排在它后面的规则和未匹配的文件中取走匹配的文件
+        for keyword in inserted:
+            check = filters[keyword]
+            if check is None:
+                continue
+            taken = self.members[keyword]
+            for later in keywords[position[keyword] + 1:] + [None]:
+                indices = self.unmatched if later is None else self.members[later]
+                if not indices:
+                    continue
+                hits = check(indices)
+                if not hits:
+                    continue
+                hit_set = set(hits)
+                remaining = [index for index in indices if index not in hit_set]
+                if later is None:
+                    self.unmatched = remaining
+                else:
+                    self.members[later] = remaining
+                taken.extend(hits)
+                self._stats.pop(later, None)
+            self._stats.pop(keyword, None)
+        self.keywords = keywords
+
+    def stats(self, keyword):
+        """规则命中的 (文件数, 字节数)，keyword 为 None 时返回未匹配的文件；抽样时为估计值"""
+        found = self._stats.get(keyword)
+        if found is None:
+            indices = self.unmatched if keyword is None else self.members[keyword]
+            size = self._sum_sizes(indices)
+            found = self._stats[keyword] = (round(len(indices) * self.scale), round(size * self.scale))
+        return found
+
+    def top_rules(self, count):
+        """命中文件最多的 count 条规则 [(关键词, 文件数, 字节数)]"""
+        counted = ((keyword, len(indices)) for keyword, indices in self.members.items() if indices)
+        return [(keyword, *self.stats(keyword))
+                for keyword, _ in heapq.nlargest(count, counted, key=lambda item: item[1])]
+
+    def matched(self):
+        """已匹配的 (文件数, 字节数)"""
+        files = len(self.names) - len(self.unmatched)
+        unmatched_bytes = self.stats(None)[1]
+        return round(files * self.scale), round(self.total_bytes * self.scale) - unmatched_bytes
+
+
+def build_preview(source_dir, scan_filter=None, scan_cache=None, sample_limit=PREVIEW_SAMPLE_LIMIT):
+    """扫描源目录（只读取元数据）并建立预览"""
+    files = scan_files(source_dir, scan_filter, scan_cache, with_sizes=True, with_mtimes=True)
+    return MatchPreview(files, source_dir, sample_limit)
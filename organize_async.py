@@ -0,0 +1,170 @@
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from organize_engine import OrganizeEngine, transfer_file
+from sniff import sniff_file
+
+# 每次交给匹配线程池的文件数
+CLASSIFY_CHUNK = 256
+
+
+class AsyncOrganizer:
+    """供 asyncio 服务嵌入的整理接口，同一事件循环中可以同时运行多个整理任务：
+
+        async with AsyncOrganizer(max_workers=8) as organizer:
+            async for event in organizer.organize(rules, source_dir, target_dir):
+                ...
+    """
+
+    def __init__(self, max_workers=None, scheduler=None, classify_workers=None):
+        # 文件操作交给共享的线程池，并由信号量限制总并发数
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        # 规则匹配每 CLASSIFY_CHUNK 个文件一批，在独立的线程池中进行，不在文件操作后面排队
+        self.classify_workers = classify_workers or min(4, os.cpu_count() or 1)
+        # 传入 DeviceScheduler 时文件复制/移动改由它按设备调度
+        self.scheduler = scheduler
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="organize-io")
+        self._classifier = ThreadPoolExecutor(max_workers=self.classify_workers,
+                                              thread_name_prefix="organize-classify")
+        self._limit = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self):
+        """关闭线程池，等待已提交的操作完成"""
+        self._classifier.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+
+    async def _call(self, fn, *args):
+        """在受限的线程池中执行阻塞调用"""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_workers)
+        async with self._limit:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _transfer(self, task, operation_mode):
+        """执行单个文件的复制或移动，返回 (任务, 错误, 字节数)"""
+        try:
+            if self.scheduler is not None:
+                size = await asyncio.wrap_future(self.scheduler.submit(transfer_file, task[0], task[1], operation_mode))
+            else:
+                size = await self._call(transfer_file, task[0], task[1], operation_mode)
+            return task, None, size
+        except Exception as e:
+            return task, e, 0
+
+    @staticmethod
+    def _route_chunk(engine, files, start, stop):
+        """匹配 files[start:stop] 的规则并分配目标路径（条件规则会 stat、type: 规则会读取文件开头），
+        返回 [(源文件, 文件夹名称, 任务, 错误)]，未匹配时文件夹名称为 None
+        """
+        results = []
+        for index in range(start, stop):
+            source = files[index]
+            names = engine.classify_names(source, files.directory(index))
+            found = engine.select_routes(names, sniff_file(source) if engine.needs_content(names) else None)
+            if not found:
+                results.append((source, None, None, None))
+                continue
+            route, folder_name = found[0]
+            try:
+                results.append((source, folder_name, engine.prepare(source, folder_name, route), None))
+            except Exception as e:
+                results.append((source, folder_name, None, e))
+        return results
+
+    def _classify(self, engine, files, start):
+        """在匹配线程池中处理从 start 开始的一批文件，已处理完时返回 None"""
+        if start >= len(files):
+            return None
+        stop = min(start + CLASSIFY_CHUNK, len(files))
+        return asyncio.get_running_loop().run_in_executor(self._classifier, self._route_chunk,
+                                                          engine, files, start, stop)
+
+    async def organize(self, rules, source_dir, target_dir, operation_mode='copy',
+                       journal_dir=None, concurrency=None, exclude=(), max_depth=0, skip_hidden=True,
+                       scan_cache_dir=None):
+        """整理文件，以异步迭代器的形式产出 OrganizeEvent
+
+        concurrency 限制本次整理同时进行的文件操作数，默认使用线程池大小；
+        exclude、max_depth、skip_hidden、scan_cache_dir 为规则组的扫描设置。
+        取消迭代所在的任务即可取消整理，已开始的文件操作会先完成。
+        只实现基本的复制/移动，校验、批量 fsync、限速、小文件批量复制、读取顺序和多路由需要使用 OrganizeEngine.run()。
+        """
+        engine = OrganizeEngine(rules, operation_mode, journal_dir=journal_dir, exclude=exclude,
+                                max_depth=max_depth, skip_hidden=skip_hidden, scan_cache_dir=scan_cache_dir)
+        window = concurrency or self.max_workers
+
+        files = await self._call(engine.begin, source_dir, target_dir)
+        running = set()
+        chunk = None
+        try:
+            yield engine.start_event(source_dir)
+            if engine.total == 0:
+                yield engine.finished_event()
+                return
+
+            start = 0
+            chunk = self._classify(engine, files, start)
+            while chunk is not None:
+                results = await asyncio.shield(chunk)
+                start += len(results)
+                # 处理这一批的同时匹配下一批
+                chunk = self._classify(engine, files, start)
+                for source, folder_name, task, error in results:
+                    if folder_name is None:
+                        yield engine.skip(source)
+                    else:
+                        yield engine.matched(source, folder_name)
+                        if error is not None:
+                            yield engine.fail(source, folder_name, error)
+                        else:
+                            running.add(asyncio.ensure_future(self._transfer(task, operation_mode)))
+
+                        if len(running) >= window:
+                            engine.flush_journal()
+                            finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                            for future in finished:
+                                yield engine.complete(*future.result())
+
+                    event = engine.progress_event()
+                    if event is not None:
+                        yield event
+
+            while running:
+                engine.flush_journal()
+                finished, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in finished:
+                    yield engine.complete(*future.result())
+
+            yield engine.progress_event(force=True)
+            yield engine.finished_event()
+        except BaseException:
+            # 取消或出错时，等待已开始的文件操作结束并记入撤销日志
+            engine.cancel()
+            if chunk is not None:
+                await asyncio.gather(chunk, return_exceptions=True)
+            if running:
+                results = await asyncio.gather(*running, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, tuple):
+                        engine.complete(*result)
+            raise
+        finally:
+            engine.end()
+
+
+async def organize(rules, source_dir, target_dir, operation_mode='copy', journal_dir=None, max_workers=None,
+                   exclude=(), max_depth=0, skip_hidden=True, scan_cache_dir=None):
+    """使用独立线程池整理单个目录的便捷函数"""
+    async with AsyncOrganizer(max_workers) as organizer:
+        async for event in organizer.organize(rules, source_dir, target_dir, operation_mode, journal_dir,
+                                              exclude=exclude, max_depth=max_depth, skip_hidden=skip_hidden,
+                                              scan_cache_dir=scan_cache_dir):
+            yield event
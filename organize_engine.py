@@ -0,0 +1,699 @@
+import os
+import errno
+import shutil
+import hashlib
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from undo_journal import UndoJournal
+from io_scheduler import DeviceScheduler, ORDER_SCAN, order_batch
+from fast_copy import copy_small_files, copy_file, SMALL_FILE_BATCH, READAHEAD_FILES
+from throttle import Throttle, RateMeter, lower_thread_priority
+from verify import (verify_copy, VerifyReport, HASH_ALGORITHM, VERIFY_OK, VERIFY_RENAMED,
+                    VERIFY_FAILED)
+from durability import sync_batch, DURABLE_BATCH
+from scan_filter import ScanFilter
+from scan_cache import ScanCache, list_directory
+from file_list import FileList
+from rules import RuleMatcher
+from sniff import sniff_file
+
+# 事件类型
+EVENT_START = "start"
+EVENT_MATCHED = "matched"
+EVENT_COPIED = "copied"
+EVENT_SKIPPED = "skipped"
+EVENT_ERROR = "error"
+EVENT_PROGRESS = "progress"
+EVENT_FINISHED = "finished"
+
+# 执行器类型
+EXECUTOR_SEQUENTIAL = "sequential"
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+EXECUTOR_DEVICE = "device"
+EXECUTORS = (EXECUTOR_SEQUENTIAL, EXECUTOR_THREAD, EXECUTOR_PROCESS, EXECUTOR_DEVICE)
+
+
+class OrganizeEvent:
+    """整理过程中产生的结构化事件"""
+
+    __slots__ = ("kind", "source", "target", "folder", "message", "done", "total",
+                 "bytes", "ops_rate", "bytes_rate")
+
+    def __init__(self, kind, source=None, target=None, folder=None, message=None, done=0, total=0,
+                 bytes=0, ops_rate=0.0, bytes_rate=0.0):
+        self.kind = kind
+        self.source = source
+        self.target = target
+        self.folder = folder
+        self.message = message
+        self.done = done
+        self.total = total
+        self.bytes = bytes
+        self.ops_rate = ops_rate
+        self.bytes_rate = bytes_rate
+
+    def to_dict(self):
+        """转换为字典，便于序列化"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"OrganizeEvent({self.kind!r}, source={self.source!r}, folder={self.folder!r})"
+
+
+class SequentialExecutor:
+    """顺序执行器：在当前线程中立即执行任务"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+def create_executor(kind=EXECUTOR_SEQUENTIAL, max_workers=None, initializer=None):
+    """创建指定类型的执行器，initializer 在每个工作线程/进程启动时调用
+
+    initializer 可能修改线程优先级，不能在调用者的线程中执行：顺序执行器指定了 initializer 时
+    改用单个工作线程（引擎仍然一次只提交一个任务）。
+    """
+    if kind == EXECUTOR_SEQUENTIAL:
+        if initializer is not None:
+            return ThreadPoolExecutor(max_workers=1, initializer=initializer)
+        return SequentialExecutor()
+    if kind == EXECUTOR_THREAD:
+        return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer)
+    if kind == EXECUTOR_PROCESS:
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=initializer)
+    if kind == EXECUTOR_DEVICE:
+        return DeviceScheduler(max_workers=max_workers, initializer=initializer)
+    raise ValueError(f"未知的执行器类型: {kind}")
+
+
+def transfer_file(source, target, operation_mode, throttle=None, hash_name=None, keep_source=False):
+    """复制或移动单个文件（可在线程或进程中执行），返回文件字节数
+
+    复制（以及跨设备移动）经 fast_copy.copy_file 进行，保留稀疏文件的空洞并预分配大文件。
+    传入 hash_name 时复制过程中同时计算摘要；keep_source 为 True 时跨设备移动只复制、不删除源文件。
+    这两种情况下发生了复制时返回 (字节数, 摘要或 None)，由后续的校验/持久化步骤删除源文件；
+    同设备移动只是重命名，仍返回字节数。
+    """
+    if throttle is not None:
+        throttle.op()
+    if hash_name is not None or keep_source:
+        if operation_mode == 'move':
+            try:
+                os.rename(source, target)
+                return os.path.getsize(target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        hasher = hashlib.new(hash_name) if hash_name is not None else None
+        copy_file(source, target, throttle, hasher=hasher)
+        return os.path.getsize(target), hasher.hexdigest() if hasher is not None else None
+    copy_function = lambda src, dst: copy_file(src, dst, throttle)
+    if operation_mode == 'move':
+        shutil.move(source, target, copy_function=copy_function)
+    else:
+        copy_function(source, target)
+    return os.path.getsize(target)
+
+
+def file_metadata(path):
+    """返回文件的 (大小, 修改时间纳秒)，无法获取时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def scan_files(source_dir, scan_filter=None, scan_cache=None, with_inodes=False, with_sizes=False,
+               with_mtimes=False):
+    """递归列出源目录下的所有文件，返回按扫描顺序排列的 FileList
+
+    with_inodes 为 True 时同时记录每个文件的 inode 号（POSIX 上来自目录项，无需额外 stat）；
+    with_sizes/with_mtimes 为 True 时同时记录文件大小和修改时间（纳秒），无法获取时记为 -1。
+    传入 scan_filter 时在遍历过程中剪掉被排除的子目录，不会读取其中的任何内容；
+    传入 scan_cache 时未变化的目录直接使用缓存的列表，不再重新列出。
+    """
+    lister = scan_cache.listing if scan_cache is not None else list_directory
+    separators = (os.sep, os.altsep) if os.altsep else (os.sep,)
+    files = FileList(with_inodes, with_sizes, with_mtimes)
+    skip_hidden = scan_filter is not None and scan_filter.skip_hidden
+    need_path = scan_filter is not None and scan_filter.needs_path
+    stack = [(source_dir, "", 0)]
+    while stack:
+        directory, rel_dir, depth = stack.pop()
+        try:
+            subdirs, names, *columns = lister(directory, with_inodes, with_sizes, with_mtimes)
+        except OSError:
+            continue
+        if skip_hidden and any(name.startswith('.') for name in names):
+            keep = [index for index, name in enumerate(names) if not scan_filter.skip_file(name)]
+            names = [names[index] for index in keep]
+            columns = [[column[index] for index in keep] if column is not None else None for column in columns]
+        if names:
+            files.extend(files.add_directory(directory), names, *columns)
+        # 与 os.path.join 结果相同，但避免逐个文件调用
+        prefix = directory if directory.endswith(separators) else directory + os.sep
+        children = []
+        for name in subdirs:
+            rel_path = f"{rel_dir}{name}" if need_path else ""
+            if scan_filter is None or not scan_filter.prune(name, rel_path, depth + 1):
+                children.append((prefix + name, rel_path + "/" if need_path else "", depth + 1))
+        stack.extend(reversed(children))
+    return files
+
+
+class Route:
+    """多规则组整理中的一条路由：一个规则组的规则、目标目录和操作模式
+
+    target_dir 为 None 时使用 run() 传入的目标目录。
+    """
+
+    def __init__(self, rules, target_dir=None, operation_mode='copy', name=None):
+        self.matcher = RuleMatcher(rules)
+        self.target_dir = target_dir
+        self.operation_mode = operation_mode
+        self.name = name
+
+
+class OrganizeEngine:
+    """文件整理引擎：扫描源目录、按规则匹配，通过可替换的执行器复制或移动文件，run() 逐个产出 OrganizeEvent
+
+    begin/classify_names/select_routes/prepare/complete/end 是 run() 使用的逐文件步骤，供其他调度方式（如 asyncio）复用。
+    """
+
+    def __init__(self, rules, operation_mode='copy', executor=EXECUTOR_SEQUENTIAL,
+                 max_workers=None, journal_dir=None, progress_interval=0.1,
+                 order=ORDER_SCAN, order_batch=4096,
+                 small_file_threshold=0, small_file_batch=SMALL_FILE_BATCH,
+                 bandwidth_limit=0, ops_limit=0, low_priority=False,
+                 verify=False, verify_workers=None, report_dir=None, hash_name=HASH_ALGORITHM,
+                 durable=False, durable_batch=DURABLE_BATCH,
+                 exclude=(), max_depth=0, skip_hidden=True, scan_cache_dir=None, sniff_workers=None,
+                 routes=None):
+        # routes 为 Route 列表时一次扫描按多个规则组整理（忽略 rules 和 operation_mode，分配方式见 select_routes），
+        # 扫描设置由调用方按第一个规则组传入，对所有路由生效
+        self.routes = list(routes) if routes else [Route(rules, None, operation_mode)]
+        self.matcher = self.routes[0].matcher
+        self.needs_metadata = any(route.matcher.needs_metadata for route in self.routes)
+        self.needs_sniffing = any(route.matcher.needs_sniffing for route in self.routes)
+        modes = {route.operation_mode for route in self.routes}
+        operation_mode = self.routes[0].operation_mode
+        self.scan_filter = ScanFilter(exclude, max_depth, skip_hidden)
+        # 按目录修改时间的扫描缓存（见 scan_cache.ScanCache），None 表示不使用
+        self.scan_cache_dir = scan_cache_dir
+        self.scan_cache_hits = 0
+        self.scan_cache_misses = 0
+        self._metadata_columns = False
+        # 需要 type: 规则识别内容的文件交给 sniff_workers 个线程读取文件开头
+        self.sniff_workers = sniff_workers or min(8, (os.cpu_count() or 1) * 2)
+        self.sniffed_files = 0
+        self.operation_mode = operation_mode
+        # 执行器类型名称，或多个整理任务共享的执行器对象（由调用方负责关闭）
+        self.executor_kind = executor
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        self.journal_dir = journal_dir
+        self.progress_interval = progress_interval
+        # order 为 inode/extent 时每 order_batch 个文件排序后再读取（见 io_scheduler.order_batch）
+        self.order = order
+        self.order_batch = order_batch
+        # 复制的小文件每 small_file_batch 个合成一个任务（见 fast_copy.copy_small_files）
+        self.small_file_threshold = small_file_threshold if 'copy' in modes else 0
+        self.has_moves = 'move' in modes
+        self.small_file_batch = small_file_batch
+        # bandwidth_limit 为字节/秒，ops_limit 为次/秒（见 throttle.Throttle）
+        self.throttle = Throttle(bandwidth_limit, ops_limit)
+        if not self.throttle.enabled:
+            self.throttle = None
+        elif executor == EXECUTOR_PROCESS:
+            raise ValueError("限速不支持进程池执行器")
+        # 工作线程以较低的 CPU/I/O 优先级运行（见 throttle.lower_thread_priority）
+        self.low_priority = low_priority
+        # 复制时计算摘要，由独立的校验线程池重新读取比对，结果写入 report_dir（见 verify.verify_copy）
+        self.verify = verify
+        # 复制的文件不 fsync 时，校验重新读取的可能是页缓存中的数据
+        self.verify_cached = verify and not durable and 'copy' in modes
+        self.verify_workers = verify_workers or min(8, os.cpu_count() or 1)
+        self.report_dir = report_dir
+        self.hash_name = hash_name if verify else None
+        self.report_path = None
+        # 每 durable_batch 个完成的文件 fsync 一批，移动的源文件在此之后才删除（见 durability.sync_batch）
+        self.durable = durable
+        self.durable_batch = durable_batch
+        self.cancelled = False
+        self.processed_files = 0
+        self.verified_files = 0
+        self.skipped_files = 0
+        self.error_files = 0
+        self.done = 0
+        self.total = 0
+        self.bytes_done = 0
+        self.target_dir = None
+        self._journal = None
+        self._report = None
+        self._created_folders = set()
+        self._reserved = set()
+        self._last_progress = 0.0
+        self._rate = RateMeter()
+
+    def cancel(self):
+        """请求取消，已提交的任务完成后停止"""
+        self.cancelled = True
+
+    def _unique_target(self, folder, file_name):
+        """生成不冲突的目标路径，已存在时添加数字后缀"""
+        target = os.path.join(folder, file_name)
+        if target not in self._reserved and not os.path.exists(target):
+            self._reserved.add(target)
+            return target
+        base_name, extension = os.path.splitext(file_name)
+        counter = 1
+        while True:
+            target = os.path.join(folder, f"{base_name}_{counter}{extension}")
+            if target not in self._reserved and not os.path.exists(target):
+                self._reserved.add(target)
+                return target
+            counter += 1
+
+    def begin(self, source_dir, target_dir=None):
+        """开始一次整理：重置状态、创建目标目录，返回待处理的文件列表（FileList）
+
+        target_dir 用于没有指定目标目录的路由，所有路由都有目标目录时可以省略。
+        """
+        self.cancelled = False
+        self.processed_files = 0
+        self.skipped_files = 0
+        self.error_files = 0
+        self.verified_files = 0
+        self.sniffed_files = 0
+        self.done = 0
+        self.bytes_done = 0
+        self.report_path = None
+        self._created_folders = set()
+        self._reserved = set()
+        self._last_progress = time.monotonic()
+        self._rate = RateMeter()
+
+        source_dir = os.path.abspath(source_dir)
+        self._targets = []
+        for route in self.routes:
+            route_target = route.target_dir or target_dir
+            if not route_target:
+                raise ValueError("请指定目标目录")
+            route_target = os.path.abspath(route_target)
+            route.matcher.set_root(source_dir)
+            os.makedirs(route_target, exist_ok=True)
+            self._targets.append(route_target)
+        self.target_dir = self._targets[0]
+
+        scan_cache = ScanCache.for_source(self.scan_cache_dir, source_dir) if self.scan_cache_dir else None
+        # Windows 的目录项自带 stat 结果；扫描缓存中的大小和修改时间可能已过期，不用于规则
+        self._metadata_columns = self.needs_metadata and os.name == 'nt' and scan_cache is None
+        files = scan_files(source_dir, self.scan_filter, scan_cache,
+                           with_inodes=self.order != ORDER_SCAN,
+                           with_sizes=self.small_file_threshold > 0 or self._metadata_columns,
+                           with_mtimes=self._metadata_columns)
+        if scan_cache is not None:
+            try:
+                scan_cache.save()
+            except OSError:
+                # 缓存只用于加速，保存失败不影响本次整理
+                pass
+            self.scan_cache_hits = scan_cache.hits
+            self.scan_cache_misses = scan_cache.misses
+        self.total = len(files)
+        if self.total and self.has_moves and self.journal_dir is not None:
+            self._journal = UndoJournal.start(self.journal_dir, source_dir, self.target_dir)
+        if self.total and self.verify and self.report_dir is not None:
+            self._report = VerifyReport.start(self.report_dir, self.hash_name)
+            self.report_path = str(self._report.path)
+        return files
+
+    def start_event(self, source_dir):
+        """开始事件"""
+        return OrganizeEvent(EVENT_START, source=os.path.abspath(source_dir),
+                             target=self.target_dir, total=self.total)
+
+    def classify_names(self, source, directory=None, size=-1, mtime=-1):
+        """按名称、目录和大小/时间规则匹配每个路由，返回各路由的文件夹名称列表（未匹配为 None）
+
+        只计算到第一个匹配的移动路由为止，后面的路由为 None（隐藏文件在扫描时已跳过）。
+        directory 为文件所在目录（FileList 中同一目录共用的字符串），目录规则按目录缓存结果；
+        size/mtime 为扫描时已取得的大小和修改时间（纳秒），未知时规则需要的话再 stat（多个路由共用一次）。
+        """
+        if directory is None:
+            directory = os.path.dirname(source)
+        metadata = None
+        if self.needs_metadata:
+            if size >= 0 and mtime >= 0:
+                metadata = lambda: (size, mtime)
+            else:
+                cached = []
+
+                def metadata():
+                    if not cached:
+                        cached.append(file_metadata(source))
+                    return cached[0]
+        file_name = os.path.basename(source)
+        names = [None] * len(self.routes)
+        for index, route in enumerate(self.routes):
+            names[index] = route.matcher.match(file_name, directory, metadata)
+            if names[index] is not None and route.operation_mode == 'move':
+                break
+        return names
+
+    def needs_content(self, names):
+        """classify_names 的结果是否还需要识别文件内容（有 type: 规则的路由尚未匹配）"""
+        for index, route in enumerate(self.routes):
+            if names[index] is None:
+                if route.matcher.needs_sniffing:
+                    return True
+            elif route.operation_mode == 'move':
+                break
+        return False
+
+    def select_routes(self, names, kind=None):
+        """由各路由的匹配结果（和 sniff.sniff_file 识别的内容类型 kind）选出文件要交给的路由 [(路由序号, 文件夹名称)]
+
+        与按路由顺序分别整理相同：每个匹配的复制路由都复制一份，到第一个匹配的移动路由为止。
+        """
+        found = []
+        for index, route in enumerate(self.routes):
+            folder_name = names[index]
+            if folder_name is None and kind is not None:
+                folder_name = route.matcher.match_type(kind)
+            if folder_name is not None:
+                found.append((index, folder_name))
+                if route.operation_mode == 'move':
+                    break
+        return found
+
+    def skip(self, source):
+        """记录跳过的文件"""
+        self.done += 1
+        self.skipped_files += 1
+        return OrganizeEvent(EVENT_SKIPPED, source=source, done=self.done, total=self.total)
+
+    def matched(self, source, folder_name):
+        """匹配事件"""
+        return OrganizeEvent(EVENT_MATCHED, source=source, folder=folder_name,
+                             done=self.done, total=self.total)
+
+    def prepare(self, source, folder_name, route=0):
+        """创建目标文件夹并分配目标路径，返回交给执行器的任务 (源, 目标, 文件夹, 源设备号, 操作模式)"""
+        operation_mode = self.routes[route].operation_mode
+        folder = os.path.join(self._targets[route], folder_name)
+        if folder not in self._created_folders:
+            os.makedirs(folder, exist_ok=True)
+            self._created_folders.add(folder)
+        target = self._unique_target(folder, os.path.basename(source))
+        source_dev = None
+        if self._journal is not None and operation_mode == 'move':
+            source_dev = self._journal.device_of_source(source)
+        return (source, target, folder_name, source_dev, operation_mode)
+
+    def fail(self, source, folder_name, error):
+        """记录处理失败的文件"""
+        self.done += 1
+        self.error_files += 1
+        if self._report is not None:
+            self._report.record(VERIFY_FAILED, source, message=str(error))
+        return OrganizeEvent(EVENT_ERROR, source=source, folder=folder_name,
+                             message=str(error), done=self.done, total=self.total)
+
+    def complete(self, task, error=None, size=0, digest=None):
+        """任务完成后更新计数、撤销日志和校验报告，返回结果事件"""
+        source, target, folder_name, source_dev, operation_mode = task
+        # 目标已写入（或已放弃），之后由 os.path.exists 判断冲突，预留集合只保存进行中的任务
+        self._reserved.discard(target)
+        if error is not None:
+            return self.fail(source, folder_name, error)
+        if self._journal is not None and operation_mode == 'move':
+            self._journal.record(source, target, source_dev)
+        if digest is not None:
+            self.verified_files += 1
+        if self._report is not None:
+            self._report.record(VERIFY_OK if digest is not None else VERIFY_RENAMED, source, target, size, digest)
+        self.done += 1
+        self.processed_files += 1
+        self.bytes_done += size
+        return OrganizeEvent(EVENT_COPIED, source=source, target=target, folder=folder_name,
+                             done=self.done, total=self.total, bytes=size)
+
+    def progress_event(self, force=False):
+        """按时间间隔节流的进度事件（附带最近的处理速度），未到间隔时返回 None"""
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_interval:
+            return None
+        self._last_progress = now
+        self.flush_journal()
+        ops_rate, bytes_rate = self._rate.update(self.processed_files, self.bytes_done)
+        return OrganizeEvent(EVENT_PROGRESS, done=self.done, total=self.total, bytes=self.bytes_done,
+                             ops_rate=ops_rate, bytes_rate=bytes_rate)
+
+    def flush_journal(self):
+        """把缓冲的撤销日志记录写入文件，在等待文件操作完成前调用"""
+        if self._journal is not None:
+            self._journal.flush()
+
+    def finished_event(self):
+        """结束事件"""
+        return OrganizeEvent(EVENT_FINISHED, done=self.done, total=self.total)
+
+    def end(self):
+        """结束整理，关闭撤销日志和校验报告"""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._report is not None:
+            self._report.close()
+            self._report = None
+
+    def run(self, source_dir, target_dir=None):
+        """执行整理，逐个产出事件"""
+        files = self.begin(source_dir, target_dir)
+        yield self.start_event(source_dir)
+        if self.total == 0:
+            yield self.finished_event()
+            return
+
+        shared_executor = not isinstance(self.executor_kind, str)
+        if shared_executor:
+            executor = self.executor_kind
+        else:
+            initializer = lower_thread_priority if self.low_priority else None
+            executor = create_executor(self.executor_kind, self.max_workers, initializer)
+        window = 1 if self.executor_kind == EXECUTOR_SEQUENTIAL else self.max_workers * 4
+        # 非扫描顺序时，先攒一批任务按 inode/物理位置排序再提交
+        batch_size = 1 if self.order == ORDER_SCAN else self.order_batch
+        batch = []
+        small_files = []
+        pending = {}
+        # 校验和持久化各在独立的线程池中进行，与后续文件的复制并行
+        verifier = ThreadPoolExecutor(max_workers=self.verify_workers) if self.verify else None
+        syncer = ThreadPoolExecutor(max_workers=1) if self.durable else None
+        verifying = {}
+        syncing = {}
+        sync_items = []
+        # 持久化模式下跨设备移动的源文件在整批目标持久化后才删除，否则校验通过即删除（task[4] 为操作模式）
+        keep_source = lambda task: self.durable and task[4] == 'move'
+        remove_after_verify = lambda task: task[4] == 'move' and not self.durable
+        # 没有名称规则匹配的文件在独立的线程池中识别内容类型
+        sniffer = ThreadPoolExecutor(max_workers=self.sniff_workers) if self.needs_sniffing else None
+        sniffing = {}
+        # 同时匹配复制路由和移动路由的文件，复制全部完成后再移动 [(序号, 源文件, (路由序号, 文件夹))]
+        deferred = []
+
+        def wait_first(futures):
+            # 阻塞前写出撤销日志，等待期间崩溃不会丢失已完成的移动
+            self.flush_journal()
+            return wait(futures, return_when=FIRST_COMPLETED)[0]
+
+        def wait_any():
+            yield from collect(wait_first(list(pending) + list(verifying) + list(syncing)))
+
+        def flush_sync():
+            items = list(sync_items)
+            sync_items.clear()
+            future = syncer.submit(sync_batch, [item[0][1] for item in items],
+                                   [item[0][0] if item[3] else None for item in items])
+            syncing[future] = items
+
+        def settle(task, size, digest=None, copied=False):
+            """文件已写到目标位置：持久化模式下加入当前批次，否则直接完成"""
+            if not self.durable:
+                yield self.complete(task, size=size, digest=digest)
+                return
+            sync_items.append((task, size, digest, copied and keep_source(task)))
+            if len(sync_items) >= self.durable_batch:
+                flush_sync()
+
+        def collect(futures):
+            for future in futures:
+                if future in syncing:
+                    items = syncing.pop(future)
+                    try:
+                        errors = future.result()
+                    except Exception as e:
+                        errors = [e] * len(items)
+                    for (task, size, digest, _), error in zip(items, errors):
+                        if error is not None:
+                            yield self.complete(task, error)
+                        else:
+                            yield self.complete(task, size=size, digest=digest)
+                    continue
+                if future in verifying:
+                    task, size, digest = verifying.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        yield self.complete(task, e)
+                    else:
+                        yield from settle(task, size, digest, copied=True)
+                    continue
+                tasks = pending.pop(future)
+                try:
+                    result = future.result()
+                    # 小文件批量任务返回逐个文件的结果列表：字节数或异常
+                    results = result if isinstance(result, list) else [result]
+                except Exception as e:
+                    results = [e] * len(tasks)
+                for task, result in zip(tasks, results):
+                    if isinstance(result, Exception):
+                        yield self.complete(task, result)
+                    elif isinstance(result, tuple):
+                        size, digest = result
+                        if digest is None:
+                            # 已复制但保留了源文件，等待持久化后删除
+                            yield from settle(task, size, copied=True)
+                        else:
+                            # 复制时计算了摘要：交给校验线程池
+                            # 移动和持久化模式先 fsync 再校验，复制模式的校验可能读取页缓存
+                            future = verifier.submit(verify_copy, task[0], task[1], digest, self.hash_name,
+                                                     remove_after_verify(task), task[4] == 'move' or self.durable)
+                            verifying[future] = (task, size, digest)
+                    else:
+                        yield from settle(task, result)
+
+        def submit(tasks, fn, *args):
+            try:
+                pending[executor.submit(fn, *args)] = tasks
+            except Exception as e:
+                for task in tasks:
+                    yield self.complete(task, e)
+            if len(pending) + len(verifying) + len(syncing) >= window:
+                yield from wait_any()
+
+        def submit_small_files():
+            tasks = list(small_files)
+            small_files.clear()
+            yield from submit(tasks, copy_small_files,
+                              [task[0] for task in tasks], [task[1] for task in tasks],
+                              self.small_file_threshold, READAHEAD_FILES, self.throttle, self.hash_name)
+
+        def submit_batch():
+            for _, task, size in order_batch(batch, self.order):
+                if task[4] == 'copy' and 0 <= size <= self.small_file_threshold:
+                    small_files.append(task)
+                    if len(small_files) >= self.small_file_batch:
+                        yield from submit_small_files()
+                else:
+                    yield from submit([task], transfer_file, task[0], task[1], task[4],
+                                      self.throttle, self.hash_name, keep_source(task))
+            batch.clear()
+
+        def route(index, source, found):
+            if not found:
+                yield self.skip(source)
+                return
+            if len(found) > 1:
+                # 交给多个路由的文件每一份都计入总数
+                self.total += len(found) - 1
+                if self.routes[found[-1][0]].operation_mode == 'move':
+                    # 复制全部完成之后再移动
+                    deferred.append((index, source, found[-1]))
+                    found = found[:-1]
+            for route_index, folder_name in found:
+                yield self.matched(source, folder_name)
+                try:
+                    task = self.prepare(source, folder_name, route_index)
+                    inode = files.inodes[index] if files.inodes is not None else 0
+                    size = files.sizes[index] if files.sizes is not None else -1
+                    batch.append((inode, task, size))
+                except Exception as e:
+                    yield self.fail(source, folder_name, e)
+
+            if len(batch) >= batch_size:
+                yield from submit_batch()
+
+        def finish_submitted():
+            if batch and not self.cancelled:
+                yield from submit_batch()
+            if small_files:
+                yield from submit_small_files()
+            while pending or verifying or syncing or sync_items:
+                if sync_items and not pending and not verifying:
+                    flush_sync()
+                yield from wait_any()
+
+        def collect_sniffed(block):
+            if block:
+                finished = wait_first(list(sniffing))
+            else:
+                finished = [future for future in sniffing if future.done()]
+            for future in finished:
+                index, source, names = sniffing.pop(future)
+                self.sniffed_files += 1
+                yield from route(index, source, self.select_routes(names, future.result()))
+
+        try:
+            for index, source in enumerate(files):
+                if self.cancelled:
+                    break
+
+                if self._metadata_columns:
+                    names = self.classify_names(source, files.directory(index),
+                                                files.sizes[index], files.mtimes[index])
+                else:
+                    names = self.classify_names(source, files.directory(index))
+                if sniffer is not None and self.needs_content(names):
+                    sniffing[sniffer.submit(sniff_file, source)] = (index, source, names)
+                    # 限制同时识别的文件数，超出时等待
+                    yield from collect_sniffed(len(sniffing) >= self.sniff_workers * 4)
+                else:
+                    yield from route(index, source, self.select_routes(names))
+                    if sniffing:
+                        yield from collect_sniffed(False)
+
+                event = self.progress_event()
+                if event is not None:
+                    yield event
+
+            while sniffing and not self.cancelled:
+                yield from collect_sniffed(True)
+            yield from finish_submitted()
+            if deferred and not self.cancelled:
+                for index, source, found in deferred:
+                    yield from route(index, source, [found])
+                yield from finish_submitted()
+        finally:
+            if not shared_executor:
+                executor.shutdown(wait=True)
+            if sniffer is not None:
+                sniffer.shutdown(wait=True)
+            if verifier is not None:
+                verifier.shutdown(wait=True)
+            if syncer is not None:
+                syncer.shutdown(wait=True)
+            self.end()
+
+        yield self.progress_event(force=True)
+        yield self.finished_event()
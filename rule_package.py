@@ -0,0 +1,314 @@
+import re
+import json
+from json.decoder import scanstring
+from datetime import datetime
+from rules import validate_rule, CONDITION_SEPARATOR
+from scan_filter import validate_scan_options
+
+PACKAGE_TYPE = "file_organizer_rules"
+PACKAGE_VERSION = "1.0"
+REQUIRED_FIELDS = ("version", "type", "created_at", "rule_groups")
+
+# 导入方式
+IMPORT_MERGE = "merge"
+IMPORT_REPLACE_GROUPS = "replace-groups"
+IMPORT_REPLACE_ALL = "replace-all"
+IMPORT_MODES = (IMPORT_MERGE, IMPORT_REPLACE_GROUPS, IMPORT_REPLACE_ALL)
+
+READ_CHUNK = 1024 * 1024
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# 一条规则 "关键词": "文件夹" 及其后的逗号或右括号，整条规则在缓冲区中时用一次匹配读完
+_STRING = r'"((?:[^"\\\x00-\x1f]|\\.)*)"'
+_RULE = re.compile(rf"[ \t\n\r]*{_STRING}[ \t\n\r]*:[ \t\n\r]*{_STRING}[ \t\n\r]*([,}}])")
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    """按块读取 JSON 文本的简单词法器，只缓存尚未解析的部分"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self):
+        """再读入一块，丢弃已解析的部分；已到文件末尾时返回 False"""
+        if self.eof:
+            return False
+        data = self.f.read(READ_CHUNK)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """跳过空白，返回下一个字符（不消耗）"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                raise ValueError("规则包格式错误：文件不完整")
+
+    def at_end(self):
+        """之后只剩空白时返回 True"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return False
+            if not self._more():
+                return True
+
+    def expect(self, char, message):
+        if self.peek() != char:
+            raise ValueError(message)
+        self.pos += 1
+
+    def next_item(self, close, message):
+        """对象成员之后：遇到逗号返回 True，遇到结束括号返回 False"""
+        char = self.peek()
+        self.pos += 1
+        if char == ",":
+            return True
+        if char == close:
+            return False
+        raise ValueError(message)
+
+    def string(self, message):
+        """读取一个字符串"""
+        if self.peek() != '"':
+            raise ValueError(message)
+        while True:
+            try:
+                value, end = scanstring(self.buffer, self.pos + 1)
+            except json.JSONDecodeError:
+                # 字符串跨越了块边界
+                if self._more():
+                    continue
+                raise
+            self.pos = end
+            return value
+
+    def value(self):
+        """读取任意一个 JSON 值（用于规则以外的小字段）"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._more():
+                    continue
+                raise
+            # 数字可能被块边界截断
+            if end == len(self.buffer) and self._more():
+                continue
+            self.pos = end
+            return value
+
+
+class RulePackage:
+    """读取并校验后的规则包"""
+
+    def __init__(self, fields, rule_groups, rule_count):
+        self.version = fields["version"]
+        self.created_at = fields["created_at"]
+        self.rule_groups = rule_groups
+        self.group_options = fields.get("group_options", {})
+        self.rule_count = rule_count
+
+
+def read_rule_package(path):
+    """流式读取规则包，边读边校验每条规则，格式错误时抛出 ValueError
+
+    规则直接加入结果字典，不会先把整个文件解析成一份完整的中间对象。
+    """
+    fields = {}
+    rule_groups = {}
+    rule_count = 0
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            stream = _JsonStream(f)
+            stream.expect("{", "规则包格式错误：不是有效的JSON对象")
+            if stream.peek() == "}":
+                stream.pos += 1
+            else:
+                while True:
+                    key = stream.string("规则包格式错误：不是有效的JSON对象")
+                    stream.expect(":", "规则包格式错误：不是有效的JSON对象")
+                    if key == "rule_groups":
+                        rule_count = _read_rule_groups(stream, rule_groups)
+                        fields[key] = True
+                    else:
+                        fields[key] = stream.value()
+                        if key == "type" and fields[key] != PACKAGE_TYPE:
+                            raise ValueError("规则包格式错误：不是有效的文件整理助手规则包")
+                    if not stream.next_item("}", "规则包格式错误：不是有效的JSON对象"):
+                        break
+            if not stream.at_end():
+                raise ValueError("规则包格式错误：不是有效的JSON文件")
+    except json.JSONDecodeError:
+        raise ValueError("规则包格式错误：不是有效的JSON文件")
+    except UnicodeDecodeError:
+        raise ValueError("规则包格式错误：文件不是 UTF-8 编码")
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in fields]
+    if missing_fields:
+        raise ValueError(f"规则包格式错误：缺少必需字段 {', '.join(missing_fields)}")
+    if fields["type"] != PACKAGE_TYPE:
+        raise ValueError("规则包格式错误：不是有效的文件整理助手规则包")
+
+    # 扫描设置是可选字段
+    group_options = fields.get("group_options", {})
+    if not isinstance(group_options, dict) or not all(
+            isinstance(options, dict) for options in group_options.values()):
+        raise ValueError("规则包格式错误：group_options字段不是有效的扫描设置对象")
+    for group_name, options in group_options.items():
+        try:
+            validate_scan_options(options)
+        except ValueError as e:
+            raise ValueError(f"规则包格式错误：规则组 '{group_name}' 的扫描设置无效（{e}）")
+    return RulePackage(fields, rule_groups, rule_count)
+
+
+def _unescape(text):
+    """还原 JSON 字符串中的转义字符"""
+    return scanstring(text + '"', 0)[0] if "\\" in text else text
+
+
+def _read_rule_groups(stream, rule_groups):
+    """读取 rule_groups 对象并校验每条规则，返回规则数"""
+    count = 0
+    stream.expect("{", "规则包格式错误：rule_groups字段不是有效的规则组对象")
+    if stream.peek() == "}":
+        stream.pos += 1
+        return count
+    while True:
+        group_name = stream.string("规则包格式错误：规则组数据格式不正确")
+        stream.expect(":", "规则包格式错误：规则组数据格式不正确")
+        stream.expect("{", "规则包格式错误：规则组数据格式不正确")
+        rules = rule_groups.setdefault(group_name, {})
+        if stream.peek() == "}":
+            stream.pos += 1
+        else:
+            while True:
+                found = _RULE.match(stream.buffer, stream.pos)
+                if found is not None:
+                    keyword, folder, close = found.groups()
+                    keyword = _unescape(keyword)
+                    folder = _unescape(folder)
+                    stream.pos = found.end()
+                    more = close == ","
+                else:
+                    # 规则跨越了块边界或格式有误，逐个词法单元读取
+                    keyword = stream.string("规则包格式错误：规则数据格式不正确")
+                    stream.expect(":", "规则包格式错误：规则数据格式不正确")
+                    folder = stream.string("规则包格式错误：规则数据格式不正确")
+                    more = stream.next_item("}", "规则包格式错误：规则数据格式不正确")
+                if not keyword or not folder:
+                    raise ValueError("规则包格式错误：规则数据不能为空")
+                # 不含类型前缀和条件的普通关键词只要非空即有效
+                if ":" in keyword or CONDITION_SEPARATOR in keyword:
+                    try:
+                        validate_rule(keyword)
+                    except ValueError as e:
+                        raise ValueError(f"规则包格式错误：规则 '{keyword}' 无效（{str(e)}）")
+                rules[keyword] = folder
+                count += 1
+                if not more:
+                    break
+        if not stream.next_item("}", "规则包格式错误：规则组数据格式不正确"):
+            return count
+
+
+class ImportDiff:
+    """导入规则包会带来的变化"""
+
+    def __init__(self):
+        self.new_groups = []
+        self.replaced_groups = []
+        self.merged_groups = []
+        self.removed_groups = []
+        self.added_rules = 0
+        self.changed_rules = 0
+        self.removed_rules = 0
+        self.unchanged_rules = 0
+
+    @property
+    def changed_groups(self):
+        """有变化的规则组（传给规则存储，只重写这些规则组）"""
+        return self.new_groups + self.replaced_groups + self.merged_groups + self.removed_groups
+
+    def summary(self):
+        lines = [f"新增规则组 {len(self.new_groups)} 个，覆盖 {len(self.replaced_groups)} 个，"
+                 f"合并 {len(self.merged_groups)} 个，删除 {len(self.removed_groups)} 个",
+                 f"新增规则 {self.added_rules} 条，修改 {self.changed_rules} 条，"
+                 f"删除 {self.removed_rules} 条，不变 {self.unchanged_rules} 条"]
+        return "\n".join(lines)
+
+
+def diff_rule_package(package, rule_groups, mode=IMPORT_MERGE):
+    """计算按 mode 导入规则包时对现有规则组的变化，不修改任何数据"""
+    diff = ImportDiff()
+    for group_name, rules in package.rule_groups.items():
+        current = rule_groups.get(group_name)
+        if current is None:
+            diff.new_groups.append(group_name)
+            diff.added_rules += len(rules)
+            continue
+        added = changed = unchanged = 0
+        for keyword, folder in rules.items():
+            existing = current.get(keyword)
+            if existing is None:
+                added += 1
+            elif existing != folder:
+                changed += 1
+            else:
+                unchanged += 1
+        removed = 0
+        if mode != IMPORT_MERGE:
+            removed = len(current) - changed - unchanged
+        # 覆盖时规则的顺序也会改变，只要内容不同就算作覆盖
+        if added or changed or removed or (mode != IMPORT_MERGE and list(current) != list(rules)):
+            (diff.merged_groups if mode == IMPORT_MERGE else diff.replaced_groups).append(group_name)
+        diff.added_rules += added
+        diff.changed_rules += changed
+        diff.removed_rules += removed
+        diff.unchanged_rules += unchanged
+    if mode == IMPORT_REPLACE_ALL:
+        for group_name, rules in rule_groups.items():
+            if group_name not in package.rule_groups:
+                diff.removed_groups.append(group_name)
+                diff.removed_rules += len(rules)
+    return diff
+
+
+def apply_rule_package(package, rule_groups, group_options, mode=IMPORT_MERGE):
+    """按 mode 把规则包并入 rule_groups 和 group_options（原地修改），返回 ImportDiff"""
+    diff = diff_rule_package(package, rule_groups, mode)
+    if mode == IMPORT_REPLACE_ALL:
+        for group_name in diff.removed_groups:
+            del rule_groups[group_name]
+            group_options.pop(group_name, None)
+    for group_name, rules in package.rule_groups.items():
+        if mode == IMPORT_MERGE and group_name in rule_groups:
+            rule_groups[group_name].update(rules)
+        else:
+            rule_groups[group_name] = rules
+    for group_name, options in package.group_options.items():
+        if group_name in package.rule_groups:
+            group_options[group_name] = options
+    return diff
+
+
+def build_rule_package(rule_groups, group_options):
+    """生成导出用的规则包数据"""
+    return {
+        "version": PACKAGE_VERSION,
+        "type": PACKAGE_TYPE,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "rule_groups": rule_groups,
+        "group_options": group_options
+    }
@@ -0,0 +1,283 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_GROUP = "默认规则组"
+RULES_FILE = "file_rules.json"
+RULES_DB = "file_rules.db"
+
+# 存储后端
+STORE_JSON = "json"
+STORE_SQLITE = "sqlite"
+STORES = (STORE_JSON, STORE_SQLITE)
+
+# 规则总数不超过该值时 JSON 保持缩进，便于手工查看和编辑
+INDENT_RULE_LIMIT = 2000
+
+
+# SQLite 报告数据库文件本身损坏的错误信息，其他错误（如被锁定、无法打开）不认为是损坏
+_CORRUPT_MESSAGES = ("file is not a database", "database disk image is malformed")
+
+
+class RuleStoreError(Exception):
+    """规则文件损坏、无法读取（已改名保留，不会被覆盖）"""
+
+
+class RuleStoreUnavailable(RuleStoreError):
+    """规则文件暂时无法读取（被其他程序锁定、无法打开或 I/O 错误），文件保持原样"""
+
+
+def default_state():
+    """空的规则状态 (规则组, 当前规则组, 扫描设置)"""
+    return {DEFAULT_GROUP: {}}, DEFAULT_GROUP, {}
+
+
+def _set_aside(path, error):
+    """把损坏的规则文件改名保留并返回要抛出的异常，改名失败时文件保持原样"""
+    corrupt = path.with_name(f"{path.name}.corrupt_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    try:
+        os.replace(path, corrupt)
+    except OSError as e:
+        return RuleStoreUnavailable(f"规则文件损坏（{error}），且无法改名保留（{e}）")
+    return RuleStoreError(f"规则文件损坏（{error}），已另存为 {corrupt.name}")
+
+
+def _is_corrupt(error):
+    """SQLite 错误是否表示数据库文件已损坏"""
+    message = str(error).lower()
+    return any(text in message for text in _CORRUPT_MESSAGES)
+
+
+class JsonRuleStore:
+    """规则保存在一个 JSON 文件中，先写临时文件并 fsync，再原子替换，写到一半崩溃也不会损坏原文件"""
+
+    backend = STORE_JSON
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def exists(self):
+        return self.path.exists()
+
+    def load(self):
+        """读取规则，返回 (规则组, 当前规则组, 扫描设置)
+
+        文件损坏时改名保留并抛出 RuleStoreError，无法打开或读取时抛出 RuleStoreUnavailable。
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("规则文件格式错误")
+        except OSError as e:
+            raise RuleStoreUnavailable(f"无法读取规则文件（{e}）")
+        except (json.JSONDecodeError, UnicodeDecodeError, ValueError) as e:
+            raise _set_aside(self.path, e)
+        return (data.get("rule_groups") or {DEFAULT_GROUP: {}},
+                data.get("current_group", DEFAULT_GROUP),
+                data.get("group_options", {}))
+
+    def save(self, rule_groups, current_group, group_options, changed_groups=None):
+        """写入全部规则（JSON 只能整体重写，changed_groups 不使用）"""
+        data = {
+            "rule_groups": rule_groups,
+            "current_group": current_group,
+            "group_options": group_options
+        }
+        small = sum(len(rules) for rules in rule_groups.values()) <= INDENT_RULE_LIMIT
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4 if small else None,
+                      separators=None if small else (",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+
+class SqliteRuleStore:
+    """规则保存在 SQLite 数据库中，保存时只重写有变化的规则组，适合很大的规则集
+
+    每次保存是一个事务，中途崩溃时数据库回滚到上一次保存的状态。
+    """
+
+    backend = STORE_SQLITE
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def exists(self):
+        return self.path.exists()
+
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path))
+        connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS groups (name TEXT PRIMARY KEY, position INTEGER, options TEXT);
+            CREATE TABLE IF NOT EXISTS rules (group_name TEXT, position INTEGER, keyword TEXT, folder TEXT,
+                                              PRIMARY KEY (group_name, position));
+        """)
+        return connection
+
+    def load(self):
+        """读取规则，返回 (规则组, 当前规则组, 扫描设置)
+
+        只有数据库文件本身损坏（不是数据库、映像损坏或完整性检查失败）时才改名保留并抛出 RuleStoreError；
+        被其他连接锁定、无法打开或 I/O 错误时抛出 RuleStoreUnavailable，文件保持原样。
+        """
+        try:
+            connection = self._connect()
+            try:
+                rule_groups = {}
+                group_options = {}
+                for name, options in connection.execute("SELECT name, options FROM groups ORDER BY position"):
+                    rule_groups[name] = {}
+                    if options:
+                        group_options[name] = json.loads(options)
+                for group_name, keyword, folder in connection.execute(
+                        "SELECT group_name, keyword, folder FROM rules ORDER BY group_name, position"):
+                    rule_groups.setdefault(group_name, {})[keyword] = folder
+                row = connection.execute("SELECT value FROM meta WHERE key = 'current_group'").fetchone()
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError as e:
+            if _is_corrupt(e) or (not isinstance(e, sqlite3.OperationalError) and self._check_failed()):
+                raise _set_aside(self.path, e)
+            raise RuleStoreUnavailable(f"无法读取规则数据库（{e}）")
+        except ValueError as e:
+            # 扫描设置不是有效的 JSON
+            raise _set_aside(self.path, e)
+        return rule_groups or {DEFAULT_GROUP: {}}, row[0] if row else DEFAULT_GROUP, group_options
+
+    def _check_failed(self):
+        """用 PRAGMA integrity_check 确认数据库是否损坏，检查本身因锁定等原因无法进行时返回 False"""
+        try:
+            connection = sqlite3.connect(str(self.path))
+            try:
+                return connection.execute("PRAGMA integrity_check").fetchone()[0] != "ok"
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError as e:
+            return _is_corrupt(e)
+
+    def save(self, rule_groups, current_group, group_options, changed_groups=None):
+        """在一个事务中写入规则，changed_groups 为 None 时重写全部规则组"""
+        connection = self._connect()
+        try:
+            with connection:
+                stored = {name for name, in connection.execute("SELECT name FROM groups")}
+                removed = stored - set(rule_groups)
+                if changed_groups is None:
+                    rewrite = set(rule_groups) | removed
+                else:
+                    rewrite = (set(changed_groups) | (set(rule_groups) - stored) | removed)
+                connection.execute("DELETE FROM groups")
+                connection.executemany(
+                    "INSERT INTO groups (name, position, options) VALUES (?, ?, ?)",
+                    [(name, position, json.dumps(group_options[name], ensure_ascii=False)
+                      if name in group_options else None)
+                     for position, name in enumerate(rule_groups)])
+                for name in rewrite:
+                    connection.execute("DELETE FROM rules WHERE group_name = ?", (name,))
+                    if name in rule_groups:
+                        connection.executemany(
+                            "INSERT INTO rules (group_name, position, keyword, folder) VALUES (?, ?, ?, ?)",
+                            [(name, position, keyword, folder)
+                             for position, (keyword, folder) in enumerate(rule_groups[name].items())])
+                connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('current_group', ?)",
+                                   (current_group,))
+        finally:
+            connection.close()
+
+
+class RuleStore:
+    """命令行和图形界面共用的规则存储
+
+    resources 目录中有 file_rules.db 时使用 SQLite，否则使用 file_rules.json。
+    mark_dirty() 只记录哪些规则组有变化，flush() 时才一次写入，调用方可以把多次修改合并为一次保存；
+    save() 立即写入。
+    """
+
+    def __init__(self, resources_dir):
+        resources_dir = Path(resources_dir)
+        database = SqliteRuleStore(resources_dir / RULES_DB)
+        self.backend = database if database.exists() else JsonRuleStore(resources_dir / RULES_FILE)
+        self.resources_dir = resources_dir
+        self.loaded = False
+        self._unavailable = None
+        self._dirty = False
+        self._changed = set()
+
+    @property
+    def path(self):
+        return self.backend.path
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def exists(self):
+        return self.backend.exists()
+
+    def load(self):
+        """读取规则，文件不存在时返回空的默认状态"""
+        self._dirty = False
+        self._changed = set()
+        if not self.backend.exists():
+            state = default_state()
+        else:
+            try:
+                state = self.backend.load()
+            except RuleStoreUnavailable as e:
+                self._unavailable = str(e)
+                raise
+        self.loaded = True
+        self._unavailable = None
+        return state
+
+    def _check_writable(self):
+        """从未成功读取过规则文件（文件暂时无法读取）时拒绝写入，避免用空的规则覆盖已保存的规则"""
+        if self._unavailable is not None and not self.loaded:
+            raise RuleStoreUnavailable(f"{self._unavailable}，为避免覆盖已保存的规则，暂不保存")
+
+    def mark_dirty(self, changed_groups=None):
+        """记录有变化的规则组，None 表示可能全部变化，空列表表示只有当前规则组或扫描设置变化"""
+        if changed_groups is None:
+            self._changed = None
+        elif self._changed is not None:
+            self._changed.update(changed_groups)
+        self._dirty = True
+
+    def flush(self, rule_groups, current_group, group_options):
+        """写入 mark_dirty() 之后的修改，没有修改时不写，返回是否写入"""
+        if not self._dirty:
+            return False
+        self._check_writable()
+        self.backend.save(rule_groups, current_group, group_options, self._changed)
+        self._dirty = False
+        self._changed = set()
+        return True
+
+    def save(self, rule_groups, current_group, group_options, changed_groups=None):
+        """立即写入"""
+        self.mark_dirty(changed_groups)
+        self.flush(rule_groups, current_group, group_options)
+
+    def convert(self, backend, rule_groups, current_group, group_options):
+        """切换存储后端并写入全部规则，旧的存储文件改名为 .old 保留"""
+        if backend == self.backend.backend:
+            return
+        self._check_writable()
+        old = self.backend
+        if backend == STORE_SQLITE:
+            self.backend = SqliteRuleStore(self.resources_dir / RULES_DB)
+        else:
+            self.backend = JsonRuleStore(self.resources_dir / RULES_FILE)
+        self.backend.save(rule_groups, current_group, group_options)
+        if old.exists():
+            os.replace(old.path, old.path.with_name(old.path.name + ".old"))
+        self._dirty = False
+        self._changed = set()
@@ -0,0 +1,510 @@
+import os
+import re
+import time
+import fnmatch
+import operator
+from sniff import normalize_type, CONTENT_TYPES
+
+# 规则类型前缀：规则仍保存为规则组中的 {关键词: 文件夹}，前缀写在关键词里，兼容原有的规则文件和规则包
+RULE_DIR = "dir:"
+RULE_GLOB = "glob:"
+RULE_REGEX = "re:"
+RULE_SIZE = "size:"
+RULE_AGE = "age:"
+RULE_TYPE = "type:"
+RULE_PREFIXES = (RULE_DIR, RULE_GLOB, RULE_REGEX, RULE_SIZE, RULE_AGE, RULE_TYPE)
+# 元数据条件用 " & " 接在名称规则后面，如 ".mp4 & size:>1GB"
+CONDITION_SEPARATOR = " & "
+
+_COMPARISONS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+_CONDITION = re.compile(r"^(>=|<=|>|<)\s*(\d+(?:\.\d+)?)\s*([a-z]*)$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3, "tb": 1024 ** 4}
+_AGE_UNITS = {"s": 1, "h": 3600, "": 86400, "d": 86400, "w": 7 * 86400, "y": 365 * 86400}
+
+# 普通关键词达到该数量时按关键词中的片段建立索引，每个文件只比较片段在文件名中出现的关键词
+KEYWORD_INDEX_MIN = 16
+# 索引片段的长度，更短的关键词每个文件都要比较
+KEYWORD_GRAM = 4
+
+# glob/re 规则按开头或结尾的固定文本建立索引时使用的最大长度
+PATTERN_KEY_LENGTH = 8
+
+# 正则开头的全局标志，如 (?i)、(?x)
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+# 忽略大小写时与 ASCII 字母匹配的非 ASCII 字符（re 使用简单小写映射，str.lower() 不同）
+_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+# 正则中的特殊字符，其余字符（含转义的标点）是固定文本
+_REGEX_SPECIAL = frozenset(".^$*+?{}[]()|\\")
+_QUANTIFIERS = frozenset("*+?{")
+
+
+def split_rule(keyword):
+    """拆分规则关键词，返回 (类型前缀, 内容)，普通关键词的类型前缀为空字符串"""
+    lowered = keyword.lower()
+    for prefix in RULE_PREFIXES:
+        if lowered.startswith(prefix):
+            return prefix, keyword[len(prefix):].strip()
+    return "", keyword
+
+
+def split_conditions(keyword):
+    """拆出规则中的元数据条件，返回 (名称规则, [条件文本])，只有条件的规则名称部分为空字符串"""
+    name_parts = []
+    conditions = []
+    for part in keyword.split(CONDITION_SEPARATOR):
+        if part.strip().lower().startswith((RULE_SIZE, RULE_AGE)):
+            conditions.append(part.strip())
+        else:
+            name_parts.append(part)
+    return CONDITION_SEPARATOR.join(name_parts).strip() if conditions else keyword, conditions
+
+
+def parse_condition(condition):
+    """把 size:/age: 条件解析为 (属性, 比较函数, 阈值)，阈值为字节数或秒数
+
+    大小单位为 B/KB/MB/GB/TB（默认字节），时间单位为 s/h/d/w/y（默认天）。
+    """
+    prefix, value = split_rule(condition)
+    found = _CONDITION.match(value)
+    units = _SIZE_UNITS if prefix == RULE_SIZE else _AGE_UNITS
+    if found is None or found.group(3).lower() not in units:
+        example = "size:>1GB" if prefix == RULE_SIZE else "age:>365d"
+        raise ValueError(f"条件格式错误: {condition}（示例: {example}）")
+    threshold = float(found.group(2)) * units[found.group(3).lower()]
+    return prefix[:-1], _COMPARISONS[found.group(1)], threshold
+
+
+def _segment_patterns(value):
+    """把 dir: 规则的内容编译为逐段的通配符"""
+    segments = [segment for segment in value.replace("\\", "/").split("/") if segment]
+    if not segments:
+        raise ValueError("目录规则不能为空")
+    return [re.compile(fnmatch.translate(segment), re.IGNORECASE) for segment in segments]
+
+
+def _split_flags(value):
+    """拆出正则开头的全局标志，返回 (标志字母, 其余部分)"""
+    flags = ""
+    found = _GLOBAL_FLAGS.match(value)
+    while found is not None:
+        flags += found.group(1)
+        value = value[found.end():]
+        found = _GLOBAL_FLAGS.match(value)
+    return flags, value
+
+
+def _name_pattern(prefix, value):
+    """把 glob:/re: 规则转换为从文件名开头匹配的正则表达式文本
+
+    通配符需要匹配整个文件名；正则表达式在文件名任意位置出现即可（与 re.search 相同）。
+    正则开头的全局标志（如 (?i)）移到整个表达式的开头。
+    """
+    if prefix == RULE_GLOB:
+        return fnmatch.translate(value)
+    flags, body = _split_flags(value)
+    if "x" in flags:
+        # 详细模式中 # 注释到行尾，换行避免注释吞掉后面的括号
+        body += "\n"
+    flags = f"(?{flags})" if flags else ""
+    if body.startswith("^") and "|" not in body and "m" not in flags:
+        # 只能在开头匹配，不需要逐个位置尝试
+        return f"{flags}(?:{body})"
+    return f"{flags}(?s:.*?)(?:{body})"
+
+
+def _compile_name_pattern(prefix, value):
+    """编译 glob:/re: 规则（与匹配时完全相同），无效时抛出 ValueError"""
+    try:
+        if prefix == RULE_REGEX:
+            # 先单独编译规则本身，使错误信息中的位置对应规则内容
+            re.compile(value, re.IGNORECASE)
+        return re.compile(_name_pattern(prefix, value), re.IGNORECASE)
+    except (re.error, ValueError) as e:
+        raise ValueError(f"正则表达式错误: {e}")
+
+
+def _regex_tokens(body):
+    """把正则粗略地切分为记号：固定字符为该字符，开头/结尾锚点为 "\\A"/"\\Z"，其余为 None
+
+    只用于找出固定文本，不确定的部分一律记为 None（只会使找到的固定文本变短）。
+    """
+    tokens = []
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char == "\\":
+            escaped = body[i + 1:i + 2]
+            i += 2
+            if escaped and not escaped.isalnum():
+                tokens.append(escaped)
+                continue
+            if escaped in ("A", "Z"):
+                tokens.append("\\" + escaped)
+                continue
+            # \d、\x41、\N{...}、反向引用等：连同后面的字母数字一起跳过
+            if body[i:i + 1] == "{":
+                i = body.find("}", i) + 1 or len(body)
+            while i < len(body) and body[i].isalnum():
+                i += 1
+            tokens.append(None)
+        elif char == "[":
+            i += 1
+            if body[i:i + 1] == "^":
+                i += 1
+            if body[i:i + 1] == "]":
+                i += 1
+            while i < len(body) and body[i] != "]":
+                i += 2 if body[i] == "\\" else 1
+            i += 1
+            tokens.append(None)
+        else:
+            i += 1
+            if char in "^$":
+                tokens.append("\\A" if char == "^" else "\\Z")
+            elif char in _QUANTIFIERS:
+                # 量词使前面的字符可有可无
+                if tokens and tokens[-1] is not None and len(tokens[-1]) == 1:
+                    tokens[-1] = None
+                tokens.append(None)
+            else:
+                tokens.append(None if char in _REGEX_SPECIAL else char)
+    return tokens
+
+
+def _pattern_literals(prefix, value):
+    """返回 glob:/re: 规则匹配的文件名必须以之开头和结尾的固定文本 (前缀, 后缀)，没有时为空字符串
+
+    只保留 ASCII 部分并转为小写，与 _FOLD 处理过的小写文件名比较。
+    """
+    if prefix == RULE_GLOB:
+        head = re.split(r"[*?\[]", value, 1)[0]
+        tail = re.split(r"[*?\]]", value)[-1]
+    else:
+        flags, body = _split_flags(value)
+        head = tail = ""
+        if "|" not in body and not set(flags) & set("mx"):
+            tokens = _regex_tokens(body)
+            if tokens[:1] == ["\\A"]:
+                for token in tokens[1:]:
+                    if token is None or len(token) > 1:
+                        break
+                    head += token
+            if tokens[-1:] == ["\\Z"]:
+                for token in reversed(tokens[:-1]):
+                    if token is None or len(token) > 1:
+                        break
+                    tail = token + tail
+    head = re.match(r"[\x00-\x7f]*", head).group().lower()
+    tail = re.search(r"[\x00-\x7f]*\Z", tail).group().lower()
+    return head, tail
+
+
+def validate_rule(keyword):
+    """检查规则关键词是否有效，无效时抛出 ValueError"""
+    keyword, conditions = split_conditions(keyword)
+    for condition in conditions:
+        parse_condition(condition)
+    if conditions and not keyword:
+        return
+    prefix, value = split_rule(keyword)
+    if prefix in (RULE_SIZE, RULE_AGE):
+        raise ValueError(f"条件格式错误: {keyword}")
+    if not value:
+        raise ValueError("关键词不能为空")
+    if prefix == RULE_TYPE:
+        if conditions:
+            raise ValueError("内容类型规则不能附加条件")
+        if normalize_type(value) is None:
+            raise ValueError(f"未知的文件类型: {value}（可用: {', '.join(CONTENT_TYPES)}）")
+    if prefix == RULE_DIR:
+        _segment_patterns(value)
+    elif prefix in (RULE_GLOB, RULE_REGEX):
+        _compile_name_pattern(prefix, value)
+
+
+def default_folder(keyword):
+    """未指定文件夹时使用的文件夹名称（去掉类型前缀、通配符和路径中不能使用的字符）"""
+    name, conditions = split_conditions(keyword)
+    _, value = split_rule(name or conditions[0])
+    name = re.sub(r'[/\\]+', '_', re.sub(r'[*?\[\]:<>|"]', '', value.strip()))
+    name = re.sub(r'_+', '_', name).strip('_ ')
+    return name or keyword.strip()
+
+
+def name_test(keyword):
+    """把规则的名称部分编译为 (类型前缀, 匹配对象)，没有名称部分时返回 None
+
+    普通关键词为小写字符串（文件名包含即匹配），dir: 为各段目录的模式列表，glob:/re: 为编译好的正则表达式。
+    """
+    if not keyword:
+        return None
+    prefix, value = split_rule(keyword)
+    if prefix == RULE_TYPE:
+        raise ValueError("内容类型规则不能附加条件")
+    if prefix == RULE_DIR:
+        return prefix, _segment_patterns(value)
+    if prefix in (RULE_GLOB, RULE_REGEX):
+        if not value:
+            raise ValueError("关键词不能为空")
+        return prefix, _compile_name_pattern(prefix, value)
+    return prefix, keyword.lower()
+
+
+class RuleMatcher:
+    """规则匹配器，按规则顺序取第一个匹配的规则
+
+    普通关键词：文件名包含关键词即匹配（扩展名如 .pdf 也是文件名的一部分）；
+    dir:片段：文件所在目录（相对源目录）中有一段匹配即可，支持通配符，多段用 / 连接表示连续的目录，
+    如 dir:invoices、dir:clients/*/invoices；
+    glob:通配符：匹配整个文件名，如 glob:IMG_????.jpg；
+    re:正则：文件名中能找到匹配即可，如 re:^scan_\d+。
+    都不区分大小写。目录规则对每个目录只计算一次，同一目录下的文件直接复用结果；
+    glob/re 规则按文件名必须具有的固定开头或结尾（如 glob:*.jpg 的 .jpg、re:^scan_ 的 scan_）建立索引，
+    每个文件只用开头和结尾查出候选规则再逐条匹配；找不到固定文本的规则（如 re:\d{4}）对每个文件都要匹配。
+
+    size:>1GB、age:>365d 是按文件大小和修改时间匹配的条件，可以单独使用，
+    也可以用 " & " 接在上述任一种规则后面（如 .mp4 & size:>1GB）。带条件的规则按代价分两步计算：
+    先用上面的名称规则找出第一条匹配的普通规则，只有排在它前面、且名称部分也匹配的带条件规则
+    才需要文件的大小和修改时间；match() 的 metadata 参数是取得 (大小, 修改时间纳秒) 的函数，
+    每个文件最多调用一次，通常只是读取扫描时已有的数据，或对少数文件补一次 stat。
+
+    type:类型（如 type:pdf、type:jpeg）按文件开头的魔数匹配，见 sniff.CONTENT_TYPES。
+    读取文件内容代价最高，因此只有其他规则都不匹配的文件才识别类型，由调用方（引擎在独立的线程池中）
+    调用 sniff.sniff_file 后交给 match_type()，match() 本身不会读取文件。
+    """
+
+    def __init__(self, rules, root=None):
+        self.keywords = []
+        self.dir_rules = []
+        self.conditional = []
+        self.type_rules = []
+        # glob/re 规则的索引：{固定文本长度: {小写固定文本: [(序号, 正则, 文件夹)]}}
+        prefix_index = {}
+        suffix_index = {}
+        self._unindexed = []
+        self.pattern_count = 0
+        for index, (keyword, folder_name) in enumerate(rules.items()):
+            keyword, conditions = split_conditions(keyword)
+            if conditions:
+                self.conditional.append((index, name_test(keyword),
+                                         [parse_condition(condition) for condition in conditions], folder_name))
+                continue
+            prefix, value = split_rule(keyword)
+            if prefix == RULE_TYPE:
+                validate_rule(keyword)
+                self.type_rules.append((normalize_type(value), folder_name))
+            elif prefix == RULE_DIR:
+                self.dir_rules.append((index, _segment_patterns(value), folder_name))
+            elif prefix in (RULE_GLOB, RULE_REGEX):
+                validate_rule(keyword)
+                rule = (index, _compile_name_pattern(prefix, value), folder_name)
+                head, tail = _pattern_literals(prefix, value)
+                self.pattern_count += 1
+                if tail and len(tail) >= len(head):
+                    key = tail[-PATTERN_KEY_LENGTH:]
+                    suffix_index.setdefault(len(key), {}).setdefault(key, []).append(rule)
+                elif head:
+                    key = head[:PATTERN_KEY_LENGTH]
+                    prefix_index.setdefault(len(key), {}).setdefault(key, []).append(rule)
+                else:
+                    self._unindexed.append(rule)
+            else:
+                self.keywords.append((index, keyword.lower(), folder_name))
+        self.rule_count = len(rules)
+        self._prefix_index = sorted(prefix_index.items())
+        self._suffix_index = sorted(suffix_index.items())
+        self._keyword_index = None
+        self._short_keywords = self.keywords
+        if len(self.keywords) >= KEYWORD_INDEX_MIN:
+            self._index_keywords()
+        self.root = root
+        self.now = time.time()
+        self._dir_cache = {}
+        self._segments_cache = {}
+
+    @property
+    def needs_metadata(self):
+        """是否有需要文件大小或修改时间的规则"""
+        return bool(self.conditional)
+
+    @property
+    def needs_sniffing(self):
+        """是否有需要识别文件内容类型的规则"""
+        return bool(self.type_rules)
+
+    def match_type(self, kind):
+        """返回第一条匹配内容类型 kind 的规则的文件夹，未匹配返回 None"""
+        if kind is not None:
+            for rule_kind, folder_name in self.type_rules:
+                if rule_kind == kind:
+                    return folder_name
+        return None
+
+    def set_root(self, root):
+        """设置计算相对目录时使用的源目录，同时以当前时间作为计算文件年龄的基准"""
+        self.root = root
+        self.now = time.time()
+        self._dir_cache = {}
+        self._segments_cache = {}
+
+    def _segments(self, directory):
+        """目录相对源目录的各段名称（按目录缓存）"""
+        segments = self._segments_cache.get(directory)
+        if segments is None:
+            relative = os.path.relpath(directory, self.root) if self.root is not None else directory
+            segments = self._segments_cache[directory] = [
+                segment for segment in relative.replace("\\", "/").split("/") if segment not in ("", ".")]
+        return segments
+
+    @staticmethod
+    def _segments_match(patterns, segments):
+        """连续的几段目录名是否依次匹配 patterns"""
+        for start in range(len(segments) - len(patterns) + 1):
+            if all(pattern.match(segments[start + offset]) for offset, pattern in enumerate(patterns)):
+                return True
+        return False
+
+    def _match_directory(self, directory):
+        """返回目录匹配的第一条目录规则 (序号, 文件夹)，未匹配返回 None"""
+        segments = self._segments(directory)
+        for index, patterns, folder_name in self.dir_rules:
+            if self._segments_match(patterns, segments):
+                return index, folder_name
+        return None
+
+    def _match_conditional(self, file_name, directory, metadata, limit):
+        """返回序号小于 limit、名称和条件都满足的第一条带条件规则 (序号, 文件夹)，未匹配返回 None"""
+        name = None
+        values = None
+        for index, test, conditions, folder_name in self.conditional:
+            if index >= limit:
+                break
+            if test is not None:
+                prefix, matcher = test
+                if prefix == RULE_DIR:
+                    if directory is None or not self._segments_match(matcher, self._segments(directory)):
+                        continue
+                elif prefix:
+                    if not matcher.match(file_name):
+                        continue
+                else:
+                    if name is None:
+                        name = file_name.lower()
+                    if matcher not in name:
+                        continue
+            if values is None:
+                values = (metadata() if metadata is not None else None) or ()
+            if not values:
+                continue
+            size, mtime_ns = values
+            if all(compare(size if attribute == "size" else self.now - mtime_ns / 1e9, threshold)
+                   for attribute, compare, threshold in conditions):
+                return index, folder_name
+        return None
+
+    def _index_keywords(self):
+        """为普通关键词建立片段索引：每个关键词取它所含的最少被其他关键词共用的 KEYWORD_GRAM 个字符，
+        文件名包含该关键词时必然包含这个片段
+        """
+        counts = {}
+        grams = []
+        for rule in self.keywords:
+            keyword = rule[1]
+            found = {keyword[start:start + KEYWORD_GRAM] for start in range(len(keyword) - KEYWORD_GRAM + 1)}
+            grams.append(found)
+            for gram in found:
+                counts[gram] = counts.get(gram, 0) + 1
+        self._keyword_index = {}
+        self._short_keywords = []
+        for rule, found in zip(self.keywords, grams):
+            if found:
+                self._keyword_index.setdefault(min(found, key=counts.__getitem__), []).append(rule)
+            else:
+                self._short_keywords.append(rule)
+
+    def _keyword_candidates(self, name):
+        """可能包含在小写文件名 name 中的普通关键词，按规则顺序排列"""
+        if self._keyword_index is None:
+            return self.keywords
+        index = self._keyword_index
+        candidates = []
+        for gram in {name[start:start + KEYWORD_GRAM] for start in range(len(name) - KEYWORD_GRAM + 1)}:
+            found = index.get(gram)
+            if found:
+                candidates += found
+        if not candidates:
+            return self._short_keywords
+        candidates += self._short_keywords
+        candidates.sort(key=operator.itemgetter(0))
+        return candidates
+
+    def _pattern_candidates(self, file_name):
+        """按文件名的开头和结尾查出可能匹配的 glob/re 规则，按规则顺序排列"""
+        name = file_name.translate(_FOLD).lower()
+        candidates = []
+        for length, table in self._prefix_index:
+            found = table.get(name[:length])
+            if found:
+                candidates += found
+        names = (name, name[:-1]) if name.endswith("\n") else (name,)
+        for length, table in self._suffix_index:
+            for tail in names:
+                found = table.get(tail[-length:])
+                if found:
+                    candidates += found
+        if not candidates:
+            return self._unindexed
+        candidates += self._unindexed
+        candidates.sort(key=operator.itemgetter(0))
+        return candidates
+
+    def _match_pattern(self, file_name, limit):
+        """返回序号小于 limit 的第一条匹配的 glob/re 规则 (序号, 文件夹)，未匹配返回 None"""
+        for index, pattern, folder_name in self._pattern_candidates(file_name):
+            if index >= limit:
+                break
+            if pattern.match(file_name):
+                return index, folder_name
+        return None
+
+    def match(self, file_name, directory=None, metadata=None):
+        """返回匹配的目标文件夹名称，未匹配返回 None
+
+        directory 为文件所在目录，同一目录的文件应传入同一个字符串，目录规则的结果按目录缓存；
+        metadata 为返回 (大小, 修改时间纳秒) 的函数，无法获取时返回 None，只在需要时调用。
+        """
+        found = self.match_rule(file_name, directory, metadata)
+        return found[1] if found is not None else None
+
+    def match_rule(self, file_name, directory=None, metadata=None):
+        """与 match() 相同，但返回第一条匹配的规则 (序号, 文件夹)，未匹配返回 None"""
+        best = None
+        limit = self.rule_count
+        if self.dir_rules and directory is not None:
+            try:
+                best = self._dir_cache[directory]
+            except KeyError:
+                best = self._dir_cache[directory] = self._match_directory(directory)
+            if best is not None:
+                limit = best[0]
+
+        if self.pattern_count:
+            found = self._match_pattern(file_name, limit)
+            if found is not None:
+                best = found
+                limit = found[0]
+
+        name = file_name.lower()
+        for index, keyword, folder_name in self._keyword_candidates(name):
+            if index >= limit:
+                break
+            if keyword in name:
+                best = index, folder_name
+                limit = index
+                break
+
+        if self.conditional:
+            found = self._match_conditional(file_name, directory, metadata, limit)
+            if found is not None:
+                return found
+        return best
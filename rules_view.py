@@ -0,0 +1,173 @@
+import tkinter as tk
+
+# 每次插入 Treeview 的行数，滚动到已加载部分的末尾附近时再插入下一页
+PAGE_SIZE = 200
+# 已加载部分的可见比例超过该值时加载下一页
+PAGE_THRESHOLD = 0.9
+
+
+class RuleIndex:
+    """规则的内存搜索索引，顺序与规则组字典一致
+
+    每条规则预先保存 "关键词\\0文件夹" 的小写形式，搜索只做一次子串扫描；
+    连续输入时新查询包含上一次查询，只在上一次的结果中继续筛选。
+    """
+
+    def __init__(self, rules=None):
+        self._texts = {}
+        self._last_query = None
+        self._last_result = None
+        if rules:
+            self.reset(rules)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, keyword):
+        return keyword in self._texts
+
+    def reset(self, rules):
+        self._texts = {keyword: f"{keyword}\0{folder}".lower() for keyword, folder in rules.items()}
+        self._last_query = None
+        self._last_result = None
+
+    def set(self, keyword, folder):
+        self._texts[keyword] = f"{keyword}\0{folder}".lower()
+        self._last_query = None
+
+    def remove(self, keyword):
+        self._texts.pop(keyword, None)
+        self._last_query = None
+
+    def matches(self, keyword, query):
+        """规则是否符合查询（keyword 必须在索引中）"""
+        return not query or query.lower() in self._texts[keyword]
+
+    def search(self, query):
+        """返回符合查询的关键词列表，查询为空时返回全部"""
+        query = query.lower()
+        if not query:
+            return list(self._texts)
+        if self._last_query and self._last_query in query:
+            texts = self._texts
+            result = [keyword for keyword in self._last_result if query in texts[keyword]]
+        else:
+            result = [keyword for keyword, text in self._texts.items() if query in text]
+        self._last_query = query
+        self._last_result = result
+        return result
+
+
+class RulesView:
+    """规则列表：按页惰性插入 Treeview 行，修改时只更新变化的行
+
+    rows 是当前筛选结果（按规则顺序），其中前 loaded 条已插入 Treeview。
+    """
+
+    def __init__(self, tree, scrollbar):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.index = RuleIndex()
+        self.rules = {}
+        self.query = ""
+        self.rows = []
+        self.loaded = 0
+        self._items = {}
+        self._keywords = {}
+        self._next_id = 0
+        self._page_job = None
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    @property
+    def total(self):
+        return len(self.index)
+
+    @property
+    def shown(self):
+        return len(self.rows)
+
+    def keyword(self, item):
+        """Treeview 行对应的关键词"""
+        return self._keywords[item]
+
+    def selected_keywords(self):
+        return [self._keywords[item] for item in self.tree.selection()]
+
+    def load(self, rules):
+        """显示一个规则组（切换规则组或批量导入后调用）"""
+        self.rules = rules
+        self.index.reset(rules)
+        self._show(self.index.search(self.query))
+
+    def search(self, query):
+        """按关键词或文件夹筛选，query 为空时显示全部"""
+        self.query = query.strip()
+        self._show(self.index.search(self.query))
+
+    def set_rule(self, keyword, folder):
+        """添加或修改一条规则后更新对应的行"""
+        is_new = keyword not in self.index
+        self.index.set(keyword, folder)
+        item = self._items.get(keyword)
+        if item is not None:
+            self.tree.item(item, values=(keyword, folder))
+        elif is_new and self.index.matches(keyword, self.query):
+            self.rows.append(keyword)
+            # 已经全部加载时直接插入末尾，否则等滚动到底部时再加载
+            if self.loaded == len(self.rows) - 1:
+                self._insert(keyword, folder)
+                self.loaded += 1
+                self.tree.see(self._items[keyword])
+
+    def remove_rules(self, keywords):
+        """删除规则后移除对应的行"""
+        removed = set(keywords)
+        for keyword in removed:
+            self.index.remove(keyword)
+        items = [self._items.pop(keyword) for keyword in removed if keyword in self._items]
+        for item in items:
+            del self._keywords[item]
+        if items:
+            self.tree.delete(*items)
+        self.loaded -= len(items)
+        self.rows = [keyword for keyword in self.rows if keyword not in removed]
+        self._fill()
+
+    def _show(self, rows):
+        if self._page_job is not None:
+            self.tree.after_cancel(self._page_job)
+            self._page_job = None
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._items.clear()
+        self._keywords.clear()
+        self.rows = rows
+        self.loaded = 0
+        self._load_page()
+
+    def _insert(self, keyword, folder):
+        item = f"r{self._next_id}"
+        self._next_id += 1
+        self.tree.insert("", tk.END, iid=item, values=(keyword, folder))
+        self._items[keyword] = item
+        self._keywords[item] = keyword
+
+    def _load_page(self):
+        self._page_job = None
+        end = min(self.loaded + PAGE_SIZE, len(self.rows))
+        rules = self.rules
+        for keyword in self.rows[self.loaded:end]:
+            self._insert(keyword, rules[keyword])
+        self.loaded = end
+
+    def _fill(self):
+        """删除行之后已加载部分不足一页时补足"""
+        if self.loaded < PAGE_SIZE and self.loaded < len(self.rows):
+            self._load_page()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if (float(last) >= PAGE_THRESHOLD and self.loaded < len(self.rows)
+                and self._page_job is None):
+            self._page_job = self.tree.after_idle(self._load_page)
@@ -0,0 +1,117 @@
+import os
+import time
+import marshal
+import hashlib
+from array import array
+from pathlib import Path
+
+SCAN_CACHE_VERSION = 2
+# 文件名中不会出现的分隔符，每个目录的名称列表保存为一个字符串
+_NAME_SEPARATOR = "\0"
+# 修改时间离现在太近的目录不缓存：粗粒度时间戳的文件系统上，同一时刻之后的修改无法察觉
+RACY_SECONDS = 2
+
+
+def list_directory(directory, want_inodes=False, want_sizes=False, want_mtimes=False):
+    """列出一个目录，返回按名称排序的 (子目录名列表, 文件名列表, inode 数组, 大小数组, 修改时间数组)
+
+    不需要的列返回 None；子目录不跟随符号链接，无法获取 stat 的文件大小和修改时间记为 -1。
+    """
+    with os.scandir(directory) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    subdirs = []
+    names = []
+    inodes = array('Q') if want_inodes else None
+    sizes = array('q') if want_sizes else None
+    mtimes = array('q') if want_mtimes else None
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                if inodes is not None:
+                    inodes.append(entry.inode())
+                if sizes is not None or mtimes is not None:
+                    try:
+                        st = entry.stat()
+                        size, mtime = st.st_size, st.st_mtime_ns
+                    except OSError:
+                        size, mtime = -1, -1
+                    if sizes is not None:
+                        sizes.append(size)
+                    if mtimes is not None:
+                        mtimes.append(mtime)
+                names.append(entry.name)
+        except OSError:
+            continue
+    return subdirs, names, inodes, sizes, mtimes
+
+
+class ScanCache:
+    """按目录缓存扫描结果，目录的 st_mtime_ns 和 st_ino 都未变化时不再重新列出
+
+    每个目录保存子目录名、文件名（各自拼接为一个字符串）以及（按需）文件 inode、大小和修改时间的数组字节；
+    只要目录中增删或重命名了条目，目录的修改时间就会变化并触发重新列出。
+    文件内容变化不会改变目录的修改时间，因此缓存中的文件大小和修改时间只作为调度提示使用。FAT/exFAT 上目录修改时间不可靠，不应启用缓存。
+    缓存用 marshal 保存在 cache_dir 中，每个源目录一个文件，只保留最近一次扫描到的目录。
+    """
+
+    def __init__(self, path, source_dir):
+        self.path = Path(path)
+        self.source_dir = os.path.abspath(source_dir)
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._visited = {}
+        self._load()
+
+    @classmethod
+    def for_source(cls, cache_dir, source_dir):
+        """打开 cache_dir 中属于 source_dir 的缓存"""
+        source_dir = os.path.abspath(source_dir)
+        name = hashlib.sha1(os.path.normcase(source_dir).encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+        return cls(Path(cache_dir) / f"scan_{name}.cache", source_dir)
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return
+        if (isinstance(data, dict) and data.get("version") == SCAN_CACHE_VERSION
+                and data.get("source") == self.source_dir):
+            self._entries = data["entries"]
+
+    def listing(self, directory, want_inodes=False, want_sizes=False, want_mtimes=False):
+        """与 list_directory 相同，目录未变化且缓存中有所需的列时直接返回缓存的结果"""
+        st = os.stat(directory)
+        cached = self._entries.get(directory)
+        wanted = (want_inodes, want_sizes, want_mtimes)
+        if (cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_ino
+                and all(cached[4 + i] is not None for i, want in enumerate(wanted) if want)):
+            self.hits += 1
+            self._visited[directory] = cached
+            subdirs = cached[2].split(_NAME_SEPARATOR) if cached[2] else []
+            names = cached[3].split(_NAME_SEPARATOR) if cached[3] else []
+            columns = [array(typecode, cached[4 + i]) if want else None
+                       for i, (typecode, want) in enumerate(zip("Qqq", wanted))]
+            return (subdirs, names, *columns)
+
+        self.misses += 1
+        subdirs, names, *columns = list_directory(directory, *wanted)
+        if time.time() - st.st_mtime_ns / 1e9 > RACY_SECONDS:
+            self._visited[directory] = (st.st_mtime_ns, st.st_ino,
+                                        _NAME_SEPARATOR.join(subdirs), _NAME_SEPARATOR.join(names),
+                                        *(column.tobytes() if column is not None else None for column in columns))
+        return (subdirs, names, *columns)
+
+    def save(self):
+        """保存本次扫描到的目录（写入临时文件后替换），不再存在的目录随之清除"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": SCAN_CACHE_VERSION, "source": self.source_dir, "entries": self._visited}
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, 'wb') as f:
+            marshal.dump(data, f)
+        os.replace(temp_path, self.path)
+        self._entries = self._visited
+        self._visited = {}
@@ -0,0 +1,121 @@
+import re
+import fnmatch
+
+# 规则组的扫描设置（保存在规则文件的 group_options 中）
+DEFAULT_SCAN_OPTIONS = {
+    "exclude": [],
+    "max_depth": 0,
+    "skip_hidden": True
+}
+
+
+def scan_options(group_options, group_name):
+    """获取规则组的扫描设置，缺少的项使用默认值"""
+    options = dict(DEFAULT_SCAN_OPTIONS)
+    stored = (group_options or {}).get(group_name) or {}
+    options.update((name, value) for name, value in stored.items() if name in DEFAULT_SCAN_OPTIONS)
+    options["exclude"] = [pattern for pattern in options["exclude"] if pattern.strip()]
+    options["max_depth"] = max(0, int(options["max_depth"] or 0))
+    options["skip_hidden"] = bool(options["skip_hidden"])
+    return options
+
+
+def validate_scan_options(options):
+    """校验规则组的扫描设置（可以只包含其中几项），不合法时抛出 ValueError"""
+    for name, value in options.items():
+        if name == "exclude":
+            if not isinstance(value, list) or not all(isinstance(pattern, str) for pattern in value):
+                raise ValueError("exclude 必须是目录通配符字符串的列表")
+        elif name == "max_depth":
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError("max_depth 必须是大于等于0的整数")
+        elif name == "skip_hidden":
+            if not isinstance(value, bool):
+                raise ValueError("skip_hidden 必须是 true 或 false")
+        else:
+            raise ValueError(f"未知的扫描设置: {name}")
+
+
+def _translate_path(pattern):
+    """把路径模式转换为正则：* 和 ? 不跨越 "/"，** 匹配任意多层"""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            if i < n and pattern[i] == '*':
+                i += 1
+                if i < n and pattern[i] == '/':
+                    # **/ 也可以匹配零层
+                    i += 1
+                    parts.append('(?:.*/)?')
+                else:
+                    parts.append('.*')
+            else:
+                parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            j = pattern.find(']', j)
+            if j < 0:
+                parts.append(re.escape(c))
+                continue
+            stuff = pattern[i:j].replace('\\', '\\\\')
+            i = j + 1
+            if stuff.startswith('!'):
+                stuff = '^' + stuff[1:]
+            elif stuff.startswith('^'):
+                stuff = '\\' + stuff
+            parts.append(f'(?!/)[{stuff}]')
+        else:
+            parts.append(re.escape(c))
+    return f"(?s:{''.join(parts)})\\Z"
+
+
+def _compile(patterns, translate=fnmatch.translate):
+    if not patterns:
+        return None
+    return re.compile("|".join(translate(pattern) for pattern in patterns), re.IGNORECASE)
+
+
+class ScanFilter:
+    """扫描时的剪枝规则：排除的目录、最大深度和隐藏文件
+
+    不含 "/" 的排除模式匹配目录名（如 node_modules、*.cache），含 "/" 的匹配相对源目录的路径
+    （如 photos/*/thumbs，其中 * 和 ? 不跨越目录层级，** 匹配任意多层），不区分大小写。被排除、超过深度或隐藏的目录整棵子树都不会被读取。
+    max_depth 为 0 表示不限制，1 表示只处理源目录下的文件，依此类推。
+    """
+
+    def __init__(self, exclude=(), max_depth=0, skip_hidden=True):
+        patterns = [pattern.strip().replace("\\", "/").strip("/") for pattern in exclude]
+        patterns = [pattern for pattern in patterns if pattern]
+        self.exclude = patterns
+        self.max_depth = max_depth
+        self.skip_hidden = skip_hidden
+        self._names = _compile([pattern for pattern in patterns if "/" not in pattern])
+        self._paths = _compile([pattern for pattern in patterns if "/" in pattern], _translate_path)
+
+    @property
+    def needs_path(self):
+        """是否需要目录的相对路径（有路径模式时）"""
+        return self._paths is not None
+
+    def prune(self, name, rel_path, depth):
+        """判断深度为 depth 的子目录是否整个跳过，rel_path 为以 "/" 分隔的相对路径"""
+        if self.skip_hidden and name.startswith('.'):
+            return True
+        if self.max_depth and depth >= self.max_depth:
+            return True
+        if self._names is not None and self._names.match(name):
+            return True
+        return self._paths is not None and self._paths.match(rel_path) is not None
+
+    def skip_file(self, name):
+        """判断文件是否跳过（隐藏文件）"""
+        return self.skip_hidden and name.startswith('.')
@@ -0,0 +1,106 @@
+import os
+import threading
+
+# 识别文件类型最多读取的字节数（tar 的 ustar 标记位于第 257 字节）
+SNIFF_BYTES = 512
+# 识别结果缓存的最大条目数，满了之后清空重来
+SNIFF_CACHE_SIZE = 65536
+
+# 规则中可以使用的类型名称及别名
+CONTENT_TYPES = ("pdf", "zip", "epub", "jpeg", "png", "gif", "bmp", "tiff", "webp", "heic", "avif",
+                 "mp4", "mov", "m4a", "3gp", "avi", "mkv", "webm", "mp3", "wav", "flac", "ogg",
+                 "7z", "rar", "gzip", "bz2", "xz", "tar", "exe", "sqlite", "rtf", "ole")
+TYPE_ALIASES = {"jpg": "jpeg", "tif": "tiff", "gz": "gzip", "doc": "ole", "xls": "ole", "ppt": "ole"}
+
+# 固定位置的魔数：(偏移, 字节串, 类型)
+_SIGNATURES = (
+    (0, b"%PDF-", "pdf"),
+    (0, b"\xff\xd8\xff", "jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (0, b"BM", "bmp"),
+    (0, b"II*\x00", "tiff"),
+    (0, b"MM\x00*", "tiff"),
+    (0, b"7z\xbc\xaf\x27\x1c", "7z"),
+    (0, b"Rar!\x1a\x07", "rar"),
+    (0, b"\x1f\x8b", "gzip"),
+    (0, b"BZh", "bz2"),
+    (0, b"\xfd7zXZ\x00", "xz"),
+    (0, b"fLaC", "flac"),
+    (0, b"OggS", "ogg"),
+    (0, b"ID3", "mp3"),
+    (0, b"MZ", "exe"),
+    (0, b"SQLite format 3\x00", "sqlite"),
+    (0, b"{\\rtf", "rtf"),
+    (0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole"),
+    (257, b"ustar", "tar"),
+)
+# ISO 基础媒体文件（ftyp）的主品牌
+_FTYP_BRANDS = {b"qt  ": "mov", b"heic": "heic", b"heix": "heic", b"mif1": "heic", b"msf1": "heic",
+                b"avif": "avif", b"M4A ": "m4a", b"M4B ": "m4a"}
+# RIFF 容器的格式标记
+_RIFF_FORMATS = {b"WEBP": "webp", b"WAVE": "wav", b"AVI ": "avi"}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def normalize_type(name):
+    """把规则中的类型名称转换为标准名称，未知类型返回 None"""
+    name = name.strip().lower().lstrip(".")
+    name = TYPE_ALIASES.get(name, name)
+    return name if name in CONTENT_TYPES else None
+
+
+def detect_type(header):
+    """根据文件开头的字节判断类型，无法识别返回 None"""
+    if header.startswith(b"PK\x03\x04") or header.startswith(b"PK\x05\x06"):
+        # EPUB 要求第一个条目是未压缩的 mimetype 文件
+        return "epub" if header[30:58] == b"mimetypeapplication/epub+zip" else "zip"
+    if header[4:8] == b"ftyp":
+        brand = header[8:12]
+        if brand.startswith(b"3g"):
+            return "3gp"
+        return _FTYP_BRANDS.get(brand, "mp4")
+    if header.startswith(b"RIFF"):
+        return _RIFF_FORMATS.get(header[8:12])
+    if header.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm" if b"webm" in header[:64] else "mkv"
+    for offset, magic, kind in _SIGNATURES:
+        if header.startswith(magic, offset):
+            return kind
+    # 没有 ID3 标签的 MP3 以帧同步字开头
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and header[1] & 0x06:
+        return "mp3"
+    return None
+
+
+def sniff_file(path, limit=SNIFF_BYTES):
+    """读取文件开头不超过 limit 字节判断类型（可在线程中执行），无法识别或读取失败返回 None
+
+    结果按 (设备, inode, 大小, 修改时间) 缓存，同一进程中再次整理时未变化的文件不再读取。
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    # Windows 上部分文件系统没有 inode 号，不缓存
+    cacheable = st.st_ino != 0
+    if cacheable:
+        with _cache_lock:
+            if key in _cache:
+                return _cache[key]
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(limit)
+    except OSError:
+        return None
+    kind = detect_type(header)
+    if cacheable:
+        with _cache_lock:
+            if len(_cache) >= SNIFF_CACHE_SIZE:
+                _cache.clear()
+            _cache[key] = kind
+    return kind
@@ -0,0 +1,152 @@
+import os
+import sys
+import time
+import ctypes
+import platform
+import threading
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 capacity 个（默认一秒的量）
+
+    consume() 先预支令牌再按欠额睡眠，多个线程按请求先后公平排队。
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """取出 amount 个令牌，不足时阻塞等待"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class Throttle:
+    """复制路径上的带宽（字节/秒）和操作数（次/秒）限制，0 表示不限制"""
+
+    def __init__(self, bytes_per_sec=0, ops_per_sec=0):
+        self.bytes_per_sec = bytes_per_sec
+        self.ops_per_sec = ops_per_sec
+        self._bytes = TokenBucket(bytes_per_sec) if bytes_per_sec > 0 else None
+        self._ops = TokenBucket(ops_per_sec) if ops_per_sec > 0 else None
+
+    @property
+    def enabled(self):
+        return self._bytes is not None or self._ops is not None
+
+    @property
+    def limits_bandwidth(self):
+        return self._bytes is not None
+
+    def op(self):
+        """开始一次文件操作前调用"""
+        if self._ops is not None:
+            self._ops.consume(1)
+
+    def data(self, length):
+        """读写 length 字节前调用"""
+        if self._bytes is not None:
+            self._bytes.consume(length)
+
+
+class RateMeter:
+    """计算最近的处理速度（指数平滑）"""
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.ops_rate = 0.0
+        self.bytes_rate = 0.0
+        self._last_time = time.monotonic()
+        self._last_ops = 0
+        self._last_bytes = 0
+
+    def update(self, ops, nbytes):
+        """传入累计的操作数和字节数，返回 (操作/秒, 字节/秒)"""
+        now = time.monotonic()
+        elapsed = now - self._last_time
+        if elapsed > 0:
+            ops_rate = (ops - self._last_ops) / elapsed
+            bytes_rate = (nbytes - self._last_bytes) / elapsed
+            self.ops_rate += self.smoothing * (ops_rate - self.ops_rate)
+            self.bytes_rate += self.smoothing * (bytes_rate - self.bytes_rate)
+            self._last_time = now
+            self._last_ops = ops
+            self._last_bytes = nbytes
+        return self.ops_rate, self.bytes_rate
+
+
+def format_rate(ops_rate, bytes_rate):
+    """格式化速度，用于进度显示"""
+    return f"{bytes_rate / 1024 / 1024:.1f} MB/s, {ops_rate:.0f} 个文件/秒"
+
+
+def format_size(size):
+    """格式化字节数，用于统计显示"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+# ioprio_set 系统调用号（按架构）
+_IOPRIO_SET = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289,
+               "aarch64": 30, "arm64": 30, "armv7l": 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+# Windows 后台模式同时降低 CPU 和 I/O 优先级
+_THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+# macOS 的后台 QoS 类（同时降低该线程的 CPU 和 I/O 优先级）
+_QOS_CLASS_BACKGROUND = 0x09
+
+
+def set_idle_io_priority():
+    """将当前线程的 I/O 优先级设为空闲（Linux），成功返回 True"""
+    number = _IOPRIO_SET.get(platform.machine().lower())
+    if not sys.platform.startswith('linux') or number is None:
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        value = _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT
+        return libc.syscall(number, _IOPRIO_WHO_PROCESS, threading.get_native_id(), value) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def lower_thread_priority(nice_increment=10):
+    """降低当前线程的 CPU 和 I/O 优先级（作为执行器的线程初始化函数，只应在专用的工作线程中调用）
+
+    Linux 上 nice 值和 ioprio 都按线程生效；Windows 上使用线程后台模式；macOS 上使用后台 QoS 类。
+    其他系统上 nice 值作用于整个进程，不做修改。
+    """
+    if sys.platform == 'win32':
+        try:
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_BEGIN)
+        except (OSError, AttributeError):
+            pass
+        return
+    if sys.platform == 'darwin':
+        try:
+            ctypes.CDLL(None).pthread_set_qos_class_self_np(_QOS_CLASS_BACKGROUND, 0)
+        except (OSError, AttributeError):
+            pass
+        return
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        os.nice(nice_increment)
+    except OSError:
+        pass
+    set_idle_io_priority()
@@ -0,0 +1,208 @@
+import os
+import errno
+import json
+import shutil
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from fast_copy import copy_file
+
+JOURNAL_VERSION = 1
+JOURNAL_SUFFIX = ".jsonl"
+UNDONE_SUFFIX = ".undone"
+
+
+class UndoJournal:
+    """移动模式的撤销日志
+
+    第一行为运行信息（源目录、目标目录、时间），之后每行记录一次移动：
+    [源相对路径, 目标相对路径, 设备号]。设备号为 null 表示跨设备移动，撤销时需要复制。
+    多规则组整理时其他目标目录中的文件记录绝对路径（os.path.join 遇到绝对路径时直接使用它）。
+    记录先写入缓冲区，由整理引擎在每次进度事件和每次等待文件操作完成前 flush()，
+    中途崩溃时最多丢失最近一个进度间隔内完成的记录。
+    """
+
+    def __init__(self, journal_path, source_root, target_root):
+        self.journal_path = Path(journal_path)
+        self.source_root = os.path.abspath(source_root)
+        self.target_root = os.path.abspath(target_root)
+        self.count = 0
+        self._dev_cache = {}
+        self._pending = False
+        self._file = open(self.journal_path, 'w', encoding='utf-8')
+        header = {
+            "version": JOURNAL_VERSION,
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "source": self.source_root,
+            "target": self.target_root
+        }
+        self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+    @classmethod
+    def start(cls, journal_dir, source_root, target_root):
+        """在日志目录中创建一份新的撤销日志"""
+        journal_dir = Path(journal_dir)
+        journal_dir.mkdir(parents=True, exist_ok=True)
+        name = f"move_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{JOURNAL_SUFFIX}"
+        return cls(journal_dir / name, source_root, target_root)
+
+    def _device_of(self, directory):
+        """获取目录所在设备号（按目录缓存，避免每个文件额外 stat）"""
+        dev = self._dev_cache.get(directory)
+        if dev is None:
+            dev = os.stat(directory).st_dev
+            self._dev_cache[directory] = dev
+        return dev
+
+    def device_of_source(self, source):
+        """在移动前获取源文件所在设备号"""
+        return self._device_of(os.path.dirname(os.path.abspath(source)))
+
+    def record(self, source, target, source_dev=None):
+        """记录一次已完成的移动"""
+        source = os.path.abspath(source)
+        target = os.path.abspath(target)
+        if source_dev is None:
+            source_dev = self._device_of(os.path.dirname(source))
+        target_dev = self._device_of(os.path.dirname(target))
+        dev = source_dev if source_dev == target_dev else None
+        entry = [
+            os.path.relpath(source, self.source_root),
+            self._target_path(target),
+            dev
+        ]
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.count += 1
+        self._pending = True
+
+    def flush(self):
+        """把缓冲的记录写入文件（交给操作系统，不 fsync）"""
+        if self._pending and not self._file.closed:
+            self._file.flush()
+            self._pending = False
+
+    def _target_path(self, target):
+        """目标目录中的文件记录相对路径，其他位置的文件记录绝对路径"""
+        try:
+            relative = os.path.relpath(target, self.target_root)
+        except ValueError:
+            # Windows 上不在同一个盘符
+            return target
+        return target if relative == os.pardir or relative.startswith(os.pardir + os.sep) else relative
+
+    def close(self):
+        """关闭日志，未记录任何移动时删除空日志"""
+        if self._file.closed:
+            return
+        self._file.close()
+        if self.count == 0:
+            try:
+                self.journal_path.unlink()
+            except OSError:
+                pass
+
+
+def find_last_journal(journal_dir):
+    """查找最近一次尚未撤销的移动日志"""
+    journal_dir = Path(journal_dir)
+    if not journal_dir.exists():
+        return None
+    journals = sorted(journal_dir.glob(f"move_*{JOURNAL_SUFFIX}"))
+    return journals[-1] if journals else None
+
+
+def read_journal(journal_path):
+    """读取撤销日志，返回 (运行信息, 操作列表)"""
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get("version") != JOURNAL_VERSION:
+            raise ValueError(f"不支持的撤销日志版本: {header.get('version')}")
+        operations = [json.loads(line) for line in f if line.strip()]
+    return header, operations
+
+
+def _restore(source, target, dev):
+    """将文件从目标位置还原到源位置"""
+    if os.path.lexists(source):
+        raise FileExistsError(f"源位置已存在同名文件: {source}")
+    os.makedirs(os.path.dirname(source), exist_ok=True)
+    if dev is not None:
+        try:
+            os.rename(target, source)
+            return
+        except OSError as e:
+            # 设备挂载可能已变化，退回到复制+删除
+            if e.errno != errno.EXDEV:
+                raise
+    shutil.move(target, source, copy_function=copy_file)
+
+
+def undo_last_run(journal_dir, log=print, max_workers=None):
+    """撤销最近一次移动模式的整理
+
+    按日志逆序还原，同设备的操作以并行重命名完成，不复制数据。
+    返回 (已还原数, 失败数)；全部成功后日志标记为已撤销，否则只保留失败的操作。
+    """
+    journal_path = find_last_journal(journal_dir)
+    if journal_path is None:
+        log("没有可撤销的移动记录")
+        return 0, 0
+
+    header, operations = read_journal(journal_path)
+    source_root = header["source"]
+    target_root = header["target"]
+    log(f"正在撤销 {header['created_at']} 的移动: {len(operations)} 个文件")
+
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+
+    def restore(entry):
+        source_rel, target_rel, dev = entry
+        source = os.path.join(source_root, source_rel)
+        target = os.path.join(target_root, target_rel)
+        try:
+            _restore(source, target, dev)
+            return None
+        except Exception as e:
+            return f"{target} -> {source}: {str(e)}"
+
+    ordered = list(reversed(operations))
+    same_device = [entry for entry in ordered if entry[2] is not None]
+    cross_device = [entry for entry in ordered if entry[2] is None]
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for entry, error in zip(same_device, executor.map(restore, same_device, chunksize=256)):
+            if error:
+                failed.append(entry)
+                log(f"还原失败 {error}")
+    # 跨设备的操作需要复制数据，按顺序执行以免磁盘争用
+    for entry in cross_device:
+        error = restore(entry)
+        if error:
+            failed.append(entry)
+            log(f"还原失败 {error}")
+
+    # 清理整理时创建、现在已为空的目标文件夹
+    touched_dirs = {os.path.dirname(os.path.join(target_root, entry[1])) for entry in operations}
+    for directory in sorted(touched_dirs, key=len, reverse=True):
+        if os.path.abspath(directory) == os.path.abspath(target_root):
+            continue
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    restored = len(operations) - len(failed)
+    if failed:
+        # 只保留失败的操作，便于修复后再次撤销
+        failed.reverse()
+        with open(journal_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for entry in failed:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    else:
+        journal_path.rename(journal_path.with_name(journal_path.name + UNDONE_SUFFIX))
+
+    log(f"撤销完成: 已还原 {restored} 个文件，失败 {len(failed)} 个")
+    return restored, len(failed)
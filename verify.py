@@ -0,0 +1,91 @@
+import os
+import csv
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from fast_copy import COPY_CHUNK, _readinto
+from durability import fsync_file, fsync_directory
+
+# 默认摘要算法
+HASH_ALGORITHM = "sha256"
+
+# 校验报告中的状态
+VERIFY_OK = "ok"
+VERIFY_RENAMED = "renamed"
+VERIFY_FAILED = "failed"
+
+
+class VerifyError(Exception):
+    """目标文件与复制时计算的摘要不一致"""
+
+
+def file_digest(path, algorithm=HASH_ALGORITHM, buffer_size=COPY_CHUNK):
+    """读取文件并计算摘要，尽量不使用页缓存中的数据"""
+    hasher = hashlib.new(algorithm)
+    view = memoryview(bytearray(buffer_size))
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        if hasattr(os, "posix_fadvise"):
+            # 只能丢弃已写回磁盘的页，其余仍从缓存读取
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+        while True:
+            length = _readinto(fd, view)
+            if length == 0:
+                break
+            hasher.update(view[:length])
+    finally:
+        os.close(fd)
+    return hasher.hexdigest()
+
+
+def verify_copy(source, target, digest, algorithm=HASH_ALGORITHM, remove_source=False, sync=False):
+    """重新读取目标文件并与复制时的摘要比较（在校验线程池中执行）
+
+    sync 为 True 时先 fsync 目标文件，重新读取的才是磁盘上的数据；否则读到的可能是页缓存。
+    不一致时删除目标文件并抛出 VerifyError，源文件保持不变；
+    一致且 remove_source 为 True 时（跨设备移动）先 fsync 目标目录，再删除源文件。
+    """
+    if sync or remove_source:
+        fsync_file(target)
+    if file_digest(target, algorithm) != digest:
+        try:
+            os.unlink(target)
+        except OSError:
+            pass
+        raise VerifyError(f"校验失败: {os.path.basename(target)} 与源文件内容不一致")
+    if remove_source:
+        fsync_directory(os.path.dirname(target))
+        os.unlink(source)
+
+
+class VerifyReport:
+    """一次整理的校验报告（CSV，可用 Excel 打开）"""
+
+    FIELDS = ("status", "source", "target", "bytes", "algorithm", "digest", "message")
+
+    def __init__(self, report_path, algorithm=HASH_ALGORITHM):
+        self.path = Path(report_path)
+        self.algorithm = algorithm
+        self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.FIELDS)
+
+    @classmethod
+    def start(cls, report_dir, algorithm=HASH_ALGORITHM):
+        """在 report_dir 中创建新的报告"""
+        report_dir = Path(report_dir)
+        report_dir.mkdir(parents=True, exist_ok=True)
+        name = datetime.now().strftime("verify_%Y%m%d_%H%M%S_%f.csv")
+        return cls(report_dir / name, algorithm)
+
+    def record(self, status, source, target=None, size=0, digest=None, message=None):
+        self._writer.writerow((status, source, target or "", size, self.algorithm if digest else "",
+                               digest or "", message or ""))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None